@@ -1,18 +1,26 @@
 from decimal import Decimal
-from django.conf import settings
 from .models import Product
+from .cart_storage import get_cart_storage
 
 class Cart:
     def __init__(self, request):
         """
-        Initialize the cart.
+        Initialize the cart from the configured storage (settings.CART_STORAGE).
         """
-        self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            # save an empty cart in the session
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        self.storage = get_cart_storage(request)
+        self.cart = self.storage.load()
+        self._lines = None
+
+    @classmethod
+    def for_request(cls, request):
+        """
+        Return the request-scoped cart, so templates, context processors and
+        views share one set of hydrated lines per request.
+        """
+        cart = getattr(request, '_cart', None)
+        if cart is None:
+            cart = request._cart = cls(request)
+        return cart
 
     def add(self, product, quantity=1, override_quantity=False, variant=None):
         """
@@ -40,9 +48,33 @@ class Cart:
 
         self.save()
 
+    def add_many(self, items):
+        """
+        Add several (product, variant, quantity) items and persist once.
+        """
+        for product, variant, quantity in items:
+            if variant:
+                cart_key = f"{product.id}_{variant.id}"
+                price = str(variant.final_price)
+            else:
+                cart_key = str(product.id)
+                price = str(product.get_price)
+
+            entry = self.cart.setdefault(cart_key, {
+                'product_id': product.id,
+                'variant_id': variant.id if variant else None,
+                'quantity': 0,
+                'price': price
+            })
+            entry['quantity'] += quantity
+
+        self.save()
+
     def save(self):
-        """Mark the session as "modified" to make sure it gets saved."""
-        self.session.modified = True
+        """Persist the cart; only called when its contents change."""
+        self.storage.save(self.cart)
+        # Contents changed: hydrate again on next access
+        self._lines = None
 
     def remove(self, product, variant=None):
         """
@@ -57,86 +89,122 @@ class Cart:
             del self.cart[cart_key]
             self.save()
 
-    def __iter__(self):
-        """
-        Iterate over the items in the cart and get the products
-        from the database.
-        """
-        from .models import ProductVariant
-
-        # Get unique product IDs from cart items
-        product_ids = set()
-        variant_ids = set()
-
-        for item in self.cart.values():
+    def _iter_entries(self):
+        """Yield (key, product_id, variant_id, quantity, stored price) for every cart entry"""
+        for key, item in self.cart.items():
             if isinstance(item, dict) and 'product_id' in item:
-                product_ids.add(item['product_id'])
-                if item.get('variant_id'):
-                    variant_ids.add(item['variant_id'])
+                yield key, item['product_id'], item.get('variant_id'), item['quantity'], item.get('price')
             else:
                 # Handle legacy cart format (product_id as key)
                 try:
-                    product_ids.add(int(item) if isinstance(item, str) else item)
-                except:
+                    quantity = item.get('quantity', 1) if isinstance(item, dict) else 1
+                    price = item.get('price') if isinstance(item, dict) else None
+                    yield key, int(key), None, quantity, price
+                except (TypeError, ValueError):
                     continue
 
-        # Get product and variant objects
-        products = {p.id: p for p in Product.objects.filter(id__in=product_ids)}
-        variants = {v.id: v for v in ProductVariant.objects.filter(id__in=variant_ids)} if variant_ids else {}
+    def _hydrate(self):
+        """
+        Load every product and variant in the cart with at most two queries
+        (variants with their products, then the remaining products) and
+        revalidate prices and stock against the current database values.
+        Stale stored prices are corrected in place.
+        """
+        from .models import ProductVariant
 
-        cart = self.cart.copy()
-        for key, item in cart.items():
-            if isinstance(item, dict) and 'product_id' in item:
-                # New format with variant support
-                product_id = item['product_id']
-                variant_id = item.get('variant_id')
-
-                if product_id in products:
-                    item['product'] = products[product_id]
-                    if variant_id and variant_id in variants:
-                        item['variant'] = variants[variant_id]
-                    else:
-                        item['variant'] = None
-
-                    item['price'] = Decimal(item['price'])
-                    item['total_price'] = item['price'] * item['quantity']
-                    yield item
+        entries = list(self._iter_entries())
+        variant_ids = {variant_id for _, _, variant_id, _, _ in entries if variant_id}
+        variants = {
+            v.id: v for v in ProductVariant.objects.filter(id__in=variant_ids).select_related('product__category')
+        } if variant_ids else {}
+
+        products = {v.product_id: v.product for v in variants.values()}
+        missing_ids = {product_id for _, product_id, _, _, _ in entries} - set(products)
+        if missing_ids:
+            products.update(Product.objects.select_related('category').in_bulk(missing_ids))
+
+        lines = []
+        prices_changed = False
+        for key, product_id, variant_id, quantity, stored_price in entries:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            variant = variants.get(variant_id) if variant_id else None
+
+            price = variant.final_price if variant else product.get_price
+            if variant:
+                available_stock = variant.stock_quantity
+            elif product.manage_stock:
+                available_stock = product.stock_quantity
             else:
-                # Handle legacy format for backward compatibility
-                try:
-                    product_id = int(key)
-                    if product_id in products:
-                        legacy_item = {
-                            'product_id': product_id,
-                            'variant_id': None,
-                            'product': products[product_id],
-                            'variant': None,
-                            'quantity': item.get('quantity', 1) if isinstance(item, dict) else 1,
-                            'price': Decimal(item.get('price', products[product_id].get_price) if isinstance(item, dict) else products[product_id].get_price),
-                        }
-                        legacy_item['total_price'] = legacy_item['price'] * legacy_item['quantity']
-                        yield legacy_item
-                except:
-                    continue
+                available_stock = float('inf')
+
+            price_changed = stored_price is not None and Decimal(str(stored_price)) != price
+            if price_changed and isinstance(self.cart.get(key), dict):
+                self.cart[key]['price'] = str(price)
+                prices_changed = True
+
+            lines.append({
+                'product_id': product_id,
+                'variant_id': variant_id if variant else None,
+                'product': product,
+                'variant': variant,
+                'quantity': quantity,
+                'price': price,
+                'total_price': price * quantity,
+                'price_changed': price_changed,
+                'available_stock': available_stock,
+                'in_stock': product.is_active and quantity <= available_stock,
+            })
+
+        if prices_changed:
+            self.storage.save(self.cart)
+        return lines
+
+    @property
+    def lines(self):
+        """Hydrated cart lines, memoized until the cart changes"""
+        if self._lines is None:
+            self._lines = self._hydrate()
+        return self._lines
+
+    def __iter__(self):
+        """
+        Iterate over the hydrated items in the cart. Products and variants
+        are loaded from the database once per cart instance.
+        """
+        return iter(self.lines)
 
     def __len__(self):
         """
-        Count all items in the cart.
+        Count all items in the cart, skipping entries whose product or
+        variant no longer exists.
         """
-        return sum(item['quantity'] for item in self.cart.values())
+        return sum(line['quantity'] for line in self.lines)
 
     def get_total_price(self):
         """
-        Calculate the total cost of the items in the cart.
+        Calculate the total cost of the items in the cart at current prices.
         """
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        return sum((line['total_price'] for line in self.lines), Decimal('0'))
+
+    @property
+    def has_price_changes(self):
+        """True if any stored price differed from the current product price"""
+        return any(line['price_changed'] for line in self.lines)
+
+    @property
+    def has_stock_issues(self):
+        """True if any line is inactive or exceeds the available stock"""
+        return any(not line['in_stock'] for line in self.lines)
 
     def clear(self):
         """
-        Remove cart from session.
+        Remove the cart from storage.
         """
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
+        self.storage.clear()
+        self.cart = {}
+        self._lines = None
 
     def get_item_count(self):
         """
@@ -0,0 +1,245 @@
+"""
+Cart storage backends
+
+The Cart keeps its contents in a pluggable storage chosen by
+settings.CART_STORAGE:
+
+- SessionCartStorage: the whole cart dict lives in the session (legacy)
+- DatabaseCartStorage: one StoredCart row per user / anonymous visitor
+- CacheCartStorage: the Django cache, for deployments with a shared cache
+
+Server-side backends only keep a short random token in the session for
+anonymous visitors, so session payloads stay tiny. Storage is written
+only when the cart changes, and anonymous carts are merged into the
+user's cart on login (see merge_carts_on_login). Anonymous StoredCart
+rows outlive their session token; `manage.py purge_carts` deletes those
+not updated within SESSION_COOKIE_AGE.
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+CART_TOKEN_SESSION_KEY = '_cart_token'
+
+
+class BaseCartStorage:
+    """Load and persist the raw cart dict for one request"""
+
+    def __init__(self, request):
+        self.request = request
+
+    def load(self):
+        raise NotImplementedError
+
+    def save(self, data):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class SessionCartStorage(BaseCartStorage):
+    """Store the cart inside the session (original behaviour)"""
+
+    def load(self):
+        return self.request.session.get(settings.CART_SESSION_ID) or {}
+
+    def save(self, data):
+        self.request.session[settings.CART_SESSION_ID] = data
+        self.request.session.modified = True
+
+    def clear(self):
+        self.request.session.pop(settings.CART_SESSION_ID, None)
+        self.request.session.modified = True
+
+
+class ServerSideCartStorage(BaseCartStorage):
+    """Common keying for backends that store carts outside the session"""
+
+    def __init__(self, request):
+        super().__init__(request)
+        user = getattr(request, 'user', None)
+        self.user = user if user is not None and user.is_authenticated else None
+
+    def get_token(self, create=False):
+        """Anonymous cart token kept in the session (survives login key cycling)"""
+        token = self.request.session.get(CART_TOKEN_SESSION_KEY)
+        if token is None and create:
+            token = self.request.session[CART_TOKEN_SESSION_KEY] = uuid.uuid4().hex
+        return token
+
+    def adopt_session_cart(self):
+        """Move a cart left in the session by SessionCartStorage into this backend"""
+        legacy = self.request.session.pop(settings.CART_SESSION_ID, None)
+        if legacy:
+            self.save(legacy)
+        return legacy or {}
+
+
+class DatabaseCartStorage(ServerSideCartStorage):
+    """Store carts in the StoredCart table"""
+
+    def _lookup(self, create=False):
+        if self.user is not None:
+            return {'user': self.user}
+        token = self.get_token(create=create)
+        return {'token': token} if token else None
+
+    def load(self):
+        from .models import StoredCart
+
+        lookup = self._lookup()
+        if lookup is None:
+            return self.adopt_session_cart()
+        data = stored_cart_data(lookup).first()
+        if data is None:
+            return self.adopt_session_cart()
+        return data
+
+    def save(self, data):
+        from .models import StoredCart
+
+        if self.user is None and self.get_token() is None:
+            # First save for this visitor: the new token can't have a row yet
+            StoredCart.objects.create(data=data, **self._lookup(create=True))
+        else:
+            StoredCart.objects.update_or_create(defaults={'data': data}, **self._lookup(create=True))
+
+    def clear(self):
+        from .models import StoredCart
+
+        lookup = self._lookup()
+        if lookup is not None:
+            StoredCart.objects.filter(**lookup).delete()
+
+
+class CacheCartStorage(ServerSideCartStorage):
+    """Store carts in the default cache (expire with the session cookie)"""
+
+    def _key(self, create=False):
+        if self.user is not None:
+            return f"cart:user:{self.user.pk}"
+        token = self.get_token(create=create)
+        return f"cart:anon:{token}" if token else None
+
+    def load(self):
+        key = self._key()
+        data = cache.get(key) if key else None
+        if data is None:
+            return self.adopt_session_cart()
+        return data
+
+    def save(self, data):
+        cache.set(self._key(create=True), data, settings.SESSION_COOKIE_AGE)
+
+    def clear(self):
+        key = self._key()
+        if key:
+            cache.delete(key)
+
+
+def get_cart_storage(request):
+    """Instantiate the storage backend configured in settings.CART_STORAGE"""
+    backend_path = getattr(settings, 'CART_STORAGE', 'catalog.cart_storage.SessionCartStorage')
+    return import_string(backend_path)(request)
+
+
+def stored_cart_data(lookup):
+    """Cart contents of the StoredCart row matching lookup ({'user': ...} or {'token': ...})"""
+    from .models import StoredCart
+
+    return StoredCart.objects.filter(**lookup).values_list('data', flat=True)
+
+
+def purge_stale_carts(max_age=None):
+    """Delete anonymous StoredCart rows not updated within max_age seconds (default SESSION_COOKIE_AGE)"""
+    from .models import StoredCart
+
+    max_age = settings.SESSION_COOKIE_AGE if max_age is None else max_age
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    return StoredCart.objects.filter(user__isnull=True, updated_at__lt=cutoff).delete()[0]
+
+
+def _available_stock(items):
+    """{cart key: available quantity (None if unlimited)} for raw cart items, in two queries at most"""
+    from .models import Product, ProductVariant
+
+    variant_keys, product_keys = {}, {}
+    for key, item in items.items():
+        variant_id = item.get('variant_id')
+        if variant_id:
+            variant_keys[key] = variant_id
+        else:
+            try:
+                product_keys[key] = int(item.get('product_id', key))
+            except (TypeError, ValueError):
+                continue
+
+    available = {}
+    if variant_keys:
+        stock = dict(ProductVariant.objects.filter(pk__in=set(variant_keys.values())).values_list('pk', 'stock_quantity'))
+        available.update({key: stock.get(pk, 0) for key, pk in variant_keys.items()})
+    if product_keys:
+        stock = {
+            pk: quantity if manage_stock else None
+            for pk, manage_stock, quantity in Product.objects.filter(pk__in=set(product_keys.values()))
+            .values_list('pk', 'manage_stock', 'stock_quantity')
+        }
+        available.update({key: stock.get(pk, 0) for key, pk in product_keys.items()})
+    return available
+
+
+def merge_cart_data(target, source):
+    """
+    Add the quantities of source into target (both raw cart dicts). Summed
+    lines are capped at the available stock, but never below what either
+    cart already held.
+    """
+    summed = {}
+    for key, item in source.items():
+        if key in target and isinstance(target[key], dict) and isinstance(item, dict):
+            held = max(target[key].get('quantity', 0), item.get('quantity', 0))
+            target[key]['quantity'] = target[key].get('quantity', 0) + item.get('quantity', 0)
+            summed[key] = held
+        else:
+            target[key] = item
+
+    if summed:
+        available = _available_stock({key: target[key] for key in summed})
+        for key, held in summed.items():
+            limit = available.get(key)
+            if limit is not None:
+                target[key]['quantity'] = min(target[key]['quantity'], max(limit, held))
+    return target
+
+
+def merge_carts_on_login(sender, request, user, **kwargs):
+    """
+    user_logged_in receiver: fold the anonymous cart into the user's cart.
+    """
+    storage_class = import_string(getattr(settings, 'CART_STORAGE', 'catalog.cart_storage.SessionCartStorage'))
+    if not issubclass(storage_class, ServerSideCartStorage):
+        # Session carts already follow the session through login
+        return
+
+    anonymous = storage_class(request)
+    anonymous.user = None
+    if anonymous.get_token() is None:
+        return
+    anonymous_data = anonymous.load()
+
+    user_storage = storage_class(request)
+    user_storage.user = user
+    if anonymous_data:
+        user_storage.save(merge_cart_data(user_storage.load(), anonymous_data))
+    anonymous.clear()
+    request.session.pop(CART_TOKEN_SESSION_KEY, None)
+
+    # Drop any cart memoized for this request before login
+    if hasattr(request, '_cart'):
+        del request._cart
@@ -0,0 +1,83 @@
+"""
+Cached category tree for navigation
+
+All active categories are loaded with one query, linked into a tree in
+memory and kept in the Django cache until a category is saved or deleted
+(see catalog.signals). Menus and the product list filter read from the
+tree, so rendering navigation costs no category queries on cache hits.
+"""
+
+from django.core.cache import cache
+
+CATEGORY_TREE_CACHE_KEY = 'catalog:category_tree'
+CATEGORY_TREE_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+
+class CategoryTree:
+    """
+    Active categories linked parent -> tree_children, with lookups by id
+    and slug. Each category also gets tree_descendants (depth first).
+    """
+
+    def __init__(self, categories):
+        self.by_id = {}
+        self.by_slug = {}
+        self.roots = []
+
+        categories = list(categories)
+        for category in categories:
+            category.tree_children = []
+            self.by_id[category.pk] = category
+            self.by_slug[category.slug] = category
+
+        for category in categories:
+            if category.parent_id is None:
+                self.roots.append(category)
+            elif category.parent_id in self.by_id:
+                self.by_id[category.parent_id].tree_children.append(category)
+            # Children of inactive parents are left out of the tree
+
+        # Flattened subtrees for templates (e.g. indented filter dropdowns)
+        for category in categories:
+            category.tree_descendants = self.descendants(category)
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+    def descendants(self, category):
+        """Active categories below category, depth first"""
+        result = []
+        stack = list(reversed(self.by_id[category.pk].tree_children)) if category.pk in self.by_id else []
+        while stack:
+            node = stack.pop()
+            result.append(node)
+            stack.extend(reversed(node.tree_children))
+        return result
+
+    def ancestors(self, category):
+        """Active categories above category, root first"""
+        result = []
+        parent = self.by_id.get(category.parent_id)
+        while parent is not None:
+            result.append(parent)
+            parent = self.by_id.get(parent.parent_id)
+        return list(reversed(result))
+
+
+def build_category_tree():
+    from .models import Category
+
+    return CategoryTree(Category.objects.filter(is_active=True).order_by('name'))
+
+
+def get_category_tree():
+    """Return the cached CategoryTree, building it on a miss"""
+    tree = cache.get(CATEGORY_TREE_CACHE_KEY)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(CATEGORY_TREE_CACHE_KEY, tree, CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
+
+
+def invalidate_category_tree():
+    cache.delete(CATEGORY_TREE_CACHE_KEY)
@@ -0,0 +1,173 @@
+"""
+Product list filtering and facet counts
+
+filter_products() applies every storefront filter (search, category
+subtree, price range, in stock, on sale, variant attributes) from a
+request's GET parameters. get_facets() then describes the filtered set in
+three grouped queries, however many categories or attributes exist:
+
+1. products per category (rolled up to ancestors via the category tree)
+2. price buckets, in-stock and on-sale counts (one conditional aggregate)
+3. products per active variant attribute (name/value)
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from .category_tree import get_category_tree
+from .models import Product, ProductVariant
+from .search import search_products
+
+# Upper bounds of the price buckets; the last bucket is open ended
+DEFAULT_PRICE_FACETS = [1000, 5000, 10000, 50000]
+
+# Query parameters read by filter_products()
+FILTER_PARAMS = ('search', 'category', 'min_price', 'max_price', 'in_stock', 'on_sale', 'attr')
+
+IN_STOCK = Q(manage_stock=False) | Q(stock_quantity__gt=0)
+# A zero sale_price means no sale, as in Product.get_price
+ON_SALE = Q(sale_price__isnull=False, sale_price__lt=F('price')) & ~Q(sale_price=0)
+
+
+def _decimal(value):
+    try:
+        return Decimal(value) if value not in (None, '') else None
+    except (InvalidOperation, TypeError):
+        return None
+
+
+def parse_attribute_filters(values):
+    """["Metal:Gold", "Size:7"] -> [("Metal", "Gold"), ("Size", "7")]"""
+    attributes = []
+    for value in values:
+        name, sep, option = value.partition(':')
+        if sep and name and option:
+            attributes.append((name, option))
+    return attributes
+
+
+def filter_products(params, category_tree=None):
+    """
+    Return (queryset, filters) for the active products matching params
+    (a QueryDict). filters holds the parsed values for templates/JSON.
+    """
+    category_tree = category_tree or get_category_tree()
+    qs = Product.objects.filter(is_active=True).select_related("category")
+
+    search_query = params.get('search', '')
+    if search_query:
+        qs = search_products(qs, search_query)
+
+    selected_category = None
+    category_slug = params.get('category', '')
+    if category_slug:
+        selected_category = category_tree.get(category_slug)
+        if selected_category is not None:
+            # Include products from child categories (path range)
+            qs = qs.filter(**selected_category.subtree_lookup('category__'))
+
+    min_price = params.get('min_price')
+    max_price = params.get('max_price')
+    if _decimal(min_price) is not None:
+        qs = qs.filter(effective_price__gte=_decimal(min_price))
+    if _decimal(max_price) is not None:
+        qs = qs.filter(effective_price__lte=_decimal(max_price))
+
+    in_stock = params.get('in_stock') == '1'
+    if in_stock:
+        qs = qs.filter(IN_STOCK)
+
+    on_sale = params.get('on_sale') == '1'
+    if on_sale:
+        qs = qs.filter(ON_SALE)
+
+    attributes = parse_attribute_filters(params.getlist('attr'))
+    for name, value in attributes:
+        qs = qs.filter(Exists(ProductVariant.objects.filter(
+            product=OuterRef('pk'), is_active=True, name=name, value=value
+        )))
+
+    filters = {
+        'search_query': search_query,
+        'selected_category': selected_category,
+        'min_price': min_price,
+        'max_price': max_price,
+        'in_stock': in_stock,
+        'on_sale': on_sale,
+        'attributes': attributes,
+    }
+    return qs, filters
+
+
+def get_price_buckets():
+    bounds = getattr(settings, 'CATALOG_PRICE_FACETS', DEFAULT_PRICE_FACETS)
+    buckets, lower = [], None
+    for upper in list(bounds) + [None]:
+        buckets.append((lower, upper))
+        lower = upper
+    return buckets
+
+
+def get_facets(queryset, category_tree=None):
+    """Facet counts for a filtered product queryset (three queries)"""
+    category_tree = category_tree or get_category_tree()
+    # Plain id subquery: drops select_related, search annotations and ordering
+    base = Product.objects.filter(pk__in=queryset.order_by().values('pk'))
+
+    # 1. Categories, each count including its subcategories
+    category_counts = {}
+    for category_id, count in base.values_list('category_id').annotate(count=Count('id')).order_by():
+        category = category_tree.by_id.get(category_id)
+        if category is None:
+            continue
+        for node in category_tree.ancestors(category) + [category]:
+            category_counts[node.pk] = category_counts.get(node.pk, 0) + count
+
+    # 2. Price buckets, stock and sale flags in a single aggregate
+    buckets = get_price_buckets()
+    aggregates = {'total': Count('id'), 'in_stock': Count('id', filter=IN_STOCK), 'on_sale': Count('id', filter=ON_SALE)}
+    for index, (lower, upper) in enumerate(buckets):
+        bucket = Q()
+        if lower is not None:
+            bucket &= Q(effective_price__gte=lower)
+        if upper is not None:
+            bucket &= Q(effective_price__lt=upper)
+        aggregates[f'price_{index}'] = Count('id', filter=bucket)
+    totals = base.aggregate(**aggregates)
+
+    # 3. Variant attributes (products with at least one matching active variant)
+    attributes = {}
+    variant_counts = (
+        ProductVariant.objects.filter(product__in=base, is_active=True)
+        .values_list('name', 'value')
+        .annotate(count=Count('product', distinct=True))
+        .order_by('name', 'value')
+    )
+    for name, value, count in variant_counts:
+        attributes.setdefault(name, []).append({'value': value, 'count': count})
+
+    return {
+        'total': totals['total'],
+        'categories': [
+            {'id': category.pk, 'slug': category.slug, 'name': category.name,
+             'depth': category.depth, 'count': category_counts[category.pk]}
+            for category in _tree_order(category_tree)
+            if category.pk in category_counts
+        ],
+        'price_buckets': [
+            {'min': lower, 'max': upper, 'count': totals[f'price_{index}']}
+            for index, (lower, upper) in enumerate(buckets)
+            if totals[f'price_{index}']
+        ],
+        'in_stock': totals['in_stock'],
+        'on_sale': totals['on_sale'],
+        'attributes': [{'name': name, 'values': values} for name, values in attributes.items()],
+    }
+
+
+def _tree_order(category_tree):
+    for root in category_tree.roots:
+        yield root
+        yield from root.tree_descendants
@@ -0,0 +1,192 @@
+"""
+Responsive image derivatives for product, gallery and category images
+
+Every uploaded image gets resized renditions at IMAGE_DERIVATIVE_WIDTHS in
+each of IMAGE_DERIVATIVE_FORMATS, stored beside the original:
+
+    products/images/42/red-dress.jpg
+    products/images/42/derivatives/red-dress-320w.webp
+    products/images/42/derivatives/red-dress-320w.avif
+    products/images/42/derivatives/red-dress.json    <- manifest, written last
+
+Names are derived from the source name, so templates only need the manifest
+(which widths exist, cached per image) to build a srcset; an image without
+one is served as the original. Widths are never upscaled: a 500px upload
+gets 160/320/500 rather than 640/1024.
+
+Generation happens off the request: saving a model queues
+catalog.tasks.generate_image_derivatives for the task worker. Existing
+media is backfilled with `manage.py backfill_image_derivatives`.
+"""
+
+import hashlib
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+DEFAULT_WIDTHS = (160, 320, 640, 1024)
+DEFAULT_FORMATS = ('avif', 'webp', 'jpeg')
+QUALITY = {'avif': 55, 'webp': 78, 'jpeg': 82}
+EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+DERIVATIVES_DIR = 'derivatives'
+MANIFEST_TIMEOUT = 60 * 60 * 24
+MISSING_TIMEOUT = 60 * 5  # until a pending generation can be seen
+
+
+def derivative_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def derivative_formats():
+    formats = getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', DEFAULT_FORMATS)
+    # Encoders Pillow was built without are skipped rather than failing every upload
+    return tuple(fmt for fmt in formats if fmt in EXTENSIONS and _can_encode(fmt))
+
+
+def _can_encode(fmt):
+    if not PIL_AVAILABLE:
+        return False
+    Image.init()
+    return fmt.upper() in Image.SAVE
+
+
+# Naming
+
+def _split(name):
+    directory, filename = os.path.split(name)
+    return directory, os.path.splitext(filename)[0]
+
+
+def derivative_name(name, width, fmt):
+    directory, stem = _split(name)
+    return f"{directory}/{DERIVATIVES_DIR}/{stem}-{width}w.{EXTENSIONS[fmt]}"
+
+
+def manifest_name(name):
+    directory, stem = _split(name)
+    return f"{directory}/{DERIVATIVES_DIR}/{stem}.json"
+
+
+def _cache_key(name):
+    return 'imagederivatives:' + hashlib.md5(name.encode()).hexdigest()
+
+
+# Lookup
+
+def get_manifest(name):
+    """The manifest for an image name (cached), or None if it has no derivatives yet"""
+    if not name:
+        return None
+    key = _cache_key(name)
+    manifest = cache.get(key)
+    if manifest is None:
+        try:
+            with default_storage.open(manifest_name(name)) as handle:
+                manifest = json.load(handle)
+        except (OSError, ValueError):
+            manifest = False
+        cache.set(key, manifest, MANIFEST_TIMEOUT if manifest else MISSING_TIMEOUT)
+    return manifest or None
+
+
+def renditions(name, fmt):
+    """[(url, width), ...] for one format, smallest first; empty without derivatives"""
+    manifest = get_manifest(name)
+    if not manifest or fmt not in manifest['formats']:
+        return []
+    return [(default_storage.url(derivative_name(name, width, fmt)), width) for width in manifest['widths']]
+
+
+# Generation
+
+def _target_widths(source_width):
+    return sorted({min(width, source_width) for width in derivative_widths()})
+
+
+def _encode(image, fmt):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # JPEG has no alpha: flatten transparent PNGs onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, fmt.upper(), quality=QUALITY[fmt])
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, force=False):
+    """
+    Write every rendition of the stored image `name` and its manifest.
+    Returns the number of files written (0 when already up to date).
+    """
+    if not PIL_AVAILABLE or not name or not default_storage.exists(name):
+        return 0
+    size = default_storage.size(name)
+    previous = get_manifest(name)
+    if not force:
+        manifest = previous
+        if (manifest and manifest['size'] == size and manifest['formats'] == list(derivative_formats())
+                and manifest['configured'] == list(derivative_widths())):
+            return 0
+
+    with default_storage.open(name) as handle:
+        source = Image.open(handle)
+        source = ImageOps.exif_transpose(source)
+        source.load()
+
+    formats = derivative_formats()
+    widths = _target_widths(source.width)
+    written = 0
+    for width in widths:
+        height = max(round(source.height * width / source.width), 1)
+        resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            target = derivative_name(name, width, fmt)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(_encode(resized, fmt)))
+            written += 1
+
+    manifest = {
+        'source': name, 'size': size, 'width': source.width, 'height': source.height,
+        'widths': widths, 'formats': list(formats), 'configured': list(derivative_widths()),
+    }
+    target = manifest_name(name)
+    if default_storage.exists(target):
+        default_storage.delete(target)
+    default_storage.save(target, ContentFile(json.dumps(manifest).encode()))
+    cache.set(_cache_key(name), manifest, MANIFEST_TIMEOUT)
+    _delete_unlisted(name, previous, manifest)
+    return written + 1
+
+
+def _rendition_names(name, manifest):
+    return {derivative_name(name, width, fmt) for width in manifest['widths'] for fmt in manifest['formats']}
+
+
+def _delete_unlisted(name, previous, manifest):
+    """
+    Delete renditions the previous manifest listed and the new one doesn't
+    (a width or format dropped from settings, or a smaller replacement upload).
+    Runs after the new manifest is saved, so no srcset points at them anymore.
+    """
+    if not previous:
+        return
+    for stale in _rendition_names(name, previous) - _rendition_names(name, manifest):
+        if default_storage.exists(stale):
+            default_storage.delete(stale)
@@ -0,0 +1,91 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from catalog.images import derivative_formats, derivative_widths, generate_derivatives
+from catalog.models import Category, Product, ProductImage
+from core.page_cache import invalidate_tags
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Workers only touch storage, never the parent's database connection
+    connections.close_all()
+
+
+def _generate(name, force):
+    try:
+        return name, generate_derivatives(name, force=force), None
+    except Exception as e:
+        return name, 0, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive image derivatives for existing product, gallery and category images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+        parser.add_argument('--force', action='store_true', help='Regenerate images that are already up to date')
+        parser.add_argument('--model', choices=['product', 'gallery', 'category'], action='append', dest='models',
+                            help='Only these image sets (repeatable, default: all)')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        # Image sets with the page cache tags their pages carry (as in catalog.signals)
+        sources = {
+            'product': (Product.objects.exclude(image=''), 'pk', lambda pk: ('products', f'product:{pk}')),
+            'gallery': (ProductImage.objects.exclude(image=''), 'product_id', lambda pk: (f'product:{pk}',)),
+            'category': (Category.objects.exclude(image=''), 'pk', lambda pk: ('navigation',)),
+        }
+        self.tags = {}
+        for key in options['models'] or sources:
+            queryset, owner, tags = sources[key]
+            for name, pk in queryset.exclude(image__isnull=True).values_list('image', owner):
+                self.tags.setdefault(name, set()).update(tags(pk))
+        names = sorted(self.tags)
+
+        workers = max(options['workers'], 1)
+        self.stdout.write(
+            f"Backfilling {len(names)} image(s) at widths {list(derivative_widths())} "
+            f"as {', '.join(derivative_formats())} with {workers} worker(s)..."
+        )
+
+        start = time.perf_counter()
+        generated = errors = 0
+        if workers > 1 and len(names) > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(_generate, name, options['force']) for name in names]
+                results = (future.result() for future in as_completed(futures))
+                generated, errors = self.report(results)
+        else:
+            generated, errors = self.report(_generate(name, options['force']) for name in names)
+
+        if self.stale_tags:
+            # Cached pages still point at the originals
+            invalidate_tags(*self.stale_tags)
+
+        elapsed = time.perf_counter() - start
+        style = self.style.WARNING if errors else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Generated derivatives for {generated} image(s), {len(names) - generated - errors} up to date or missing, "
+            f"{errors} error(s) in {elapsed:.1f}s"
+        ))
+
+    def report(self, results):
+        generated = errors = 0
+        self.stale_tags = set()
+        for name, written, error in results:
+            if error:
+                errors += 1
+                self.stderr.write(self.style.ERROR(f"  {name}: {error}"))
+            elif written:
+                generated += 1
+                self.stale_tags.update(self.tags[name])
+                if self.verbosity > 1:
+                    self.stdout.write(f"  {name}: {written} file(s)")
+        return generated, errors
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized rating_avg/rating_count for all products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to update')
+
+    def handle(self, *args, **options):
+        updated = Product.refresh_rating_aggregates(using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed rating aggregates for {updated} products"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.cart_storage import purge_stale_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete anonymous server-side carts that were not updated within SESSION_COOKIE_AGE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, help='Age in seconds (default: SESSION_COOKIE_AGE)')
+
+    def handle(self, *args, **options):
+        deleted = purge_stale_carts(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} stale anonymous carts"))
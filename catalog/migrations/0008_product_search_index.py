@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:41
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from catalog.search import get_backend_class
+
+    connection = schema_editor.connection
+    get_backend_class(connection)(connection.alias).create_index(schema_editor)
+
+
+def populate_search_index(apps, schema_editor):
+    from catalog.search import get_backend_class
+
+    Product = apps.get_model('catalog', 'Product')
+    connection = schema_editor.connection
+    backend = get_backend_class(connection)(connection.alias)
+    backend.rebuild(Product.objects.using(connection.alias).all())
+
+
+def drop_search_index(apps, schema_editor):
+    from catalog.search import get_backend_class
+
+    connection = schema_editor.connection
+    get_backend_class(connection)(connection.alias).drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_sitesettings_site_name_sitesettings_theme'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
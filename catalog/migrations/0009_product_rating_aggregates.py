@@ -0,0 +1,43 @@
+# Generated by Django 4.2.21 on 2026-10-16 20:41
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    ProductReview = apps.get_model('catalog', 'ProductReview')
+
+    approved = ProductReview.objects.filter(
+        product=models.OuterRef('pk'), is_approved=True
+    ).order_by().values('product')
+    Product.objects.using(schema_editor.connection.alias).update(
+        rating_count=Coalesce(
+            models.Subquery(approved.annotate(c=models.Count('pk')).values('c')), 0
+        ),
+        rating_avg=Coalesce(
+            models.Subquery(approved.annotate(a=models.Avg('rating')).values('a')),
+            0, output_field=models.DecimalField(max_digits=2, decimal_places=1)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=2),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.21 on 2026-10-16 21:34
+
+from django.db import migrations, models
+
+
+def backfill_category_paths(apps, schema_editor):
+    """Compute path/depth for existing categories, parents before children"""
+    Category = apps.get_model('catalog', 'Category')
+    db_alias = schema_editor.connection.alias
+
+    categories = list(Category.objects.using(db_alias).only('id', 'parent_id'))
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+
+    updated = []
+    stack = [(category, '', 0) for category in children.get(None, [])]
+    while stack:
+        category, parent_path, depth = stack.pop()
+        category.path = f"{parent_path}{category.pk:08d}/"
+        category.depth = depth
+        updated.append(category)
+        stack.extend((child, category.path, depth + 1) for child in children.get(category.pk, []))
+
+    Category.objects.using(db_alias).bulk_update(updated, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_storedcart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
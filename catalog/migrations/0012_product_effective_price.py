@@ -0,0 +1,34 @@
+# Generated by Django 4.2.21 on 2026-10-16 20:57
+
+from django.db import migrations, models
+
+
+def backfill_effective_price(apps, schema_editor):
+    """effective_price = sale_price if set (and non-zero), else price"""
+    Product = apps.get_model('catalog', 'Product')
+    Product.objects.using(schema_editor.connection.alias).update(
+        effective_price=models.Case(
+            models.When(models.Q(sale_price__isnull=False) & ~models.Q(sale_price=0), then='sale_price'),
+            default='price',
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price', 'id'], name='catalog_product_price_idx'),
+        ),
+    ]
@@ -1,7 +1,10 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, router, transaction
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.conf import settings
 import os
 from django.utils.text import slugify
+from core.singletons import CachedSingletonMixin
 
 
 def category_image_path(instance, filename):
@@ -45,6 +48,9 @@ class Category(models.Model):
     image = models.ImageField(upload_to=category_image_path, blank=True, null=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, related_name='children')
     is_active = models.BooleanField(default=True)
+    # Materialized path of ancestor ids ("00000001/00000004/"), maintained in save()
+    path = models.CharField(max_length=255, blank=True, default="", db_index=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -52,13 +58,79 @@ class Category(models.Model):
 
     def __str__(self):
         return self.name
-    
+
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if self.parent_id == self.pk or (self.path and parent_path.startswith(self.path)):
+                raise ValidationError({'parent': "A category can't be moved under itself or one of its subcategories."})
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent' not in update_fields:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            # Current stored path (may have changed since this instance was loaded) and the parent's
+            known = {
+                pk: (path, depth)
+                for pk, path, depth in Category.objects.filter(pk__in=[self.pk, self.parent_id])
+                .values_list('pk', 'path', 'depth')
+            }
+            old_path, old_depth = known.get(self.pk, ('', 0)) if self.pk else ('', 0)
+            parent_path, parent_depth = known.get(self.parent_id, ('', -1)) if self.parent_id else ('', -1)
+            if old_path and parent_path.startswith(old_path):
+                raise ValueError("A category can't be moved under itself or one of its subcategories.")
+
+            if self.pk:
+                self.path = parent_path + category_path_segment(self.pk)
+                self.depth = parent_depth + 1
+                if update_fields is not None:
+                    kwargs['update_fields'] = set(update_fields) | {'path', 'depth'}
+                super().save(*args, **kwargs)
+            else:
+                # The id is only known after the INSERT
+                super().save(*args, **kwargs)
+                self.path = parent_path + category_path_segment(self.pk)
+                self.depth = parent_depth + 1
+                Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
+            if old_path and old_path != self.path:
+                # Moved: rewrite the whole subtree's paths in one UPDATE
+                Category.objects.filter(path__gte=old_path, path__lt=old_path[:-1] + '0').exclude(pk=self.pk).update(
+                    path=Concat(models.Value(self.path), Substr('path', len(old_path) + 1), output_field=models.CharField()),
+                    depth=models.F('depth') + (self.depth - old_depth),
+                )
+
+    def subtree_lookup(self, prefix=''):
+        """
+        Filter kwargs matching this category and everything below it.
+        A range on path rather than LIKE 'path%', so every database can
+        use the path index ('/' sorts right before '0').
+        """
+        return {f'{prefix}path__gte': self.path, f'{prefix}path__lt': self.path[:-1] + '0'}
+
+    def get_descendants(self, include_self=False):
+        """All categories below this one, in a single indexed query"""
+        qs = Category.objects.filter(**self.subtree_lookup())
+        if not include_self:
+            qs = qs.exclude(pk=self.pk)
+        return qs
+
+    def get_ancestors(self):
+        """Categories above this one, root first"""
+        ids = [int(segment) for segment in self.path.split('/')[:-2] if segment]
+        return Category.objects.filter(pk__in=ids).order_by('depth')
+
     def get_all_children(self):
         """Get all child categories recursively"""
-        children = list(self.children.all())
-        for child in self.children.all():
-            children.extend(child.get_all_children())
-        return children
+        return list(self.get_descendants())
+
+
+def category_path_segment(pk):
+    """Fixed-width path segment for a category id, so paths sort and prefix-match"""
+    return f"{pk:08d}/"
 
 class Product(models.Model):
     title = models.CharField(max_length=200)
@@ -66,6 +138,10 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     sale_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, help_text="Leave empty if no sale")
+    # Price the storefront charges (get_price), stored so filters and sorting can use an index.
+    # Maintained in save() rather than as a GeneratedField: requirements-minimal.txt pins
+    # Django 5.2, but requirements.txt still pins Django 4.2.21, which predates GeneratedField (5.0).
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
     description = models.TextField(blank=True, default="")
     short_description = models.CharField(max_length=300, blank=True, default="")
     image = models.ImageField(upload_to=product_image_path, blank=True, null=True)
@@ -75,15 +151,48 @@ class Product(models.Model):
     featured = models.BooleanField(default=False)
     weight = models.DecimalField(max_digits=6, decimal_places=2, blank=True, null=True, help_text="Weight in kg")
     sku = models.CharField(max_length=100, blank=True, unique=True, null=True, help_text="Stock Keeping Unit")
+    # Denormalized from approved ProductReview rows, kept in sync by catalog.signals
+    rating_avg = models.DecimalField(max_digits=2, decimal_places=1, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Partial indexes over active products only: the storefront always
+            # filters is_active=True, which some backends can't seek on directly.
+            # Price range filters and price sorting (keyset on effective_price, id)
+            models.Index(fields=['effective_price', 'id'], name='catalog_product_price_idx',
+                         condition=models.Q(is_active=True)),
+            # Home page and product_list default "newest" order
+            models.Index(fields=['created_at', 'id'], name='catalog_product_created_idx',
+                         condition=models.Q(is_active=True)),
+            # Category-filtered product_list
+            models.Index(fields=['category', 'created_at'], name='catalog_product_category_idx',
+                         condition=models.Q(is_active=True)),
+            # "Featured" sort
+            models.Index(fields=['featured', 'created_at'], name='catalog_product_featured_idx',
+                         condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def effective_price_expression(cls):
+        """SQL equivalent of get_price, for bulk refreshes"""
+        return models.Case(
+            models.When(models.Q(sale_price__isnull=False) & ~models.Q(sale_price=0), then='sale_price'),
+            default='price',
+        )
+
+    @classmethod
+    def refresh_effective_prices(cls, queryset=None):
+        """Recompute effective_price after queryset.update() of price/sale_price"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.update(effective_price=cls.effective_price_expression())
+
     @property
     def get_price(self):
         """Return sale price if available, otherwise regular price"""
@@ -94,7 +203,7 @@ class Product(models.Model):
     @property
     def is_on_sale(self):
         """Check if product is currently on sale"""
-        return self.sale_price is not None and self.sale_price < self.price
+        return bool(self.sale_price) and self.sale_price < self.price
 
     @property
     def discount_percentage(self):
@@ -112,11 +221,14 @@ class Product(models.Model):
 
     def reduce_stock(self, quantity):
         """Reduce stock quantity (used when order is placed)"""
-        if self.manage_stock and self.stock_quantity >= quantity:
-            self.stock_quantity -= quantity
-            self.save()
-            return True
-        return False
+        if not self.manage_stock:
+            return False
+        # Conditional UPDATE so concurrent orders can't oversell
+        updated = Product.objects.filter(
+            pk=self.pk, manage_stock=True, stock_quantity__gte=quantity
+        ).update(stock_quantity=models.F('stock_quantity') - quantity)
+        self.refresh_from_db(fields=['stock_quantity'])
+        return bool(updated)
 
     def get_related_products(self, limit=4):
         """Get related products from same category"""
@@ -125,16 +237,46 @@ class Product(models.Model):
             is_active=True
         ).exclude(id=self.id)[:limit]
 
+    def get_active_variants(self):
+        """Variants offered on the product page"""
+        return self.variants.filter(is_active=True)
+
+    def get_approved_reviews(self):
+        """Approved reviews with their authors, newest first"""
+        return self.reviews.filter(is_approved=True).select_related('user')
+
     def get_average_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(reviews.aggregate(models.Avg('rating'))['rating__avg'], 1)
+        """Average rating of approved reviews (from the denormalized column)"""
+        if self.rating_count:
+            return float(self.rating_avg)
         return 0
 
     def get_review_count(self):
-        """Get count of approved reviews"""
-        return self.reviews.filter(is_approved=True).count()
+        """Get count of approved reviews (from the denormalized column)"""
+        return self.rating_count
+
+    @classmethod
+    def refresh_rating_aggregates(cls, product_ids=None, using=None):
+        """
+        Recompute rating_avg/rating_count from approved reviews in a single
+        UPDATE on the `using` database. Pass product_ids to limit the update,
+        or None for all products.
+        """
+        approved = ProductReview.objects.filter(
+            product=models.OuterRef('pk'), is_approved=True
+        ).order_by().values('product')
+        queryset = cls.objects.db_manager(using).all()
+        if product_ids is not None:
+            queryset = queryset.filter(pk__in=product_ids)
+        return queryset.update(
+            rating_count=Coalesce(
+                models.Subquery(approved.annotate(c=models.Count('pk')).values('c')), 0
+            ),
+            rating_avg=Coalesce(
+                models.Subquery(approved.annotate(a=models.Avg('rating')).values('a')),
+                0, output_field=models.DecimalField(max_digits=2, decimal_places=1)
+            ),
+        )
 
     def get_all_images(self):
         """Get all product images including main image"""
@@ -173,54 +315,50 @@ class Product(models.Model):
 
     def save(self, *args, **kwargs):
         """Custom save method to handle image organization"""
-        # Check if this is a new product (no pk) and has an image
+        from .tasks import move_temp_image
+
         is_new_product = not self.pk
-        old_image_path = None
 
-        if is_new_product and self.image:
-            # Store the temporary path
-            old_image_path = self.image.name
+        self.effective_price = self.get_price
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'sale_price'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'effective_price'}
 
         # Save the product first to get the ID
         super().save(*args, **kwargs)
 
-        # If this was a new product with an image in temp folder, move it to the proper location
-        if is_new_product and old_image_path and old_image_path.startswith('products/images/temp/'):
-            self._move_temp_image_to_product_folder()
+        # A new upload is stored under temp/ (upload_to ran before there was an
+        # id); a background worker moves it to the product's folder
+        if is_new_product and self.image and self.image.name.startswith('products/images/temp/'):
+            move_temp_image.delay('catalog.Product', self.pk)
 
     def _move_temp_image_to_product_folder(self):
-        """Move image from temp folder to product-specific folder"""
+        """Move image from temp folder to product-specific folder (run by catalog.tasks.move_temp_image)"""
         if not self.image:
             return
 
-        try:
-            from django.core.files.storage import default_storage
-            import shutil
+        import shutil
 
-            old_path = self.image.path
-            old_name = self.image.name
+        old_path = self.image.path
+        old_name = self.image.name
 
-            if 'temp/' in old_name:
-                # Generate new path
-                filename = os.path.basename(old_name)
-                new_name = f"products/images/{self.pk}/{filename}"
-                new_path = os.path.join(settings.MEDIA_ROOT, new_name)
+        if 'temp/' in old_name:
+            # Generate new path
+            filename = os.path.basename(old_name)
+            new_name = f"products/images/{self.pk}/{filename}"
+            new_path = os.path.join(settings.MEDIA_ROOT, new_name)
 
-                # Create directory if it doesn't exist
-                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            # Create directory if it doesn't exist
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
 
-                # Move the file
-                if os.path.exists(old_path):
-                    shutil.move(old_path, new_path)
+            # Move the file
+            if os.path.exists(old_path):
+                shutil.move(old_path, new_path)
 
-                    # Update the image field
-                    self.image.name = new_name
-                    super().save(update_fields=['image'])
-
-        except Exception as e:
-            # Log error but don't break the save process
-            print(f"Error moving product image: {e}")
-            pass
+            # Update the image field (also when a retried task finds it already moved)
+            if os.path.exists(new_path):
+                self.image.name = new_name
+                super().save(update_fields=['image'])
 
 
 class ProductImage(models.Model):
@@ -244,50 +382,43 @@ class ProductImage(models.Model):
         if not self.alt_text:
             self.alt_text = f"{self.product.title} - Image {self.order}"
 
-        # Check if this is a new image and has a temp path
-        is_new_image = not self.pk
-        old_image_path = None
+        from .tasks import move_temp_image
 
-        if is_new_image and self.image:
-            old_image_path = self.image.name
+        is_new_image = not self.pk
 
         super().save(*args, **kwargs)
 
-        # Move temp image to proper location if needed
-        if is_new_image and old_image_path and 'temp/' in old_image_path:
-            self._move_temp_image_to_product_folder()
+        # Move temp image to proper location in the background if needed
+        if is_new_image and self.image and 'temp/' in self.image.name:
+            move_temp_image.delay('catalog.ProductImage', self.pk)
 
     def _move_temp_image_to_product_folder(self):
-        """Move gallery image from temp folder to product-specific folder"""
+        """Move gallery image from temp folder to product-specific folder (run by catalog.tasks.move_temp_image)"""
         if not self.image:
             return
 
-        try:
-            import shutil
+        import shutil
 
-            old_path = self.image.path
-            old_name = self.image.name
+        old_path = self.image.path
+        old_name = self.image.name
 
-            if 'temp/' in old_name:
-                # Generate new path
-                filename = os.path.basename(old_name)
-                new_name = f"products/images/{self.product.pk}/{filename}"
-                new_path = os.path.join(settings.MEDIA_ROOT, new_name)
+        if 'temp/' in old_name:
+            # Generate new path
+            filename = os.path.basename(old_name)
+            new_name = f"products/images/{self.product.pk}/{filename}"
+            new_path = os.path.join(settings.MEDIA_ROOT, new_name)
 
-                # Create directory if it doesn't exist
-                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            # Create directory if it doesn't exist
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
 
-                # Move the file
-                if os.path.exists(old_path):
-                    shutil.move(old_path, new_path)
+            # Move the file
+            if os.path.exists(old_path):
+                shutil.move(old_path, new_path)
 
-                    # Update the image field
-                    self.image.name = new_name
-                    super().save(update_fields=['image'])
-
-        except Exception as e:
-            print(f"Error moving gallery image: {e}")
-            pass
+            # Update the image field (also when a retried task finds it already moved)
+            if os.path.exists(new_path):
+                self.image.name = new_name
+                super().save(update_fields=['image'])
 
 
 class ProductVariant(models.Model):
@@ -321,11 +452,12 @@ class ProductVariant(models.Model):
 
     def reduce_stock(self, quantity):
         """Reduce variant stock quantity (used when order is placed)"""
-        if self.stock_quantity >= quantity:
-            self.stock_quantity -= quantity
-            self.save()
-            return True
-        return False
+        # Conditional UPDATE so concurrent orders can't oversell
+        updated = ProductVariant.objects.filter(
+            pk=self.pk, stock_quantity__gte=quantity
+        ).update(stock_quantity=models.F('stock_quantity') - quantity)
+        self.refresh_from_db(fields=['stock_quantity'])
+        return bool(updated)
 
 class ProductReview(models.Model):
     """Product reviews and ratings"""
@@ -343,11 +475,39 @@ class ProductReview(models.Model):
     class Meta:
         unique_together = ['product', 'user']
         ordering = ['-created_at']
+        indexes = [
+            # Approved reviews on product_detail and the rating aggregate refresh
+            models.Index(fields=['product', 'is_approved', 'created_at'], name='catalog_review_approved_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.product.title} ({self.rating}/5)"
 
-class SiteSettings(models.Model):
+    def save(self, *args, **kwargs):
+        """Save the review and refresh the product's rating aggregates atomically"""
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            Product.refresh_rating_aggregates([self.product_id], using=self._state.db)
+
+class StoredCart(models.Model):
+    """Server-side cart contents (see catalog.cart_storage.DatabaseCartStorage)"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='stored_cart'
+    )
+    token = models.CharField(max_length=32, unique=True, null=True, blank=True, help_text="Anonymous cart token")
+    data = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Stored Cart"
+        verbose_name_plural = "Stored Carts"
+
+    def __str__(self):
+        owner = self.user or f"anonymous {self.token}"
+        return f"Cart of {owner}"
+
+class SiteSettings(CachedSingletonMixin, models.Model):
     """Global site settings"""
     CURRENCY_CHOICES = [
         ('USD', 'US Dollar ($)'),
@@ -440,12 +600,6 @@ class SiteSettings(models.Model):
     def __str__(self):
         return "Site Settings"
     
-    @classmethod
-    def get_settings(cls):
-        """Get or create site settings"""
-        settings, created = cls.objects.get_or_create(pk=1)
-        return settings
-
     def get_currency_symbol(self):
         """Get the currency symbol for the selected currency"""
         return self.CURRENCY_SYMBOLS.get(self.default_currency, '₹')
@@ -456,12 +610,12 @@ class SiteSettings(models.Model):
         return self.get_currency_symbol()
 
     def save(self, *args, **kwargs):
-        """Clear theme and admin cache when settings are saved"""
+        """Clear the admin cache when settings are saved"""
         super().save(*args, **kwargs)
-        # Clear theme cache to force reload
+        # Compiled templates are cached per theme, so switching themes needs
+        # no reset; template files only change on deploy (restart)
         try:
             from django.core.cache import cache
-            cache.delete('current_theme')
             cache.delete('admin_site_name')  # Clear admin site name cache
         except:
             pass
@@ -0,0 +1,268 @@
+"""
+Product search backends for the catalog.
+
+Search goes through an inverted index instead of LIKE '%q%' scans:
+SQLite uses an FTS5 virtual table, PostgreSQL a tsvector side table with a
+GIN index. Other databases (or a SQLite build without FTS5) fall back to
+the original icontains filters. The index is kept in sync by the Product
+signals in catalog.signals and can be rebuilt with
+`python manage.py rebuild_search_index`.
+
+Matching changed with the index: the query is split into word tokens
+(punctuation is ignored) and every token must match a whole word in the
+title, SKU, short description or description, except the last token which
+also matches word prefixes. "lun" finds "Luna", but "olished" no longer
+finds "hand-polished" the way the old substring search did. Only the
+icontains fallback keeps substring matching.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Relative column weights used when ranking matches
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'sku': 8.0,
+    'short_description': 4.0,
+    'description': 1.0,
+}
+INDEXED_FIELDS = tuple(FIELD_WEIGHTS)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Split a raw search string into index tokens"""
+    return TOKEN_RE.findall(query.lower())
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements"""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def create_index(self, schema_editor):
+        """Create the index storage (called from migrations)"""
+
+    def drop_index(self, schema_editor):
+        """Drop the index storage (called from migrations)"""
+
+    def index_product(self, product):
+        """Add or refresh a single product in the index"""
+
+    def remove_product(self, product_id):
+        """Remove a single product from the index"""
+
+    def rebuild(self, queryset, batch_size=500):
+        """Reindex every product in queryset, returns the number indexed"""
+        count = 0
+        for product in queryset.iterator(chunk_size=batch_size):
+            self.index_product(product)
+            count += 1
+        return count
+
+    def search(self, queryset, query):
+        """
+        Filter queryset down to products matching query.
+        The result is annotated with `search_rank` (higher is better).
+        """
+        raise NotImplementedError
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Fallback backend: substring matching without an index"""
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(short_description__icontains=query) |
+            Q(sku__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5 backend, the virtual table rowid is the product id"""
+
+    table = 'catalog_product_fts'
+
+    def create_index(self, schema_editor):
+        columns = ', '.join(INDEXED_FIELDS)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            f"{columns}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index_product(self, product):
+        columns = ', '.join(INDEXED_FIELDS)
+        placeholders = ', '.join(['%s'] * (len(INDEXED_FIELDS) + 1))
+        values = [product.pk] + [getattr(product, field) or '' for field in INDEXED_FIELDS]
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, {columns}) VALUES ({placeholders})",
+                values
+            )
+
+    def remove_product(self, product_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def rebuild(self, queryset, batch_size=500):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        return super().rebuild(queryset, batch_size)
+
+    def match_expression(self, query):
+        """Quote every token and make the last one a prefix match"""
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if match is None:
+            return queryset.none()
+
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in INDEXED_FIELDS)
+        product_table = queryset.model._meta.db_table
+        # bm25() is lower-is-better, negate it so search_rank sorts descending
+        rank = RawSQL(
+            f"SELECT -bm25({self.table}, {weights}) FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND {self.table}.rowid = {product_table}.id",
+            (match,),
+            output_field=FloatField()
+        )
+        matches = RawSQL(f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", (match,))
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """PostgreSQL backend using a weighted tsvector side table with a GIN index"""
+
+    table = 'catalog_product_search'
+    config = 'simple'
+    weight_labels = {'title': 'A', 'sku': 'A', 'short_description': 'B', 'description': 'C'}
+
+    def create_index(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            f"product_id bigint PRIMARY KEY REFERENCES catalog_product(id) "
+            f"ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            f"document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_document_idx "
+            f"ON {self.table} USING GIN (document)"
+        )
+
+    def drop_index(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def _document_sql(self):
+        parts = [
+            f"setweight(to_tsvector('{self.config}', %s), '{self.weight_labels[field]}')"
+            for field in INDEXED_FIELDS
+        ]
+        return ' || '.join(parts)
+
+    def index_product(self, product):
+        values = [product.pk] + [getattr(product, field) or '' for field in INDEXED_FIELDS]
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (product_id, document) "
+                f"VALUES (%s, {self._document_sql()}) "
+                f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                values
+            )
+
+    def remove_product(self, product_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE product_id = %s", [product_id])
+
+    def rebuild(self, queryset, batch_size=500):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+        return super().rebuild(queryset, batch_size)
+
+    def tsquery(self, query):
+        """AND every token and make the last one a prefix match"""
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        tokens[-1] += ':*'
+        return ' & '.join(tokens)
+
+    def search(self, queryset, query):
+        tsquery = self.tsquery(query)
+        if tsquery is None:
+            return queryset.none()
+
+        product_table = queryset.model._meta.db_table
+        rank = RawSQL(
+            f"SELECT ts_rank_cd(document, to_tsquery('{self.config}', %s)) FROM {self.table} "
+            f"WHERE {self.table}.product_id = {product_table}.id",
+            (tsquery,),
+            output_field=FloatField()
+        )
+        matches = RawSQL(
+            f"SELECT product_id FROM {self.table} "
+            f"WHERE document @@ to_tsquery('{self.config}', %s)",
+            (tsquery,)
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_backends = {}
+
+
+def sqlite_has_fts5(connection):
+    """Check whether the SQLite library was compiled with FTS5"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def get_backend_class(connection):
+    """Pick the backend class for a connection, honouring CATALOG_SEARCH_BACKEND"""
+    backend_path = getattr(settings, 'CATALOG_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)
+
+    backend_class = VENDOR_BACKENDS.get(connection.vendor, LikeSearchBackend)
+    if backend_class is SQLiteFTSBackend and not sqlite_has_fts5(connection):
+        return LikeSearchBackend
+    return backend_class
+
+
+def get_search_backend(using=DEFAULT_DB_ALIAS):
+    """Return the (per-process memoized) search backend for a database alias"""
+    if using not in _backends:
+        _backends[using] = get_backend_class(connections[using])(using)
+    return _backends[using]
+
+
+def search_products(queryset, query):
+    """Filter a Product queryset by a free-text query"""
+    return get_search_backend(queryset.db).search(queryset, query)
@@ -0,0 +1,110 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.context_processors import invalidate_navigation_payload
+from core.page_cache import invalidate_tags
+
+from .models import Category, Product, ProductImage, ProductReview, ProductVariant, SiteSettings
+from .category_tree import invalidate_category_tree
+from .search import get_search_backend
+from .cart_storage import merge_carts_on_login
+from .tasks import schedule_derivatives
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, raw=False, using=None, **kwargs):
+    """Keep the search index in sync when a product is saved"""
+    if raw:
+        # Fixture loading: the index is rebuilt with rebuild_search_index
+        return
+    get_search_backend(using).index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search_index(sender, instance, using=None, **kwargs):
+    """Drop deleted products from the search index"""
+    get_search_backend(using).remove_product(instance.pk)
+
+
+@receiver(post_delete, sender=ProductReview)
+def refresh_product_rating_on_review_delete(sender, instance, using=None, **kwargs):
+    """Keep Product.rating_avg/rating_count correct when reviews are deleted"""
+    Product.refresh_rating_aggregates([instance.product_id], using=using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_tree(sender, **kwargs):
+    """Rebuild the cached navigation tree on the next request"""
+    invalidate_category_tree()
+    invalidate_navigation_payload()
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def refresh_navigation_payload(sender, **kwargs):
+    """Site name, theme and currency are part of the cached navigation payload"""
+    # After commit, like the settings row itself (see core.singletons)
+    transaction.on_commit(invalidate_navigation_payload)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def expire_product_pages(sender, instance, **kwargs):
+    """Cached pages showing this product: its detail page and every product list"""
+    invalidate_tags('products', f'product:{instance.pk}')
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def expire_product_detail_pages(sender, instance, **kwargs):
+    """Variants, images and reviews show on the detail page (and in list facets/ratings)"""
+    invalidate_tags('products', f'product:{instance.product_id}')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def expire_all_pages(sender, **kwargs):
+    """Categories and site settings are in the navigation of every page"""
+    if sender is SiteSettings:
+        transaction.on_commit(lambda: invalidate_tags('navigation'))
+    else:
+        invalidate_tags('navigation')
+
+
+def _image_changed(instance, raw, update_fields):
+    if raw or not instance.image or '/temp/' in instance.image.name:
+        # Uploads in temp/ are saved again once catalog.tasks.move_temp_image has moved them
+        return False
+    return update_fields is None or 'image' in update_fields
+
+
+@receiver(post_save, sender=Product)
+def generate_product_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Resized renditions of the main image, generated by the task worker (see catalog.images)"""
+    if _image_changed(instance, raw, update_fields):
+        schedule_derivatives(instance.image, tags=('products', f'product:{instance.pk}'))
+
+
+@receiver(post_save, sender=ProductImage)
+def generate_gallery_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    if _image_changed(instance, raw, update_fields):
+        schedule_derivatives(instance.image, tags=(f'product:{instance.product_id}',))
+
+
+@receiver(post_save, sender=Category)
+def generate_category_image_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    if _image_changed(instance, raw, update_fields):
+        schedule_derivatives(instance.image, tags=('navigation',))
+
+
+# Fold anonymous server-side carts into the user's cart on login
+user_logged_in.connect(merge_carts_on_login, dispatch_uid='catalog_merge_carts_on_login')
@@ -0,0 +1,28 @@
+"""Background tasks for catalog media (run by `manage.py run_tasks`)"""
+
+from django.apps import apps
+
+from core.page_cache import invalidate_tags
+from core.task_queue import task
+
+from .images import generate_derivatives
+
+
+@task(max_attempts=5)
+def move_temp_image(model_label, pk):
+    """Move a new upload out of products/images/temp/ into its product's folder"""
+    instance = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if instance is not None:
+        instance._move_temp_image_to_product_folder()
+
+
+@task
+def generate_image_derivatives(name, tags=()):
+    """Resized renditions of a stored image (see catalog.images)"""
+    if generate_derivatives(name) and tags:
+        # Cached pages still point at the original
+        invalidate_tags(*tags)
+
+
+def schedule_derivatives(field_file, tags=()):
+    generate_image_derivatives.enqueue(args=[field_file.name, list(tags)], unique_key=f'derivatives:{field_file.name}')
@@ -0,0 +1,60 @@
+"""
+Responsive product/category images (see catalog.images)
+
+    {% load image_tags %}
+    {% responsive_image product.image sizes="(min-width: 768px) 25vw, 50vw" alt=product.title class="w-full" %}
+    <img src="{{ product.image.url }}" srcset="{% srcset product.image %}" sizes="80px">
+
+responsive_image renders a <picture> with one <source> per configured
+format and a JPEG <img> fallback (the original when no JPEG renditions
+exist); images without derivatives (yet) render as a plain <img> of the
+original. srcset returns "" in that case.
+"""
+
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from catalog.images import MIME_TYPES, get_manifest, renditions
+
+register = template.Library()
+
+# Formats every browser can show in a plain <img>, preferred first
+FALLBACK_FORMATS = ('jpeg', 'png')
+
+
+def _srcset(name, fmt):
+    return ', '.join(f'{url} {width}w' for url, width in renditions(name, fmt))
+
+
+@register.simple_tag
+def srcset(image, fmt='jpeg'):
+    """srcset value for an ImageField file in one format"""
+    if not image:
+        return ''
+    return _srcset(image.name, fmt)
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', alt='', **attrs):
+    if not image:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+
+    manifest = get_manifest(image.name)
+    # No encoder at generation time leaves a manifest without formats
+    if not manifest or not manifest['formats']:
+        return format_html('<img src="{}" alt="{}"{}>', image.url, alt, extra)
+
+    # Every browser decodes the <img> fallback: JPEG when generated, else the
+    # original; the other formats become <source>s
+    fallback = next((fmt for fmt in FALLBACK_FORMATS if fmt in manifest['formats']), None)
+    sources = [fmt for fmt in manifest['formats'] if fmt != fallback]
+    fallback_srcset = _srcset(image.name, fallback) if fallback else ''
+    return format_html(
+        '<picture>{}<img src="{}"{} sizes="{}" alt="{}"{}></picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+            (MIME_TYPES[fmt], _srcset(image.name, fmt), sizes) for fmt in sources
+        )),
+        image.url, format_html(' srcset="{}"', fallback_srcset) if fallback_srcset else '', sizes, alt, extra,
+    )
@@ -1,3 +1,619 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Task
+from core.page_cache import tag_versions
+from core.task_queue import run_pending
+from core.themes import list_themes, use_theme
+from users.models import User
+
+from .cart import Cart
+from .cart_storage import CART_TOKEN_SESSION_KEY, merge_cart_data
+from .category_tree import get_category_tree
+from .facets import filter_products, get_facets
+from .images import derivative_name, generate_derivatives, get_manifest, manifest_name
+from .models import Category, Product, ProductReview, ProductVariant, StoredCart
+from .search import (
+    VENDOR_BACKENDS, LikeSearchBackend, PostgresSearchBackend, SQLiteFTSBackend, get_backend_class,
+    get_search_backend, search_products, sqlite_has_fts5,
+)
+
+
+class SearchTests(TestCase):
+    """Product search goes through the index kept in sync by the Product signals"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tee = Product.objects.create(title="Rock 'n' Roll Tee", slug='tee', price=Decimal('20.00'), sku='TEE-01')
+        cls.ring = Product.objects.create(
+            title='Ring "Luna" (18k)', slug='ring', price=Decimal('100.00'),
+            description='Hand-polished gold band',
+        )
+
+    def search(self, query):
+        return set(search_products(Product.objects.all(), query))
+
+    def test_matches_tokens_and_prefixes(self):
+        self.assertEqual(self.search('roll'), {self.tee})
+        self.assertEqual(self.search('lun'), {self.ring})
+        self.assertEqual(self.search('gold polished'), {self.ring})
+        # Tokens match whole words (or a word prefix for the last one), not substrings
+        self.assertEqual(self.search('olished'), set())
+
+    def test_titles_and_queries_with_punctuation(self):
+        self.assertEqual(self.search("rock 'n' roll"), {self.tee})
+        self.assertEqual(self.search('"luna" (18k'), {self.ring})
+        self.assertEqual(self.search('tee-01'), {self.tee})
+        self.assertEqual(self.search('*"()-'), set())
+
+    def test_signals_keep_index_in_sync(self):
+        self.ring.title = 'Solar Band'
+        self.ring.save()
+        self.assertEqual(self.search('solar'), {self.ring})
+        self.assertEqual(self.search('luna'), set())
+
+        Product.objects.filter(pk=self.tee.pk).delete()
+        backend = get_search_backend()
+        if isinstance(backend, SQLiteFTSBackend):
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT rowid FROM {backend.table}")
+                self.assertEqual([row[0] for row in cursor.fetchall()], [self.ring.pk])
+
+    def test_rebuild_search_index(self):
+        # Rows written with queryset.update() bypass the signals
+        Product.objects.filter(pk=self.tee.pk).update(title='Denim Jacket')
+        self.assertEqual(self.search('denim'), set())
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 2 products', out.getvalue())
+        self.assertEqual(self.search('denim'), {self.tee})
+
+    def test_backend_choice(self):
+        expected = VENDOR_BACKENDS.get(connection.vendor, LikeSearchBackend)
+        if expected is SQLiteFTSBackend and not sqlite_has_fts5(connection):
+            expected = LikeSearchBackend
+        self.assertIs(get_backend_class(connection), expected)
+
+        with override_settings(CATALOG_SEARCH_BACKEND='catalog.search.LikeSearchBackend'):
+            self.assertIs(get_backend_class(connection), LikeSearchBackend)
+        if connection.vendor == 'sqlite':
+            with mock.patch('catalog.search.sqlite_has_fts5', return_value=False):
+                self.assertIs(get_backend_class(connection), LikeSearchBackend)
+
+    def test_query_syntax_prefixes_only_the_last_token(self):
+        # Both index backends build the same query shape as search-as-you-type
+        self.assertEqual(SQLiteFTSBackend().match_expression('gold polished ban'), '"gold" "polished" "ban"*')
+        self.assertEqual(PostgresSearchBackend().tsquery('gold polished ban'), 'gold & polished & ban:*')
+        self.assertIsNone(PostgresSearchBackend().tsquery('*"()-'))
+
+    def test_like_fallback_keeps_substring_matching(self):
+        backend = LikeSearchBackend()
+        self.assertEqual(set(backend.search(Product.objects.all(), 'olished')), {self.ring})
+
+    def test_product_list_search(self):
+        shirt = Product.objects.create(title='Tee Shirt', slug='tee-shirt', price=Decimal('15.00'))
+        response = self.client.get(reverse('catalog:product_list'), {'search': 'tee'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.context['products']), {self.tee, shirt})
+
+
+class RatingAggregateTests(TestCase):
+    """Product.rating_avg/rating_count follow approved reviews"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ring = Product.objects.create(title='Ring', slug='ring', price=Decimal('100.00'))
+        cls.users = [
+            User.objects.create_user(username=f'reviewer{i}', password='pass12345', email=f'r{i}@example.com')
+            for i in range(3)
+        ]
+
+    def review(self, user, rating, approved=True):
+        return ProductReview.objects.create(
+            product=self.ring, user=user, rating=rating, title='Review', comment='Nice', is_approved=approved
+        )
+
+    def aggregates(self):
+        self.ring.refresh_from_db()
+        return self.ring.rating_count, self.ring.rating_avg
+
+    def test_save_and_delete_keep_aggregates_current(self):
+        pending = self.review(self.users[0], 1, approved=False)
+        self.assertEqual(self.aggregates(), (0, Decimal('0')))
+
+        self.review(self.users[1], 4)
+        five = self.review(self.users[2], 5)
+        self.assertEqual(self.aggregates(), (2, Decimal('4.5')))
+
+        pending.is_approved = True
+        pending.save()
+        self.assertEqual(self.aggregates(), (3, Decimal('3.3')))
+
+        five.delete()
+        self.assertEqual(self.aggregates(), (2, Decimal('2.5')))
+
+    def test_refresh_runs_on_the_review_database(self):
+        review = self.review(self.users[0], 4)
+        with mock.patch.object(Product, 'refresh_rating_aggregates') as refresh:
+            review.save(using='default')
+            review.delete()
+        self.assertEqual(refresh.call_args_list, [
+            mock.call([self.ring.pk], using='default'),
+            mock.call([self.ring.pk], using='default'),
+        ])
+
+    def test_backfill_command(self):
+        self.review(self.users[0], 3)
+        self.review(self.users[1], 4)
+        # Bulk writes skip ProductReview.save()
+        ProductReview.objects.update(rating=5)
+        Product.objects.update(rating_count=0, rating_avg=0)
+
+        out = StringIO()
+        call_command('backfill_product_ratings', stdout=out)
+        self.assertIn('Refreshed rating aggregates for 1 products', out.getvalue())
+        self.assertEqual(self.aggregates(), (2, Decimal('5.0')))
+
+
+class CartBatchAddTests(TestCase):
+    """The batch endpoint validates every line up front and applies all or nothing"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ring = Product.objects.create(title='Ring', slug='ring', price=Decimal('100.00'), stock_quantity=5)
+        cls.necklace = Product.objects.create(title='Necklace', slug='necklace', price=Decimal('200.00'))
+        cls.variants = [
+            ProductVariant.objects.create(
+                product=cls.necklace, name='Length', value=f'{16 + i} in', stock_quantity=3
+            )
+            for i in range(6)
+        ]
+
+    def post_lines(self, lines):
+        return self.client.post(
+            reverse('catalog:cart_add_batch'),
+            json.dumps({'lines': lines}),
+            content_type='application/json',
+        )
+
+    def test_adds_all_lines_in_one_request(self):
+        lines = [{'product_id': self.necklace.pk, 'variant_id': v.pk, 'quantity': 2} for v in self.variants]
+        lines.append({'product_id': self.ring.pk, 'quantity': 1})
+
+        response = self.post_lines(lines)
+
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['cart_count'], 13)
+        self.assertEqual(Decimal(data['cart_total']), Decimal('2500.00'))
+
+    def test_validation_queries_do_not_grow_with_lines(self):
+        def count(variants):
+            lines = [{'product_id': self.necklace.pk, 'variant_id': v.pk, 'quantity': 1} for v in variants]
+            with CaptureQueriesContext(connection) as ctx:
+                self.post_lines(lines)
+            self.client.cookies.clear()
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count(self.variants[:1]), count(self.variants))
+
+    def test_any_failing_line_adds_nothing(self):
+        response = self.post_lines([
+            {'product_id': self.ring.pk, 'quantity': 1},
+            {'product_id': self.necklace.pk, 'variant_id': self.variants[0].pk, 'quantity': 4},
+            {'product_id': self.necklace.pk, 'quantity': 1},
+        ])
+
+        self.assertEqual(response.status_code, 409)
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(len(data['errors']), 2)
+        self.assertEqual(data['cart_count'], 0)
+
+    def test_repeated_lines_are_checked_against_combined_quantity(self):
+        variant = self.variants[0]
+        response = self.post_lines([
+            {'product_id': self.necklace.pk, 'variant_id': variant.pk, 'quantity': 2},
+            {'product_id': self.necklace.pk, 'variant_id': variant.pk, 'quantity': 2},
+        ])
+        self.assertEqual(response.status_code, 409)
+
+    def test_rejects_malformed_body(self):
+        response = self.client.post(reverse('catalog:cart_add_batch'), 'nope', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CartStorageTests(TestCase):
+    """Cart contents persist in the configured backend and follow the visitor through login"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ring = Product.objects.create(title='Ring', slug='ring', price=Decimal('100.00'), stock_quantity=5)
+        cls.necklace = Product.objects.create(title='Necklace', slug='necklace', price=Decimal('200.00'))
+        cls.gold = ProductVariant.objects.create(product=cls.necklace, name='Metal', value='Gold', stock_quantity=3)
+        cls.user = User.objects.create_user(username='buyer', password='pass12345', email='b@example.com')
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, product, quantity, variant=None):
+        data = {'quantity': quantity}
+        if variant:
+            data['variant_id'] = variant.pk
+        self.client.post(reverse('catalog:cart_add', args=[product.pk]), data)
+
+    def cart_quantities(self):
+        request = self.client.get(reverse('catalog:cart_detail')).wsgi_request
+        return {key: item['quantity'] for key, item in Cart(request).cart.items()}
+
+    def test_backends_persist_anonymous_carts(self):
+        for backend in ('SessionCartStorage', 'DatabaseCartStorage', 'CacheCartStorage'):
+            with self.subTest(backend), override_settings(CART_STORAGE=f'catalog.cart_storage.{backend}'):
+                self.client = self.client_class()
+                self.add(self.ring, 2)
+                self.add(self.necklace, 1, self.gold)
+                self.assertEqual(self.cart_quantities(), {str(self.ring.pk): 2, f'{self.necklace.pk}_{self.gold.pk}': 1})
+
+                session = self.client.session
+                if backend == 'SessionCartStorage':
+                    self.assertIn(settings.CART_SESSION_ID, session)
+                else:
+                    # Only the token lives in the session
+                    self.assertNotIn(settings.CART_SESSION_ID, session)
+                    self.assertIn(CART_TOKEN_SESSION_KEY, session)
+                self.assertEqual(StoredCart.objects.exists(), backend == 'DatabaseCartStorage')
+                StoredCart.objects.all().delete()
+
+    def test_hydration_uses_at_most_two_queries(self):
+        self.add(self.ring, 1)
+        self.add(self.necklace, 2, self.gold)
+        self.add(Product.objects.create(title='Anklet', slug='anklet', price=Decimal('50.00'), stock_quantity=5), 1)
+        request = self.client.get(reverse('catalog:cart_detail')).wsgi_request
+
+        cart = Cart(request)
+        with self.assertNumQueries(2):
+            lines = list(cart)
+            total = cart.get_total_price()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(total, Decimal('550.00'))
+
+    def test_len_skips_deleted_products(self):
+        self.add(self.ring, 2)
+        self.add(self.necklace, 1, self.gold)
+        Product.objects.filter(pk=self.ring.pk).delete()
+
+        request = self.client.get(reverse('catalog:cart_detail')).wsgi_request
+        self.assertEqual(len(Cart(request)), 1)
+
+    def test_session_cart_adopted_by_server_side_storage(self):
+        session = self.client.session
+        session[settings.CART_SESSION_ID] = {str(self.ring.pk): {
+            'product_id': self.ring.pk, 'variant_id': None, 'quantity': 3, 'price': '100.00',
+        }}
+        session.save()
+
+        # Within the cart_detail query budget (QueryBudgetExceeded otherwise)
+        with override_settings(QUERY_INSTRUMENTATION_ENABLED=True, QUERY_BUDGET_RAISE=True):
+            self.assertEqual(self.cart_quantities(), {str(self.ring.pk): 3})
+        self.assertNotIn(settings.CART_SESSION_ID, self.client.session)
+        self.assertEqual(StoredCart.objects.get(token__isnull=False).data[str(self.ring.pk)]['quantity'], 3)
+
+    def test_login_merges_anonymous_cart_within_stock(self):
+        StoredCart.objects.create(user=self.user, data={
+            str(self.ring.pk): {'product_id': self.ring.pk, 'variant_id': None, 'quantity': 4, 'price': '100.00'},
+        })
+        self.add(self.ring, 3)
+        self.add(self.necklace, 2, self.gold)
+
+        self.client.login(username='buyer', password='pass12345')
+
+        # 4 + 3 rings capped at the 5 in stock; the variant line is moved as is
+        self.assertEqual(self.cart_quantities(), {str(self.ring.pk): 5, f'{self.necklace.pk}_{self.gold.pk}': 2})
+        self.assertEqual(list(StoredCart.objects.values_list('user', flat=True)), [self.user.pk])
+        self.assertNotIn(CART_TOKEN_SESSION_KEY, self.client.session)
+
+    def test_merge_never_drops_below_either_cart(self):
+        target = {str(self.ring.pk): {'product_id': self.ring.pk, 'quantity': 7}}
+        source = {str(self.ring.pk): {'product_id': self.ring.pk, 'quantity': 1}}
+        # Already over the stock of 5: left for checkout to report, not cut
+        self.assertEqual(merge_cart_data(target, source)[str(self.ring.pk)]['quantity'], 7)
+
+    def test_purge_stale_anonymous_carts(self):
+        stale = StoredCart.objects.create(token='stale')
+        fresh = StoredCart.objects.create(token='fresh')
+        owned = StoredCart.objects.create(user=self.user)
+        old = timezone.now() - timedelta(seconds=settings.SESSION_COOKIE_AGE + 60)
+        StoredCart.objects.filter(pk__in=[stale.pk, owned.pk]).update(updated_at=old)
+
+        out = StringIO()
+        call_command('purge_carts', stdout=out)
+        self.assertIn('Deleted 1', out.getvalue())
+        self.assertEqual(set(StoredCart.objects.values_list('pk', flat=True)), {fresh.pk, owned.pk})
+
+
+class CategoryTreeTests(TestCase):
+    """Materialized paths stay correct across moves; descendants are one query"""
+
+    def setUp(self):
+        cache.clear()
+        self.jewellery = Category.objects.create(name='Jewellery', slug='jewellery')
+        self.rings = Category.objects.create(name='Rings', slug='rings', parent=self.jewellery)
+        self.gold = Category.objects.create(name='Gold Rings', slug='gold-rings', parent=self.rings)
+        self.bands = Category.objects.create(name='Bands', slug='bands', parent=self.gold)
+        self.sale = Category.objects.create(name='Sale', slug='sale')
+
+    def test_descendants_in_one_query(self):
+        with self.assertNumQueries(1):
+            names = sorted(c.name for c in self.jewellery.get_descendants())
+        self.assertEqual(names, ['Bands', 'Gold Rings', 'Rings'])
+        self.assertEqual([c.name for c in self.bands.get_ancestors()], ['Jewellery', 'Rings', 'Gold Rings'])
+
+    def test_moving_a_category_rewrites_its_subtree(self):
+        self.rings.parent = self.sale
+        self.rings.save()
+
+        self.bands.refresh_from_db()
+        self.assertTrue(self.bands.path.startswith(self.sale.path))
+        self.assertEqual(self.bands.depth, 3)
+        self.assertFalse(self.jewellery.get_descendants().exists())
+
+    def test_cannot_move_under_own_descendant(self):
+        self.jewellery.parent = self.bands
+        with self.assertRaises(ValueError):
+            self.jewellery.save()
+
+    def test_cached_tree_serves_navigation_without_queries(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            tree = get_category_tree()
+            self.assertEqual([c.slug for c in tree.roots], ['jewellery', 'sale'])
+            self.assertEqual([c.slug for c in tree.get('jewellery').tree_descendants], ['rings', 'gold-rings', 'bands'])
+
+        self.gold.is_active = False
+        self.gold.save()
+        self.assertEqual([c.slug for c in get_category_tree().get('jewellery').tree_descendants], ['rings'])
+
+    def test_product_list_filters_by_subtree(self):
+        Product.objects.create(title='Band', slug='band', category=self.bands, price=Decimal('10.00'))
+        Product.objects.create(title='Tag', slug='tag', category=self.sale, price=Decimal('10.00'))
+
+        response = self.client.get(reverse('catalog:product_list'), {'category': 'rings'})
+
+        self.assertEqual([p.slug for p in response.context['products']], ['band'])
+
+
+    def test_every_theme_lists_subcategories(self):
+        for theme in list_themes():
+            with self.subTest(theme), use_theme(theme):
+                cache.clear()
+                response = self.client.get(reverse('catalog:product_list'), {'category': 'gold-rings'})
+                self.assertContains(response, 'value="bands"')
+                self.assertContains(response, 'value="gold-rings"')
+
+class FacetTests(TestCase):
+    """Facet counts describe the filtered set in a fixed number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jewellery = Category.objects.create(name='Jewellery', slug='jewellery')
+        cls.rings = Category.objects.create(name='Rings', slug='rings', parent=cls.jewellery)
+        cls.chains = Category.objects.create(name='Chains', slug='chains', parent=cls.jewellery)
+        prices = [Decimal('500.00'), Decimal('2500.00'), Decimal('7500.00'), Decimal('60000.00')]
+        for i, price in enumerate(prices):
+            product = Product.objects.create(
+                title=f'Ring {i}', slug=f'ring-{i}', category=cls.rings, price=price,
+                sale_price=price - 100 if i % 2 else None, stock_quantity=i,
+            )
+            ProductVariant.objects.create(product=product, name='Metal', value='Gold' if i < 3 else 'Silver')
+            ProductVariant.objects.create(product=product, name='Size', value=str(6 + i % 2))
+        Product.objects.create(title='Chain', slug='chain', category=cls.chains, price=Decimal('900.00'),
+                               manage_stock=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_facet_counts_in_three_queries(self):
+        qs, filters = filter_products(QueryDict(''))
+        get_category_tree()
+        with self.assertNumQueries(3):
+            facets = get_facets(qs)
+
+        self.assertEqual(facets['total'], 5)
+        self.assertEqual(
+            [(c['slug'], c['count']) for c in facets['categories']],
+            [('jewellery', 5), ('chains', 1), ('rings', 4)],
+        )
+        self.assertEqual([b['count'] for b in facets['price_buckets']], [2, 1, 1, 1])
+        self.assertEqual(facets['in_stock'], 4)
+        self.assertEqual(facets['on_sale'], 2)
+        metal = next(a for a in facets['attributes'] if a['name'] == 'Metal')
+        self.assertEqual(metal['values'], [{'value': 'Gold', 'count': 3}, {'value': 'Silver', 'count': 1}])
+
+    def test_filters_narrow_results_and_facets(self):
+        params = QueryDict('category=rings&in_stock=1&attr=Metal:Gold')
+        qs, filters = filter_products(params)
+        self.assertEqual(sorted(p.slug for p in qs), ['ring-1', 'ring-2'])
+        self.assertEqual(filters['attributes'], [('Metal', 'Gold')])
+        self.assertEqual(get_facets(qs)['on_sale'], 1)
+
+    def test_json_endpoint(self):
+        response = self.client.get(reverse('catalog:product_facets'), {'on_sale': '1'})
+        data = response.json()
+        self.assertEqual(data['total'], 2)
+        self.assertTrue(data['selected']['on_sale'])
+
+    def test_zero_sale_price_is_not_a_sale(self):
+        product = Product.objects.create(title='Clasp', slug='clasp', category=self.chains, price=Decimal('50.00'),
+                                         sale_price=Decimal('0.00'), manage_stock=False)
+        self.assertEqual(product.get_price, Decimal('50.00'))
+        self.assertFalse(product.is_on_sale)
+
+        qs, filters = filter_products(QueryDict('on_sale=1'))
+        self.assertNotIn(product, qs)
+        self.assertEqual(get_facets(Product.objects.filter(is_active=True))['on_sale'], 2)
+
+    def test_product_list_renders_facets(self):
+        response = self.client.get(reverse('catalog:product_list'), {'attr': 'Size:7'})
+        self.assertEqual(response.context['total_products'], 2)
+        self.assertEqual(response.context['facets']['total'], 2)
+
+
+class EffectivePriceTests(TestCase):
+    """Price filters and sorting use the price the storefront charges"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(title='Full', slug='full', price=Decimal('300.00'))
+        Product.objects.create(title='Discounted', slug='discounted', price=Decimal('500.00'), sale_price=Decimal('200.00'))
+        Product.objects.create(title='Cheap', slug='cheap', price=Decimal('250.00'))
+
+    def test_effective_price_maintained_on_save(self):
+        product = Product.objects.get(slug='discounted')
+        self.assertEqual(product.effective_price, Decimal('200.00'))
+        product.sale_price = None
+        product.save(update_fields=['sale_price'])
+        product.refresh_from_db()
+        self.assertEqual(product.effective_price, Decimal('500.00'))
+
+    def test_refresh_after_bulk_update(self):
+        Product.objects.filter(slug='full').update(sale_price=Decimal('100.00'))
+        Product.refresh_effective_prices()
+        self.assertEqual(Product.objects.get(slug='full').effective_price, Decimal('100.00'))
+
+    def test_filter_and_sort_on_effective_price(self):
+        response = self.client.get(reverse('catalog:product_list'), {'max_price': '260', 'sort': 'price'})
+        self.assertEqual([p.slug for p in response.context['products']], ['discounted', 'cheap'])
+
+
+@override_settings(IMAGE_DERIVATIVE_WIDTHS=[160, 320, 1024], IMAGE_DERIVATIVE_FORMATS=['webp', 'jpeg'])
+class ImageDerivativeTests(TestCase):
+    """Uploads are moved and get resized renditions in the task worker; templates build srcsets from them"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+    def upload(self, name='ring.png', size=(800, 400)):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_moved_and_generated_by_worker(self):
+        product = Product.objects.create(title='Ring', slug='ring', price=Decimal('10.00'), image=self.upload())
+        run_pending()
+        product.refresh_from_db()
+        self.assertEqual(product.image.name, f'products/images/{product.pk}/ring.png')
+
+        manifest = get_manifest(product.image.name)
+        # Never upscaled: the 800px source stands in for 1024
+        self.assertEqual(manifest['widths'], [160, 320, 800])
+        self.assertTrue(default_storage.exists(f'products/images/{product.pk}/derivatives/ring-160w.webp'))
+        self.assertTrue(default_storage.exists(f'products/images/{product.pk}/derivatives/ring-800w.jpg'))
+
+    def test_nothing_done_inside_save(self):
+        product = Product.objects.create(title='Ring', slug='ring', price=Decimal('10.00'), image=self.upload())
+        self.assertTrue(product.image.name.startswith('products/images/temp/'))
+        self.assertIsNone(get_manifest(product.image.name))
+        self.assertEqual(list(Task.objects.values_list('name', flat=True)), ['catalog.tasks.move_temp_image'])
+
+    def test_responsive_image_tag(self):
+        product = Product.objects.create(title='Ring', slug='ring', price=Decimal('10.00'), image=self.upload())
+        template = Template('{% load image_tags %}{% responsive_image product.image sizes="80px" alt=product.title %}')
+
+        html = template.render(Context({'product': product}))
+        self.assertEqual(html, f'<img src="{product.image.url}" alt="Ring" loading="lazy">')
+
+        call_command('backfill_image_derivatives', workers=1, stdout=StringIO())
+        html = template.render(Context({'product': product}))
+        self.assertIn('<source type="image/webp" srcset="', html)
+        self.assertIn(default_storage.url(derivative_name(product.image.name, 320, 'jpeg')) + ' 320w', html)
+        self.assertIn('sizes="80px"', html)
+
+    def test_regeneration_deletes_unlisted_renditions(self):
+        name = default_storage.save('products/images/1/ring.png', self.upload())
+        generate_derivatives(name)
+        self.assertTrue(default_storage.exists(derivative_name(name, 320, 'webp')))
+
+        with override_settings(IMAGE_DERIVATIVE_WIDTHS=(160, 640), IMAGE_DERIVATIVE_FORMATS=('jpeg',)):
+            generate_derivatives(name)
+
+        self.assertEqual(get_manifest(name)['widths'], [160, 640])
+        self.assertTrue(default_storage.exists(derivative_name(name, 640, 'jpeg')))
+        self.assertFalse(default_storage.exists(derivative_name(name, 320, 'jpeg')))
+        self.assertFalse(default_storage.exists(derivative_name(name, 160, 'webp')))
+        self.assertEqual(
+            sorted(default_storage.listdir('products/images/1/derivatives')[1]),
+            ['ring-160w.jpg', 'ring-640w.jpg', 'ring.json'],
+        )
+
+    def write_manifest(self, name, formats):
+        manifest = {'source': name, 'size': 1, 'width': 800, 'height': 400,
+                    'widths': [160, 320], 'formats': formats, 'configured': [160, 320]}
+        default_storage.save(manifest_name(name), ContentFile(json.dumps(manifest).encode()))
+
+    def test_responsive_image_fallback_format(self):
+        product = Product.objects.create(title='Ring', slug='ring', price=Decimal('10.00'), image=self.upload())
+        template = Template('{% load image_tags %}{% responsive_image product.image alt="Ring" %}')
+        name = product.image.name
+
+        # No encoder was available: nothing to offer but the original
+        self.write_manifest(name, [])
+        self.assertEqual(template.render(Context({'product': product})),
+                         f'<img src="{product.image.url}" alt="Ring" loading="lazy">')
+
+        # JPEG is the <img> fallback wherever it appears in the list
+        cache.clear()
+        default_storage.delete(manifest_name(name))
+        self.write_manifest(name, ['jpeg', 'webp'])
+        html = template.render(Context({'product': product}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertNotIn('image/jpeg', html)
+        self.assertIn(f'<img src="{product.image.url}" srcset="{default_storage.url(derivative_name(name, 160, "jpeg"))} 160w', html)
+
+        # Without JPEG renditions the original is the fallback
+        cache.clear()
+        default_storage.delete(manifest_name(name))
+        self.write_manifest(name, ['webp'])
+        html = template.render(Context({'product': product}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f'<img src="{product.image.url}" sizes="100vw" alt="Ring"', html)
+
+    def test_backfill_expires_cached_pages(self):
+        product = Product.objects.create(title='Ring', slug='ring', price=Decimal('10.00'), image=self.upload())
+        Task.objects.all().delete()
+        before = tag_versions(['products', f'product:{product.pk}'])
+
+        call_command('backfill_image_derivatives', workers=1, stdout=StringIO())
+        after = tag_versions(['products', f'product:{product.pk}'])
+        self.assertTrue(all(after[tag] != before[tag] for tag in before))
+
+        # Nothing regenerated, nothing expired
+        call_command('backfill_image_derivatives', workers=1, stdout=StringIO())
+        self.assertEqual(tag_versions(['products', f'product:{product.pk}']), after)
 
-# Create your tests here.
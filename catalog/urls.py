@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import (
-    product_list, product_detail, cart_add, cart_detail, 
+    product_list, product_facets, product_detail, cart_add, cart_add_batch, cart_detail, 
     cart_remove, cart_update, add_review
 )
 
@@ -8,7 +8,9 @@ app_name = 'catalog'
 
 urlpatterns = [
     path("", product_list, name="product_list"),
+    path("facets/", product_facets, name="product_facets"),
     path("cart/", cart_detail, name="cart_detail"),
+    path("cart/add-batch/", cart_add_batch, name="cart_add_batch"),
     path("cart/add/<int:product_id>/", cart_add, name="cart_add"),
     path("cart/remove/<int:product_id>/", cart_remove, name="cart_remove"),
     path("cart/update/<int:product_id>/", cart_update, name="cart_update"),
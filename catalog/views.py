@@ -1,106 +1,134 @@
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Avg
+from django.db.models import Avg
 from django.core.paginator import Paginator
-from .models import Product, Category, ProductReview, SiteSettings
+from django.utils.functional import SimpleLazyObject
+from core.page_cache import add_page_cache_tags, cache_page_for_anonymous, normalized_query
+from core.pagination import CursorPaginator
+from .models import Product, ProductReview, SiteSettings
 from .cart import Cart
+from .facets import FILTER_PARAMS, filter_products, get_facets
+from .category_tree import get_category_tree
+
+PRODUCTS_PER_PAGE = 12
+
+# product_list sort options. Every sort ends in a unique column so it can be
+# used as a pagination keyset.
+PRODUCT_SORTS = {
+    'name': ('title', 'id'),
+    '-name': ('-title', '-id'),
+    'price': ('effective_price', 'id'),
+    '-price': ('-effective_price', '-id'),
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'featured': ('-featured', '-created_at', '-id'),
+}
+
+
+def product_list_paginator(qs, sort_by):
+    """
+    Keyset (cursor) paginator for a column sort of product_list, so deep
+    pages cost the same as the first. Unknown sorts fall back to newest.
+    """
+    ordering = PRODUCT_SORTS.get(sort_by, PRODUCT_SORTS['newest'])
+    return CursorPaginator(qs, PRODUCTS_PER_PAGE, ordering, approximate_count=True)
+
 
+def active_product(slug):
+    """The storefront's product lookup (product_detail and its page validators)"""
+    return Product.objects.filter(slug=slug, is_active=True)
+
+
+@cache_page_for_anonymous('navigation', 'products', params=FILTER_PARAMS + ('sort', 'page', 'cursor'))
 def product_list(request):
-    # Get all active products
-    qs = Product.objects.filter(is_active=True).select_related("category")
-    
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        qs = qs.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(short_description__icontains=search_query) |
-            Q(sku__icontains=search_query)
-        )
-    
-    # Category filtering
-    category_slug = request.GET.get('category', '')
-    selected_category = None
-    if category_slug:
-        try:
-            selected_category = Category.objects.get(slug=category_slug, is_active=True)
-            # Include products from child categories
-            category_ids = [selected_category.id]
-            category_ids.extend([child.id for child in selected_category.get_all_children()])
-            qs = qs.filter(category__id__in=category_ids)
-        except Category.DoesNotExist:
-            pass
+    # Active products matching search, category, price, stock, sale and
+    # variant attribute filters (see catalog.facets)
+    category_tree = get_category_tree()
+    qs, filters = filter_products(request.GET, category_tree)
+    search_query = filters['search_query']
     
-    # Price filtering
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    if min_price:
-        try:
-            qs = qs.filter(price__gte=float(min_price))
-        except ValueError:
-            pass
-    if max_price:
-        try:
-            qs = qs.filter(price__lte=float(max_price))
-        except ValueError:
-            pass
-    
-    # Sorting
-    sort_by = request.GET.get('sort', '-created_at')
-    valid_sorts = {
-        'name': 'title',
-        '-name': '-title',
-        'price': 'price',
-        '-price': '-price',
-        'newest': '-created_at',
-        'oldest': 'created_at',
-        'featured': '-featured'
-    }
-    
-    if sort_by in valid_sorts:
-        qs = qs.order_by(valid_sorts[sort_by])
+    # Sorting (search results default to relevance order, which pages
+    # with offsets)
+    sort_by = request.GET.get('sort', 'relevance' if search_query else '-created_at')
+    if sort_by == 'relevance' and search_query:
+        qs = qs.order_by('-search_rank', '-created_at')
+        paginator = Paginator(qs, PRODUCTS_PER_PAGE)
+        products = paginator.get_page(request.GET.get('page'))
     else:
-        qs = qs.order_by('-created_at')
-    
-    # Pagination
-    paginator = Paginator(qs, 12)  # 12 products per page
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+        paginator = product_list_paginator(qs, sort_by)
+        products = paginator.get_page(cursor=request.GET.get('cursor'), page_number=request.GET.get('page'))
     
     # Get all categories for filter dropdown
-    categories = Category.objects.filter(is_active=True, parent=None)
+    categories = category_tree.roots
     
     context = {
         'products': products,
         'categories': categories,
-        'selected_category': selected_category,
+        'selected_category': filters['selected_category'],
         'search_query': search_query,
-        'min_price': min_price,
-        'max_price': max_price,
+        'min_price': filters['min_price'],
+        'max_price': filters['max_price'],
+        'in_stock': filters['in_stock'],
+        'on_sale': filters['on_sale'],
+        'selected_attributes': filters['attributes'],
         'current_sort': sort_by,
-        'total_products': qs.count()
+        'total_products': paginator.count,
+        # Facet counts are only queried if the theme renders them
+        'facets': SimpleLazyObject(lambda: get_facets(qs, category_tree)),
+        # Cache key for the facets fragment: the filters only
+        'filter_query': normalized_query(request.GET, FILTER_PARAMS),
     }
     
     return render(request, "catalog/product_list.html", context)
 
+def product_facets(request):
+    """Facet counts for the product list filters as JSON"""
+    category_tree = get_category_tree()
+    qs, filters = filter_products(request.GET, category_tree)
+    facets = get_facets(qs, category_tree)
+    facets['selected'] = {
+        'search': filters['search_query'],
+        'category': filters['selected_category'].slug if filters['selected_category'] else None,
+        'min_price': filters['min_price'],
+        'max_price': filters['max_price'],
+        'in_stock': filters['in_stock'],
+        'on_sale': filters['on_sale'],
+        'attributes': [f"{name}:{value}" for name, value in filters['attributes']],
+    }
+    return JsonResponse(facets)
+
+def product_page_state(request, slug):
+    """Validator tags and updated_at of a product page, read before rendering (one query)"""
+    try:
+        product = active_product(slug).values('pk', 'updated_at').get()
+    except Product.DoesNotExist:
+        return None
+    # Related products show on the page too
+    return ('products', f"product:{product['pk']}"), product['updated_at']
+
+@cache_page_for_anonymous('navigation', state=product_page_state)
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug, is_active=True)
+    product = get_object_or_404(active_product(slug))
     
     # Get site settings for reviews
     site_settings = SiteSettings.get_settings()
     
     # Get product variants
-    variants = product.variants.filter(is_active=True)
+    variants = product.get_active_variants()
     
     # Get related products
-    related_products = product.get_related_products()
+    related_products = list(product.get_related_products())
+
+    # Cached page expires when this product or a related one changes
+    add_page_cache_tags(request, f'product:{product.pk}', *[f'product:{related.pk}' for related in related_products])
     
     # Get approved reviews
-    reviews = product.reviews.filter(is_approved=True).select_related('user')
+    reviews = product.get_approved_reviews()
     
     # Check if user has already reviewed this product
     user_has_reviewed = False
@@ -183,7 +211,7 @@ def add_review(request, product_id):
 def cart_add(request, product_id):
     from .models import ProductVariant
 
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     product = get_object_or_404(Product, id=product_id)
 
     # Get variant if specified
@@ -191,7 +219,7 @@ def cart_add(request, product_id):
     variant = None
 
     # Check if product has variants and require selection
-    available_variants = product.variants.filter(is_active=True)
+    available_variants = product.get_active_variants()
     if available_variants.exists():
         if not variant_id:
             messages.error(request, "Please select a variation before adding to cart.")
@@ -245,15 +273,118 @@ def cart_add(request, product_id):
 
     return redirect('catalog:product_detail', slug=product.slug)
 
+@require_POST
+def cart_add_batch(request):
+    """
+    Add many lines to the cart in one round-trip (JSON in, JSON out).
+
+    Body: {"lines": [{"product_id": 1, "variant_id": 2, "quantity": 3}, ...]}
+    Every line is validated against one product query and one variant
+    query; if any line fails nothing is added.
+    """
+    from .models import ProductVariant
+
+    try:
+        payload = json.loads(request.body or b'{}')
+        raw_lines = payload['lines']
+        lines = []
+        for raw in raw_lines:
+            variant_id = raw.get('variant_id')
+            lines.append((
+                int(raw['product_id']),
+                int(variant_id) if variant_id not in (None, '') else None,
+                int(raw.get('quantity', 1)),
+            ))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'success': False, 'message': "Invalid cart request.", 'errors': []}, status=400)
+
+    if not lines:
+        return JsonResponse({'success': False, 'message': "No items to add.", 'errors': []}, status=400)
+
+    cart = Cart.for_request(request)
+    product_ids = {product_id for product_id, variant_id, quantity in lines}
+    products = Product.objects.filter(is_active=True).in_bulk(product_ids)
+
+    # All active variants of these products: tells us both which products
+    # require a variation and whether the requested one is valid
+    variants_by_product = {}
+    for variant in ProductVariant.objects.filter(product_id__in=list(products), is_active=True):
+        variant.product = products[variant.product_id]
+        variants_by_product.setdefault(variant.product_id, {})[variant.id] = variant
+
+    errors = []
+    items = []
+    pending = {}
+    for product_id, variant_id, quantity in lines:
+        product = products.get(product_id)
+        if product is None:
+            errors.append({'product_id': product_id, 'variant_id': variant_id, 'message': "Product is not available."})
+            continue
+
+        variant = None
+        product_variants = variants_by_product.get(product_id)
+        if product_variants:
+            variant = product_variants.get(variant_id)
+            if variant is None:
+                message = ("Please select a variation before adding to cart." if variant_id is None
+                           else "Selected product variation is not available.")
+                errors.append({'product_id': product_id, 'variant_id': variant_id, 'message': message})
+                continue
+
+        item_name = product.title
+        if variant:
+            item_name += f" ({variant.name}: {variant.value})"
+
+        if quantity <= 0:
+            errors.append({'product_id': product_id, 'variant_id': variant_id,
+                           'message': f"Invalid quantity for {item_name}."})
+            continue
+
+        # Stock check covers what's already in the cart and earlier lines of this batch
+        available_stock = cart.get_available_stock(product, variant)
+        key = (product_id, variant.id if variant else None)
+        requested = pending.get(key, cart.get_cart_quantity(product, variant)) + quantity
+        if available_stock != float('inf') and requested > available_stock:
+            if available_stock <= 0:
+                message = f"Sorry, {item_name} is out of stock."
+            else:
+                message = f"Sorry, only {available_stock} of {item_name} available (requested {requested})."
+            errors.append({'product_id': product_id, 'variant_id': variant_id, 'message': message})
+            continue
+
+        pending[key] = requested
+        items.append((product, variant, quantity))
+
+    if errors:
+        return JsonResponse({
+            'success': False,
+            'message': errors[0]['message'],
+            'errors': errors,
+            'cart_count': len(cart),
+        }, status=409)
+
+    cart.add_many(items)
+    added = sum(quantity for product, variant, quantity in items)
+    message = f"Added {added} item{'s' if added != 1 else ''} to cart."
+    messages.success(request, message)
+
+    return JsonResponse({
+        'success': True,
+        'message': message,
+        'errors': [],
+        'cart_count': len(cart),
+        'cart_total': str(cart.get_total_price()),
+    })
+
 def cart_detail(request):
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     return render(request, 'catalog/cart_detail.html', {'cart': cart})
 
 @require_POST
 def cart_remove(request, product_id):
     from .models import ProductVariant
 
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     product = get_object_or_404(Product, id=product_id)
     variant_id = request.POST.get('variant_id')
 
@@ -278,7 +409,7 @@ def cart_remove(request, product_id):
 def cart_update(request, product_id):
     from .models import ProductVariant
 
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     product = get_object_or_404(Product, id=product_id)
     quantity = int(request.POST.get('quantity', 1))
     variant_id = request.POST.get('variant_id')
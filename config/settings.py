@@ -85,9 +85,9 @@ def get_active_plugins():
 INSTALLED_APPS += get_active_plugins()
 
 MIDDLEWARE = [
+    'core.middleware.QueryInstrumentationMiddleware',  # Query counts, N+1 detection and budgets
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'core.middleware.DynamicStaticThemeMiddleware',  # Dynamic static files for themes
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -99,15 +99,23 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'config.urls'
 
 # Theme-aware template directory: themes/<THEME>
+THEME_TEMPLATE_LOADERS = [
+    "core.template_loaders.DynamicThemeLoader",  # Custom dynamic theme loader
+    "django.template.loaders.app_directories.Loader",  # For app templates
+]
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [],  # Managed by custom template loader
         "OPTIONS": {
-            "loaders": [
-                "core.template_loaders.DynamicThemeLoader",  # Custom dynamic theme loader
-                "django.template.loaders.app_directories.Loader",  # For app templates
-            ],
+            # Development reads templates from disk on every render so edits
+            # show up immediately; otherwise compiled templates are cached in
+            # memory per theme
+            "loaders": (
+                THEME_TEMPLATE_LOADERS if DEBUG
+                else [("core.template_loaders.ThemeCachedLoader", THEME_TEMPLATE_LOADERS)]
+            ),
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -124,6 +132,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Precompile every theme's templates when the WSGI app starts
+# (same as running `python manage.py warm_template_cache` in-process)
+TEMPLATE_WARMUP_ON_STARTUP = not DEBUG
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -173,21 +185,88 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [
     BASE_DIR / "static_shared",           # shared
-    BASE_DIR / "themes" / "glam" / "static",  # Default theme static, overridden by middleware
+]
+STATICFILES_FINDERS = [
+    "django.contrib.staticfiles.finders.FileSystemFinder",
+    "django.contrib.staticfiles.finders.AppDirectoriesFinder",
+    "core.staticfiles.ThemeStaticFinder",  # themes/<name>/static, namespaced as themes/<name>/
 ]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Theme-aware static storage: bare paths resolve to the active theme's copy.
+# Production uses hashed (manifest) names, so run collectstatic on deploy.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": (
+            "core.staticfiles.ThemeStaticFilesStorage" if DEBUG
+            else "core.staticfiles.ThemeManifestStaticFilesStorage"
+        ),
+    },
+}
+
 # Media files (User uploads)
 MEDIA_URL = "/media/"
-MEDIA_ROOT = BASE_DIR / "media"
+# Overridable so load tests can serve the seed_store --images pool (media_seed/)
+MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", BASE_DIR / "media"))
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Responsive image derivatives (catalog.images): resized renditions of product,
+# gallery and category images, generated after upload by the task worker.
+# Backfill existing media with `manage.py backfill_image_derivatives`.
+IMAGE_DERIVATIVE_WIDTHS = [160, 320, 640, 1024]
+IMAGE_DERIVATIVE_FORMATS = ['avif', 'webp', 'jpeg']  # <picture> sources, best first
+
 # Custom user model
 AUTH_USER_MODEL = "users.User"
 
 # Shopping Cart Settings
 CART_SESSION_ID = 'cart'
+# Where cart contents live: catalog.cart_storage.DatabaseCartStorage,
+# CacheCartStorage (needs a shared cache) or SessionCartStorage (legacy)
+CART_STORAGE = 'catalog.cart_storage.DatabaseCartStorage'
+
+# Query instrumentation (core.middleware.QueryInstrumentationMiddleware)
+# Budgets are keyed by URL name (glob patterns allowed). Over-budget views are
+# logged, or raise QueryBudgetExceeded when QUERY_BUDGET_RAISE is True.
+QUERY_INSTRUMENTATION_ENABLED = DEBUG
+QUERY_N_PLUS_ONE_THRESHOLD = 5
+QUERY_BUDGET_RAISE = False
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGETS = {
+    'core:home': 12,
+    'catalog:product_list': 20,
+    'catalog:product_detail': 20,
+    'catalog:cart_detail': 10,
+    'orders:checkout': 20,
+    'orders:order_history': 15,
+    'wishlist:*': 30,
+}
+
+# Full-page cache for anonymous storefront pages (core.page_cache). Entries
+# are invalidated by tag on product/category/review/settings saves; with
+# more than one process this needs a shared CACHES backend (Redis/Memcached).
+# Conditional GETs (ETag/Last-Modified) are answered even when it is off.
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 60 * 10  # seconds
+
+# Background task queue (core.task_queue): slow side effects are stored as
+# core.Task rows and run by `manage.py run_tasks` (keep one or more running,
+# or call `run_tasks --once` from cron). Failed tasks retry with exponential
+# backoff; running tasks older than TASK_LOCK_TIMEOUT are handed out again.
+TASK_RETRY_DELAY = 30  # seconds, doubled per attempt
+TASK_LOCK_TIMEOUT = 60 * 30  # seconds
+TASK_RETENTION = 60 * 60 * 24 * 7  # keep finished tasks this long
+# No worker on this host (shared hosting)? Run tasks in the request right
+# after commit instead; delayed ones still need `run_tasks --once` in cron.
+TASK_RUN_INLINE = os.getenv("TASK_RUN_INLINE", "") == "1"
+
+# Product search backend (dotted path). Leave as None to pick SQLite FTS5 or
+# PostgreSQL full-text search automatically based on the database engine.
+CATALOG_SEARCH_BACKEND = None
 
 LOGIN_URL = "/users/login/"
 LOGIN_REDIRECT_URL = "/"
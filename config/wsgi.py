@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'TEMPLATE_WARMUP_ON_STARTUP', False):
+    from core.template_loaders import warm_theme_templates
+    from core.themes import list_themes
+    warm_theme_templates(list_themes())
@@ -1,3 +1,40 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 
-# Register your models here.
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Background task queue: inspect failures and retry them"""
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'finished_at', 'locked_by')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'unique_key', 'last_error')
+    readonly_fields = [field.name for field in Task._meta.fields]
+    actions = ['retry_tasks']
+
+    def has_add_permission(self, request):
+        return False  # Tasks are queued by code
+
+    @admin.action(description='Retry selected tasks now')
+    def retry_tasks(self, request, queryset):
+        count, skipped = 0, []
+        for task in queryset.exclude(status=Task.RUNNING).order_by('pk'):
+            # One row at a time: a task whose unique_key is already pending
+            # can't go back to pending too (core_task_pending_key_uniq)
+            try:
+                with transaction.atomic():
+                    count += Task.objects.filter(pk=task.pk).exclude(status=Task.RUNNING).update(
+                        status=Task.PENDING, attempts=0, run_at=timezone.now(), finished_at=None,
+                    )
+            except IntegrityError:
+                skipped.append(task)
+        self.message_user(request, f"{count} task(s) queued again.")
+        if skipped:
+            self.message_user(
+                request,
+                f"{len(skipped)} task(s) skipped, a task with the same unique_key is already pending: "
+                + ', '.join(f"#{task.pk} {task.name}" for task in skipped),
+                messages.WARNING,
+            )
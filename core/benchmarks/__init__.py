@@ -0,0 +1,19 @@
+"""
+Storefront benchmark suite
+
+- data.generate_dataset(): deterministic synthetic catalog (categories,
+  products, variants, reviews, users, wishlists, orders) at a named scale,
+  from a handful of rows ("smoke") up to 100k products / 10k users ("full")
+- scenarios.SCENARIOS: timed requests against the storefront hot paths
+- runner: latency percentiles, query counts and baseline comparison
+
+Run it with:
+
+    python manage.py benchmark_storefront --scale small
+    python manage.py benchmark_storefront --scale small --save-baseline
+
+The command builds a throwaway test database, so it never touches real
+data. Anonymous pages are rendered with the page cache off unless
+--page-cache is given, so the numbers measure the views themselves. Query counts are also checked by the test suite against
+baseline.json (see core.tests.BenchmarkSmokeTests).
+"""
@@ -0,0 +1,393 @@
+"""
+Synthetic storefront data for benchmarks and load tests
+
+Rows are generated in fixed-size chunks of CHUNK_SIZE parent rows. Every
+chunk has its own random.Random seeded from (seed, table, chunk number),
+so a seed always produces the same rows whether the chunks run in this
+process or are spread over worker processes (seed_store --workers).
+
+Tables are filled in stages, each needing only the ids of earlier ones:
+
+1. users, products
+2. variants, reviews, wishlists, orders
+3. wishlist items, order items
+
+Rows are written with bulk_create in batches. Denormalized columns
+(effective_price, ratings, search index, category paths) are filled in the
+same way the models maintain them.
+"""
+
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+BENCHMARK_PASSWORD = 'benchmark-pass'
+
+SCALES = {
+    'smoke': {
+        'subcategories': 2, 'products': 60, 'variants': 2, 'reviews': 2,
+        'users': 20, 'wishlist_items': 5, 'orders': 2, 'order_items': 2,
+    },
+    'small': {
+        'subcategories': 4, 'products': 5_000, 'variants': 3, 'reviews': 3,
+        'users': 500, 'wishlist_items': 10, 'orders': 3, 'order_items': 3,
+    },
+    'full': {
+        'subcategories': 6, 'products': 100_000, 'variants': 3, 'reviews': 3,
+        'users': 10_000, 'wishlist_items': 10, 'orders': 3, 'order_items': 3,
+    },
+    'load': {
+        'subcategories': 6, 'products': 1_000_000, 'variants': 3, 'reviews': 3,
+        'users': 100_000, 'wishlist_items': 10, 'orders': 5, 'order_items': 3,
+    },
+}
+
+# Same top-level categories as create_sample_products
+CATEGORIES = {
+    'Electronics': ['Audio', 'Cameras', 'Phones', 'Wearables', 'Computers', 'Gaming'],
+    'Fashion': ['Shirts', 'Dresses', 'Shoes', 'Bags', 'Jewellery', 'Watches'],
+    'Home & Garden': ['Kitchen', 'Decor', 'Lighting', 'Furniture', 'Plants', 'Bedding'],
+    'Sports': ['Yoga', 'Running', 'Cycling', 'Fitness', 'Outdoor', 'Swimming'],
+}
+ADJECTIVES = ['Wireless', 'Organic', 'Smart', 'Ceramic', 'Professional', 'Classic', 'Premium',
+              'Compact', 'Vintage', 'Eco', 'Deluxe', 'Portable', 'Handmade', 'Modern']
+NOUNS = ['Headphones', 'T-Shirt', 'Camera', 'Plant Pot', 'Yoga Mat', 'Watch', 'Lamp', 'Backpack',
+         'Speaker', 'Sneakers', 'Kettle', 'Ring', 'Jacket', 'Bottle']
+VARIANT_AXES = [('Size', ['S', 'M', 'L', 'XL']), ('Color', ['Black', 'White', 'Red', 'Blue']),
+                ('Metal', ['Gold', 'Silver', 'Rose Gold'])]
+SEARCH_TERMS = [noun.lower() for noun in NOUNS] + [adjective.lower() for adjective in ADJECTIVES]
+IMAGE_COLORS = ['#8e44ad', '#2980b9', '#27ae60', '#d35400', '#c0392b', '#16a085', '#7f8c8d', '#f39c12']
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 5000  # parent rows per chunk; changing it changes the generated data
+BESTSELLERS = 5000  # order items are drawn from the first N products
+
+
+def bulk_insert(model, rows, batch_size=BATCH_SIZE):
+    """bulk_create an iterable of unsaved instances in batches; returns the row count"""
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            return total
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        total += len(batch)
+
+
+def image_pool(size, prefix, storage=None):
+    """Storage names of a small pool of placeholder images, created only if missing"""
+    if not PIL_AVAILABLE:
+        return []
+    storage = storage or default_storage
+    names = []
+    for i in range(size):
+        name = f'products/{prefix}-pool/{i:03d}.png'
+        if not storage.exists(name):
+            buffer = BytesIO()
+            Image.new('RGB', (400, 400), IMAGE_COLORS[i % len(IMAGE_COLORS)]).save(buffer, format='PNG')
+            storage.save(name, ContentFile(buffer.getvalue()))
+        names.append(name)
+    return names
+
+
+def _create_categories(scale, prefix):
+    from catalog.models import Category
+
+    leaves = []
+    for name, children in CATEGORIES.items():
+        parent = Category.objects.create(name=name, slug=f"{prefix}-{name.lower().replace(' & ', '-')}")
+        for child in children[:scale['subcategories']]:
+            leaves.append(Category.objects.create(
+                name=child, slug=f"{parent.slug}-{child.lower()}", parent=parent
+            ).pk)
+    return leaves
+
+
+# Row builders: (rng, parents, start, refs) -> unsaved instances, where
+# parents is this chunk's slice of the table's parent rows and start its offset
+
+def _users(rng, numbers, start, refs):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    prefix = refs['prefix']
+    for i in numbers:
+        yield User(username=f'{prefix}{i:07d}', email=f'{prefix}{i:07d}@example.com', password=refs['password'])
+
+
+def _products(rng, numbers, start, refs):
+    from catalog.models import Product
+
+    prefix = refs['prefix']
+    for i in numbers:
+        title = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}"
+        price = Decimal(rng.randrange(199, 99999)) / 100 * 10
+        sale_price = (price * Decimal('0.8')).quantize(Decimal('0.01')) if rng.random() < 0.3 else None
+        yield Product(
+            title=title,
+            slug=f'{prefix}-product-{i}',
+            sku=f'{prefix.upper()}-{i:07d}',
+            category_id=rng.choice(refs['category_ids']),
+            price=price,
+            sale_price=sale_price,
+            effective_price=sale_price or price,
+            description=f"{title}. Synthetic benchmark product.",
+            short_description=title,
+            image=rng.choice(refs['images']) if refs['images'] else None,
+            # Plenty of stock so repeated checkout scenarios never run dry
+            stock_quantity=0 if rng.random() < 0.1 else rng.randrange(1_000, 10_000),
+            featured=rng.random() < 0.05,
+        )
+
+
+def _variants(rng, product_ids, start, refs):
+    from catalog.models import ProductVariant
+
+    for product_id in product_ids:
+        name, values = rng.choice(VARIANT_AXES)
+        for value in rng.sample(values, min(refs['scale']['variants'], len(values))):
+            yield ProductVariant(
+                product_id=product_id, name=name, value=value,
+                price_adjustment=Decimal(rng.choice([0, 0, 50, 100])),
+                stock_quantity=rng.randrange(1_000, 10_000),
+            )
+
+
+def _reviews(rng, product_ids, start, refs):
+    from catalog.models import ProductReview
+
+    user_ids = refs['user_ids']
+    per_product = min(refs['scale']['reviews'], len(user_ids))
+    for product_id in product_ids:
+        for user_id in rng.sample(user_ids, per_product):
+            rating = rng.choice([3, 4, 4, 5, 5])
+            yield ProductReview(
+                product_id=product_id, user_id=user_id, rating=rating,
+                title='Great' if rating > 3 else 'Okay', comment='Synthetic benchmark review.',
+                is_approved=rng.random() < 0.9,
+            )
+
+
+def _wishlists(rng, user_ids, start, refs):
+    from wishlist.models import Wishlist
+
+    for user_id in user_ids:
+        yield Wishlist(user_id=user_id)
+
+
+def _wishlist_items(rng, wishlist_ids, start, refs):
+    from wishlist.models import WishlistItem
+
+    product_ids = refs['product_ids']
+    per_wishlist = min(refs['scale']['wishlist_items'], len(product_ids))
+    for wishlist_id in wishlist_ids:
+        for product_id in rng.sample(product_ids, per_wishlist):
+            yield WishlistItem(wishlist_id=wishlist_id, product_id=product_id)
+
+
+def _orders(rng, user_ids, start, refs):
+    from orders.models import Order
+
+    per_user = refs['scale']['orders']
+    for position, user_id in enumerate(user_ids, start):
+        for n in range(per_user):
+            subtotal = Decimal(rng.randrange(500, 50_000))
+            tax = (subtotal * Order.TAX_RATE).quantize(Decimal('0.01'))
+            yield Order(
+                user_id=user_id, email=f'user{user_id}@example.com', phone='9999999999',
+                shipping_name='Bench User', shipping_address_line_1='1 Benchmark Road',
+                shipping_city='Pune', shipping_state='MH', shipping_postal_code='411001',
+                order_number=f"{refs['prefix'].upper()}-{position * per_user + n + 1:08d}",
+                status=rng.choice(['pending', 'confirmed', 'delivered']),
+                subtotal=subtotal, tax_amount=tax, total_amount=subtotal + tax,
+            )
+
+
+def _order_items(rng, order_ids, start, refs):
+    from orders.models import OrderItem
+
+    products = refs['bestsellers']
+    per_order = min(refs['scale']['order_items'], len(products))
+    for order_id in order_ids:
+        for product_id, title, sku, price in rng.sample(products, per_order):
+            yield OrderItem(
+                order_id=order_id, product_id=product_id, product_name=title, product_sku=sku,
+                quantity=rng.randrange(1, 4), unit_price=price,
+            )
+
+
+# table -> (model label, parent rows in refs, row builder)
+TABLES = {
+    'users': (settings.AUTH_USER_MODEL, lambda refs: range(refs['scale']['users']), _users),
+    'products': ('catalog.Product', lambda refs: range(refs['scale']['products']), _products),
+    'variants': ('catalog.ProductVariant', lambda refs: refs['product_ids'], _variants),
+    'reviews': ('catalog.ProductReview', lambda refs: refs['product_ids'], _reviews),
+    'wishlists': ('wishlist.Wishlist', lambda refs: refs['user_ids'], _wishlists),
+    'orders': ('orders.Order', lambda refs: refs['user_ids'], _orders),
+    'wishlist_items': ('wishlist.WishlistItem', lambda refs: refs['wishlist_ids'], _wishlist_items),
+    'order_items': ('orders.OrderItem', lambda refs: refs['order_ids'], _order_items),
+}
+STAGES = [
+    ('users', 'products'),
+    ('variants', 'reviews', 'wishlists', 'orders'),
+    ('wishlist_items', 'order_items'),
+]
+
+
+def write_chunk(table, index, refs):
+    """Generate and insert chunk `index` of a table; returns (rows, seconds)"""
+    label, parents, build = TABLES[table]
+    start = index * CHUNK_SIZE
+    started = time.perf_counter()
+    rng = random.Random(f"{refs['seed']}:{table}:{index}")
+    rows = build(rng, parents(refs)[start:start + CHUNK_SIZE], start, refs)
+    with transaction.atomic():
+        count = bulk_insert(apps.get_model(label), rows, refs['batch_size'])
+    return count, time.perf_counter() - started
+
+
+_worker_refs = None
+
+
+def _init_worker(refs):
+    global _worker_refs
+    import django
+    django.setup()
+    # Never reuse a connection inherited from the parent process
+    connections.close_all()
+    _worker_refs = refs
+
+
+def _write_chunk_in_worker(table, index):
+    return write_chunk(table, index, _worker_refs)
+
+
+def _load_refs(stage, refs):
+    """Ids of the rows a stage created, in primary key order, for the next stage"""
+    from catalog.models import Product
+    from orders.models import Order
+    from wishlist.models import Wishlist
+
+    prefix = refs['prefix']
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    if 'users' in stage:
+        refs['user_ids'] = list(
+            User.objects.filter(username__startswith=prefix).order_by('pk').values_list('pk', flat=True)
+        )
+        products = Product.objects.filter(slug__startswith=f'{prefix}-product-').order_by('pk')
+        refs['product_ids'] = list(products.values_list('pk', flat=True))
+        refs['bestsellers'] = list(products.values_list('pk', 'title', 'sku', 'effective_price')[:BESTSELLERS])
+    if 'orders' in stage:
+        refs['wishlist_ids'] = list(
+            Wishlist.objects.filter(user__username__startswith=prefix).order_by('pk').values_list('pk', flat=True)
+        )
+        refs['order_ids'] = list(
+            Order.objects.filter(order_number__startswith=f'{prefix.upper()}-').order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+
+def _run_stage(stage, refs, workers, stats, progress):
+    tasks = [
+        (table, index) for table in stage
+        for index in range(math.ceil(len(TABLES[table][1](refs)) / CHUNK_SIZE))
+    ]
+    remaining = {table: sum(1 for task in tasks if task[0] == table) for table in stage}
+    totals = {table: (0, 0.0) for table in stage}
+
+    def done(table, rows, seconds):
+        totals[table] = (totals[table][0] + rows, totals[table][1] + seconds)
+        remaining[table] -= 1
+        if not remaining[table]:
+            stats[table] = totals[table]
+            if progress:
+                progress(table, *stats[table])
+
+    for table in stage:
+        if not remaining[table]:
+            stats[table] = totals[table]
+
+    if workers > 1:
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(refs,)) as pool:
+            futures = {pool.submit(_write_chunk_in_worker, *task): task[0] for task in tasks}
+            for future in as_completed(futures):
+                done(futures[future], *future.result())
+    else:
+        for table, index in tasks:
+            done(table, *write_chunk(table, index, refs))
+
+
+def populate(scale='smoke', seed=42, prefix='bench', workers=1, batch_size=BATCH_SIZE,
+             images=0, image_storage=None, search_index=True, progress=None):
+    """
+    Fill the current database with a synthetic store. scale is a SCALES key
+    or a dict with the same keys; images is the size of the placeholder image
+    pool (0 for none), written to image_storage (default storage if None).
+    progress(table, rows, seconds) is called as each table
+    completes. Returns {table: (rows, seconds)}, where seconds is the time
+    spent writing that table, summed over workers.
+    """
+    from catalog.models import Product
+    from catalog.search import get_search_backend
+
+    scale = SCALES[scale] if isinstance(scale, str) else scale
+    if connection.vendor == 'sqlite':
+        workers = 1  # one writer at a time
+    refs = {'seed': seed, 'prefix': prefix, 'scale': scale, 'batch_size': batch_size}
+    stats = {}
+
+    def timed(name, func):
+        start = time.perf_counter()
+        count = func()
+        stats[name] = (count, time.perf_counter() - start)
+        if progress:
+            progress(name, *stats[name])
+
+    def categories():
+        refs['category_ids'] = _create_categories(scale, prefix)
+        return len(refs['category_ids'])
+
+    timed('categories', categories)
+    # One hash for every user; hashing per row would dominate the run
+    refs['password'] = make_password(BENCHMARK_PASSWORD)
+    refs['images'] = image_pool(images, prefix, image_storage)
+
+    for stage in STAGES:
+        _run_stage(stage, refs, workers, stats, progress)
+        _load_refs(stage, refs)
+
+    # Denormalized data that save()/signals would normally maintain
+    timed('ratings', lambda: Product.refresh_rating_aggregates())
+    if search_index:
+        products = Product.objects.filter(slug__startswith=f'{prefix}-product-')
+        timed('search index', lambda: get_search_backend().rebuild(products))
+
+    cache.clear()
+    return stats
+
+
+def generate_dataset(scale='smoke', seed=42, stdout=None):
+    """Benchmark dataset in this process; returns {table: rows}"""
+    def progress(table, rows, seconds):
+        if stdout is not None:
+            stdout.write(f"{table}: {rows}")
+
+    stats = populate(scale, seed=seed, prefix='bench', progress=progress)
+    return {table: rows for table, (rows, seconds) in stats.items() if table in TABLES or table == 'categories'}
@@ -0,0 +1,130 @@
+"""
+Run scenarios and compare them with a stored baseline
+
+Results are plain dicts so they can be written to / read from JSON:
+
+    {"scenario name": {"p50": ms, "p95": ms, "p99": ms, "mean": ms,
+                       "max": ms, "queries": n, "errors": n}, ...}
+
+Query counts are deterministic for a given dataset, so any increase is a
+regression. Latencies are noisy; they only count as a regression when p95
+grows by more than the tolerance and by more than MIN_REGRESSION_MS.
+"""
+
+import json
+import math
+import statistics
+import time
+from pathlib import Path
+
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .scenarios import SCENARIOS, login
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+DEFAULT_TOLERANCE = 0.25  # 25% slower p95 before a latency regression is reported
+MIN_REGRESSION_MS = 5.0
+
+# Transaction control, not queries; only logged when already inside atomic()
+# (e.g. under TestCase), so counting them would make counts context dependent
+SAVEPOINT_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def run_scenario(scenario, context, iterations=20, warmup=2):
+    """Time iterations of one scenario (after untimed warmup runs)"""
+    client = Client()
+    if scenario.login:
+        login(client, context)
+
+    timings, queries, errors = [], [], 0
+    for i in range(warmup + iterations):
+        scenario.prepare(client, context)
+        # A full queries_log (maxlen) would make the captured count 0
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = scenario.request(client, context)
+            elapsed = (time.perf_counter() - start) * 1000
+        if i < warmup:
+            continue
+        if response.status_code >= 400:
+            errors += 1
+        timings.append(elapsed)
+        queries.append(sum(1 for query in captured if not query['sql'].startswith(SAVEPOINT_PREFIXES)))
+
+    return {
+        'p50': round(percentile(timings, 50), 2),
+        'p95': round(percentile(timings, 95), 2),
+        'p99': round(percentile(timings, 99), 2),
+        'mean': round(statistics.fmean(timings), 2) if timings else 0.0,
+        'max': round(max(timings), 2) if timings else 0.0,
+        # Worst case, so a query that only runs sometimes is still caught
+        'queries': max(queries) if queries else 0,
+        'errors': errors,
+    }
+
+
+def run_benchmarks(context, iterations=20, warmup=2, names=None, scenarios=None):
+    """Run every scenario (or those in names) and return {name: result}"""
+    results = {}
+    for scenario in scenarios or SCENARIOS:
+        if names and scenario.name not in names:
+            continue
+        results[scenario.name] = run_scenario(scenario, context, iterations, warmup)
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(results, meta, path=BASELINE_PATH):
+    with open(path, 'w') as fh:
+        json.dump({'meta': meta, 'scenarios': results}, fh, indent=2, sort_keys=True)
+        fh.write('\n')
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, latency=True):
+    """Human readable regressions of results against a baseline dict"""
+    regressions = []
+    expected = (baseline or {}).get('scenarios', {})
+    for name, result in results.items():
+        if result['errors']:
+            regressions.append(f"{name}: {result['errors']} request(s) failed")
+        before = expected.get(name)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: {result['queries']} queries (baseline {before['queries']})")
+        slower = result['p95'] - before['p95']
+        if latency and slower > MIN_REGRESSION_MS and result['p95'] > before['p95'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95']:.1f}ms (baseline {before['p95']:.1f}ms)")
+    return regressions
+
+
+def format_results(results, baseline=None):
+    expected = (baseline or {}).get('scenarios', {})
+    lines = [f"{'scenario':<34}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'queries':>9}{'base p95':>10}"]
+    for name, result in results.items():
+        before = expected.get(name)
+        lines.append(
+            f"{name:<34}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}"
+            f"{result['max']:>9.1f}{result['queries']:>9}"
+            f"{(format(before['p95'], '.1f') if before else '-'):>10}"
+        )
+    return '\n'.join(lines)
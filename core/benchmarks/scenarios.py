@@ -0,0 +1,169 @@
+"""
+Timed storefront scenarios
+
+Each Scenario makes one request per iteration with the Django test client.
+prepare() runs untimed before it (e.g. filling the cart before checkout);
+only request() is timed and its queries counted. Targets (products,
+categories, cursors) are picked from the dataset with a seeded
+random.Random so runs are repeatable.
+"""
+
+import json
+import random
+from urllib.parse import urlencode
+
+from django.urls import reverse
+
+from .data import BENCHMARK_PASSWORD, SEARCH_TERMS
+
+CHECKOUT_DATA = {
+    'email': 'bench@example.com',
+    'phone': '9999999999',
+    'shipping_name': 'Bench User',
+    'shipping_address_line_1': '1 Benchmark Road',
+    'shipping_city': 'Pune',
+    'shipping_state': 'MH',
+    'shipping_postal_code': '411001',
+    'shipping_country': 'India',
+    'payment_method': 'cod',
+}
+
+
+class BenchmarkContext:
+    """Request targets sampled from the benchmark dataset"""
+
+    def __init__(self, seed=42, sample_size=200):
+        from django.contrib.auth import get_user_model
+
+        from catalog.models import Category, Product, ProductVariant
+        from core.pagination import CursorPaginator
+
+        self.rng = random.Random(seed)
+        products = list(
+            Product.objects.filter(is_active=True, stock_quantity__gt=0)
+            .order_by('pk').values_list('pk', 'slug')[:sample_size * 5]
+        )
+        self.products = self.rng.sample(products, min(sample_size, len(products)))
+        self.variants = {}
+        for variant_id, product_id in (ProductVariant.objects.filter(
+                product_id__in=[pk for pk, slug in self.products], is_active=True
+        ).order_by('pk').values_list('pk', 'product_id')):
+            self.variants.setdefault(product_id, variant_id)
+        self.categories = list(Category.objects.filter(is_active=True).order_by('pk').values_list('slug', flat=True))
+        self.usernames = list(
+            get_user_model().objects.filter(username__startswith='bench', wishlist__isnull=False)
+            .order_by('pk').values_list('username', flat=True)[:sample_size]
+        )
+
+        # Cursor for a page half way through the default (newest first) listing
+        paginator = CursorPaginator(Product.objects.filter(is_active=True), 12, ('-created_at', '-id'))
+        middle = paginator.queryset[max(paginator.count // 2 - 1, 0):][:1]
+        self.deep_page = paginator.num_pages // 2
+        self.deep_cursor = paginator.encode_cursor(middle[0], 'next', self.deep_page) if middle else ''
+
+    def product(self):
+        return self.rng.choice(self.products)
+
+    def cart_line(self):
+        product_id, slug = self.product()
+        data = {'quantity': 1}
+        if product_id in self.variants:
+            data['variant_id'] = self.variants[product_id]
+        return product_id, data
+
+
+class Scenario:
+    name = ''
+    login = False
+
+    def prepare(self, client, context):
+        pass
+
+    def request(self, client, context):
+        raise NotImplementedError
+
+
+class Get(Scenario):
+    """GET a URL built by url(context)"""
+
+    def __init__(self, name, url, login=False):
+        self.name = name
+        self.url = url
+        self.login = login
+
+    def request(self, client, context):
+        return client.get(self.url(context))
+
+
+class CartAdd(Scenario):
+    name = 'cart add'
+
+    def request(self, client, context):
+        product_id, data = context.cart_line()
+        return client.post(reverse('catalog:cart_add', args=[product_id]), data)
+
+
+class CartUpdate(Scenario):
+    name = 'cart update'
+
+    def prepare(self, client, context):
+        self.product_id, self.data = context.cart_line()
+        client.post(reverse('catalog:cart_add', args=[self.product_id]), self.data)
+
+    def request(self, client, context):
+        return client.post(reverse('catalog:cart_update', args=[self.product_id]), dict(self.data, quantity=2))
+
+
+class Checkout(Scenario):
+    name = 'checkout'
+    login = True
+
+    def prepare(self, client, context):
+        product_id, data = context.cart_line()
+        client.post(reverse('catalog:cart_add', args=[product_id]), data)
+
+    def request(self, client, context):
+        return client.post(reverse('orders:checkout'), CHECKOUT_DATA)
+
+
+class WishlistToggle(Scenario):
+    name = 'wishlist toggle'
+    login = True
+
+    def request(self, client, context):
+        product_id, slug = context.product()
+        body = json.dumps({'product_id': product_id})
+        client.post(reverse('wishlist:add_to_wishlist'), body, content_type='application/json')
+        return client.post(reverse('wishlist:remove_from_wishlist'), body, content_type='application/json')
+
+
+def _product_list(**params):
+    """URL builder for the product list; callable values are resolved per request"""
+    def url(context):
+        query = {key: value(context) if callable(value) else value for key, value in params.items()}
+        return reverse('catalog:product_list') + ('?' + urlencode(query) if query else '')
+    return url
+
+
+SCENARIOS = [
+    Get('home', lambda context: reverse('core:home')),
+    Get('product list', _product_list()),
+    Get('product list search', _product_list(search=lambda context: context.rng.choice(SEARCH_TERMS))),
+    Get('product list category', _product_list(category=lambda context: context.rng.choice(context.categories))),
+    Get('product list price filter', _product_list(min_price=1000, max_price=5000, sort='price')),
+    Get('product list deep page (cursor)', _product_list(cursor=lambda context: context.deep_cursor)),
+    Get('product list deep page (offset)', _product_list(page=lambda context: context.deep_page)),
+    Get('product detail', lambda context: reverse('catalog:product_detail', args=[context.product()[1]])),
+    CartAdd(),
+    CartUpdate(),
+    Checkout(),
+    WishlistToggle(),
+    Get('wishlist page', lambda context: reverse('wishlist:wishlist'), login=True),
+    Get('order history', lambda context: reverse('orders:order_history'), login=True),
+]
+
+
+def login(client, context):
+    username = context.rng.choice(context.usernames)
+    if not client.login(username=username, password=BENCHMARK_PASSWORD):
+        raise RuntimeError(f"Could not log in benchmark user {username}")
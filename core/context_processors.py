@@ -1,41 +1,72 @@
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
 
-def site_context(request):
-    from catalog.models import Category, SiteSettings
-    from catalog.cart import Cart
-
-    # Get main categories for navigation
-    main_categories = Category.objects.filter(is_active=True, parent=None)[:8]
-
-    # Get user's wishlist count
-    wishlist_count = 0
-    if request.user.is_authenticated:
-        try:
-            from wishlist.models import Wishlist
-            wishlist = Wishlist.objects.filter(user=request.user).first()
-            if wishlist:
-                wishlist_count = wishlist.item_count
-        except:
-            wishlist_count = 0
-
-    # Get cart count
-    cart_count = 0
+# Site-wide navigation payload, rebuilt when a Category or SiteSettings
+# row is saved or deleted (see catalog.signals)
+NAVIGATION_CACHE_KEY = 'core:navigation_payload'
+NAVIGATION_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+
+def get_navigation_payload():
+    """Return the cached context shared by every page (no queries on hits)"""
+    payload = cache.get(NAVIGATION_CACHE_KEY)
+    if payload is None:
+        from catalog.models import SiteSettings
+        from catalog.category_tree import get_category_tree
+
+        site_settings = SiteSettings.get_settings()
+        payload = {
+            "SITE_NAME": site_settings.site_name,
+            "THEME": site_settings.theme,
+            "main_categories": get_category_tree().roots[:8],
+            "site_settings": site_settings,
+            "CURRENCY_SYMBOL": site_settings.currency_symbol,
+            "DEFAULT_CURRENCY": site_settings.default_currency,
+        }
+        cache.set(NAVIGATION_CACHE_KEY, payload, NAVIGATION_CACHE_TIMEOUT)
+    return payload
+
+
+def invalidate_navigation_payload():
+    cache.delete(NAVIGATION_CACHE_KEY)
+
+
+def active_wishlist_items(user):
+    """Active wishlist items of a user, without loading the wishlist first"""
+    from wishlist.models import WishlistItem
+    return WishlistItem.objects.filter(wishlist__user=user, is_active=True)
+
+
+def get_wishlist_count(request):
+    """Number of active items in the user's wishlist (one query)"""
+    if not request.user.is_authenticated:
+        return 0
     try:
-        cart = Cart(request)
-        cart_count = len(cart)
+        return active_wishlist_items(request.user).count()
     except:
-        cart_count = 0
-
-    # Get site settings and currency
-    site_settings = SiteSettings.get_settings()
-
-    return {
-        "SITE_NAME": site_settings.site_name,
-        "THEME": site_settings.theme,
-        "main_categories": main_categories,
-        "wishlist_count": wishlist_count,
-        "cart_count": cart_count,
-        "site_settings": site_settings,
-        "CURRENCY_SYMBOL": site_settings.currency_symbol,
-        "DEFAULT_CURRENCY": site_settings.default_currency,
-    }
+        return 0
+
+
+def get_cart_count(request):
+    try:
+        from catalog.cart import Cart
+        return len(Cart.for_request(request))
+    except:
+        return 0
+
+
+def site_context(request):
+    context = dict(get_navigation_payload())
+
+    if getattr(request, "page_cache_render", False):
+        # Rendered for the shared page cache (core.page_cache): no visitor
+        # data in the HTML, _page_state.html fills the badges in
+        context["page_cached"] = True
+        context["wishlist_count"] = context["cart_count"] = 0
+        return context
+
+    # Per-user counts are only computed if a template renders them
+    context["wishlist_count"] = SimpleLazyObject(lambda: get_wishlist_count(request))
+    context["cart_count"] = SimpleLazyObject(lambda: get_cart_count(request))
+    return context
@@ -0,0 +1,115 @@
+import platform
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core.benchmarks.data import SCALES, generate_dataset
+from core.benchmarks.runner import (
+    BASELINE_PATH, DEFAULT_TOLERANCE, compare, format_results, load_baseline, run_benchmarks, save_baseline,
+)
+from core.benchmarks.scenarios import SCENARIOS, BenchmarkContext
+
+
+def cached_templates():
+    """settings.TEMPLATES with the theme loaders wrapped in ThemeCachedLoader"""
+    templates = []
+    for config in settings.TEMPLATES:
+        options = config.get('OPTIONS', {})
+        loaders = options.get('loaders')
+        if loaders == settings.THEME_TEMPLATE_LOADERS:
+            loaders = [('core.template_loaders.ThemeCachedLoader', loaders)]
+            config = {**config, 'OPTIONS': {**options, 'loaders': loaders}}
+        templates.append(config)
+    return templates
+
+
+class Command(BaseCommand):
+    help = 'Benchmark storefront pages on a synthetic dataset and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Dataset size preset')
+        parser.add_argument('--products', type=int, help='Override the number of products')
+        parser.add_argument('--users', type=int, help='Override the number of users')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for data and request targets')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per scenario')
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='Scenario to run (repeatable, default: all)')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH), help='Baseline JSON file')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Allowed p95 slowdown (0.25 = 25%%)')
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Serve anonymous pages from the page cache (measures cache hits, not the views)')
+        parser.add_argument('--keepdb', action='store_true', help='Keep and reuse the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        known = {scenario.name for scenario in SCENARIOS}
+        unknown = set(options['scenarios'] or []) - known
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        scale = dict(SCALES[options['scale']])
+        if options['products']:
+            scale['products'] = options['products']
+        if options['users']:
+            scale['users'] = options['users']
+
+        # Full renders by default, so query counts track the views themselves
+        settings.PAGE_CACHE_ENABLED = options['page_cache']
+
+        # Everything runs in a throwaway test database, with compiled templates
+        # cached as in production even when DEBUG keeps the plain loaders
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False)
+        try:
+            with override_settings(TEMPLATES=cached_templates()):
+                results = self.run(scale, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        baseline = load_baseline(options['baseline'])
+        self.stdout.write(format_results(results, baseline))
+
+        if options['save_baseline']:
+            meta = {
+                'scale': options['scale'], 'products': scale['products'], 'users': scale['users'],
+                'seed': options['seed'], 'iterations': options['iterations'],
+                'page_cache': options['page_cache'],
+                'database': connection.vendor, 'python': platform.python_version(),
+            }
+            save_baseline(results, meta, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        if baseline is None:
+            self.stdout.write("No baseline to compare with (run with --save-baseline to create one)")
+            return
+        if baseline.get('meta', {}).get('page_cache', False) != options['page_cache']:
+            self.stdout.write("Baseline was recorded with the other page cache setting; not comparing")
+            return
+        # Latencies are only comparable with a baseline taken at the same scale
+        same_scale = baseline.get('meta', {}).get('products') == scale['products']
+        regressions = compare(results, baseline, options['tolerance'], latency=same_scale)
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(f"  {regression}"))
+            raise CommandError(f"{len(regressions)} regression(s) against the baseline")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def run(self, scale, options):
+        from catalog.models import Product
+
+        if not Product.objects.exists():
+            start = time.perf_counter()
+            counts = generate_dataset(scale, seed=options['seed'], stdout=self.stdout)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"Generated {sum(counts.values())} rows in {elapsed:.1f}s")
+
+        context = BenchmarkContext(seed=options['seed'])
+        return run_benchmarks(
+            context, iterations=options['iterations'], warmup=options['warmup'], names=options['scenarios'],
+        )
@@ -0,0 +1,34 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core.task_queue import requeue_stale, run_pending, run_worker, worker_id
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (image moves and derivatives, update checks, backups)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run every due task, then exit (e.g. from cron)')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds between polls of an empty queue')
+        parser.add_argument('--max-tasks', type=int, help='Exit after this many tasks (to recycle the process)')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            requeue_stale()
+            count = run_pending(limit=options['max_tasks'])
+            self.stdout.write(f"Ran {count} task(s)")
+            return
+
+        stopping = []
+
+        def stop(signum, frame):
+            # Finish the current task, then exit
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f"Task worker {worker_id()} started")
+        count = run_worker(sleep=options['sleep'], max_tasks=options['max_tasks'], should_stop=lambda: bool(stopping))
+        self.stdout.write(f"Task worker stopped after {count} task(s)")
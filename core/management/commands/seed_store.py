@@ -0,0 +1,68 @@
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.benchmarks.data import BATCH_SIZE, SCALES, populate
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a large deterministic synthetic store for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Dataset size preset')
+        parser.add_argument('--products', type=int, help='Override the number of products')
+        parser.add_argument('--users', type=int, help='Override the number of users')
+        parser.add_argument('--variants', type=int, help='Override variants per product')
+        parser.add_argument('--reviews', type=int, help='Override reviews per product')
+        parser.add_argument('--orders', type=int, help='Override orders per user')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same rows')
+        parser.add_argument('--prefix', default='seed', help='Prefix for usernames, slugs, SKUs and order numbers')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per INSERT')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (ignored on SQLite, which allows one writer)')
+        parser.add_argument('--images', type=int, default=0, help='Size of the shared placeholder image pool (0: no images)')
+        parser.add_argument('--media-root', default=str(settings.BASE_DIR / 'media_seed'),
+                            help='Where --images writes the pool, kept apart from MEDIA_ROOT; '
+                                 'serve it with MEDIA_ROOT=<path> for load tests')
+        parser.add_argument('--no-search-index', action='store_true', help='Skip rebuilding the search index')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix'].lower()
+        if get_user_model().objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Seed data with prefix '{prefix}' already exists; pass another --prefix")
+
+        scale = dict(SCALES[options['scale']])
+        for key in ('products', 'users', 'variants', 'reviews', 'orders'):
+            if options[key] is not None:
+                scale[key] = options[key]
+
+        workers = max(options['workers'], 1)
+        if connection.vendor == 'sqlite' and workers > 1:
+            self.stdout.write(self.style.WARNING("SQLite allows one writer at a time; seeding in a single process"))
+            workers = 1
+        self.stdout.write(
+            f"Seeding {scale['products']} products and {scale['users']} users "
+            f"(seed {options['seed']}, {workers} worker(s))..."
+        )
+
+        start = time.perf_counter()
+        stats = populate(
+            scale, seed=options['seed'], prefix=prefix, workers=workers, batch_size=options['batch_size'],
+            images=options['images'], image_storage=FileSystemStorage(location=options['media_root']),
+            search_index=not options['no_search_index'], progress=self.report,
+        )
+        elapsed = time.perf_counter() - start
+
+        rows = sum(count for table, (count, seconds) in stats.items() if table not in ('ratings', 'search index'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)"
+        ))
+
+    def report(self, table, rows, seconds):
+        rate = rows / seconds if seconds else 0
+        self.stdout.write(f"  {table:<16}{rows:>12,} rows {seconds:>8.1f}s {rate:>12,.0f} rows/s")
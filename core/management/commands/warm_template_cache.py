@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.template_loaders import warm_theme_templates
+from core.themes import list_themes
+
+
+class Command(BaseCommand):
+    help = 'Precompile every template in themes/<name> and templates_shared'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--theme', action='append', dest='themes', help='Theme to warm (repeatable, default: all)')
+
+    def handle(self, *args, **options):
+        available = list_themes()
+        themes = options['themes'] or available
+        unknown = set(themes) - set(available)
+        if unknown:
+            raise CommandError(f"Unknown theme(s): {', '.join(sorted(unknown))}")
+
+        start = time.perf_counter()
+        results = warm_theme_templates(themes)
+        failed = False
+        for theme, (compiled, errors) in results.items():
+            self.stdout.write(f"{theme}: compiled {compiled} templates")
+            for name, error in errors:
+                failed = True
+                self.stderr.write(self.style.ERROR(f"  {name}: {error}"))
+
+        elapsed = time.perf_counter() - start
+        if failed:
+            raise CommandError("Some templates failed to compile")
+        self.stdout.write(self.style.SUCCESS(f"Template cache warmed in {elapsed:.2f}s"))
@@ -1,39 +1,125 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from fnmatch import fnmatch
+
 from django.conf import settings
-from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a view issues more queries than its budget allows"""
+
+
+# Collapse literal lists and numbers so the same query shape groups together
+_IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)', re.IGNORECASE)
+_NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+def query_shape(sql):
+    """Normalize a SQL string into a shape shared by N+1 style repeats"""
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _NUMBER_RE.sub('N', sql)
+
+
+class QueryStats:
+    """Query counter installed on every connection with execute_wrapper"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated_shapes(self, threshold):
+        """Query shapes executed at least `threshold` times (N+1 candidates)"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
 
 
-class DynamicStaticThemeMiddleware:
+def get_query_budget(view_name):
     """
-    Middleware to dynamically set static file directories based on theme setting from database
+    Look up the query budget for a URL name in settings.QUERY_BUDGETS.
+    Keys may be exact URL names ('catalog:product_list') or glob patterns
+    ('wishlist:*'); QUERY_BUDGET_DEFAULT applies otherwise.
     """
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if view_name in budgets:
+        return budgets[view_name]
+    for pattern, budget in budgets.items():
+        if view_name and fnmatch(view_name, pattern):
+            return budget
+    return getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Count queries and DB time per request, flag repeated query shapes (N+1)
+    and enforce per-URL query budgets. Should be first in MIDDLEWARE so the
+    queries of every other middleware are counted too.
+
+    Settings:
+        QUERY_INSTRUMENTATION_ENABLED  turn the middleware on (default: DEBUG)
+        QUERY_BUDGETS                  {url name or glob: max queries}
+        QUERY_BUDGET_DEFAULT           budget for views not in QUERY_BUDGETS
+        QUERY_BUDGET_RAISE             raise QueryBudgetExceeded instead of logging
+        QUERY_N_PLUS_ONE_THRESHOLD     repeats of one shape reported as N+1
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # Get the theme from the database with caching
-        theme = cache.get('current_theme')
-
-        if theme is None:
-            try:
-                from catalog.models import SiteSettings
-                site_settings = SiteSettings.get_settings()
-                theme = site_settings.theme
-                cache.set('current_theme', theme, 30)  # Cache for 30 seconds
-            except:
-                # Fallback to default theme if database is not available
-                theme = 'glam'
-
-        # Update static files directories for theme-specific static files
-        theme_static_dir = settings.BASE_DIR / "themes" / theme / "static"
-        if len(settings.STATICFILES_DIRS) >= 2:
-            # Update the theme-specific static directory (second item)
-            settings.STATICFILES_DIRS[1] = theme_static_dir
-        else:
-            # Fallback: recreate the list if it's not as expected
-            settings.STATICFILES_DIRS = [
-                settings.BASE_DIR / "static_shared",
-                theme_static_dir,
-            ]
-
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        if not getattr(settings, 'QUERY_INSTRUMENTATION_ENABLED', settings.DEBUG):
+            return self.get_response(request)
+
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        request.query_stats = stats
+        view_name = self.get_view_name(request)
+        response['X-DB-Query-Count'] = str(stats.count)
+        response['Server-Timing'] = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+
+        self.report_repeated_queries(stats, view_name)
+        self.check_budget(stats, view_name, request)
+        return response
+
+    def get_view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def report_repeated_queries(self, stats, view_name):
+        threshold = getattr(settings, 'QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        for shape, repeats in stats.repeated_shapes(threshold):
+            logger.warning(
+                "Possible N+1 in %s: query executed %d times: %s",
+                view_name or 'unresolved view', repeats, shape[:300]
+            )
+
+    def check_budget(self, stats, view_name, request):
+        budget = get_query_budget(view_name)
+        if budget is None or stats.count <= budget:
+            return
+
+        message = (
+            f"{view_name or request.path} issued {stats.count} queries "
+            f"(budget {budget}, {stats.duration * 1000:.1f}ms in DB)"
+        )
+        if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:25
+
+from django.db import migrations, models
+
+
+def fail_duplicate_pending(apps, schema_editor):
+    """Keep the oldest pending task per unique_key; the rest would break the constraint"""
+    Task = apps.get_model('core', 'Task')
+    seen = set()
+    for pk, key in Task.objects.filter(status='pending').exclude(unique_key='').order_by('id').values_list('pk', 'unique_key'):
+        if key in seen:
+            Task.objects.filter(pk=pk).update(status='failed', last_error='Duplicate of an older pending task')
+        seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_task_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_pending, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='core_task_pending_key_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending'), models.Q(('unique_key', ''), _negated=True)), fields=('unique_key',), name='core_task_pending_key_uniq'),
+        ),
+    ]
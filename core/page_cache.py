@@ -0,0 +1,266 @@
+"""
+Full-page and fragment cache for anonymous storefront pages
+
+Pages are cached per theme, currency, host, path and the query
+parameters the view reads (others, such as ?utm_source=, share the entry),
+for anonymous GET requests with no pending messages. Nothing
+visitor-specific goes into the cached HTML: badges render as 0 and
+templates_shared/_page_state.html fetches the visitor's cart/wishlist
+counts after the page loads. {% csrf_token %} values are stored as a
+placeholder and filled in with the visitor's own token (setting the CSRF
+cookie) on every hit, so forms work without JavaScript.
+
+Entries are invalidated by tag ("navigation", "products", "product:42").
+Every tag has a version counter in the cache; an entry records the
+versions of its tags when stored and is treated as a miss once any of
+them has been bumped. Invalidating a tag is one cache.incr however many
+pages carry it (see catalog.signals for which saves bump which tags).
+
+The same tags answer conditional GETs, whether or not the page is cached
+here. Before the view runs, the ETag is computed from the versions of the
+page's tags, and Last-Modified from the time the newest of them was
+bumped. Views can add tags known up front, and an updated_at, with
+state= (product_detail adds its product). A repeat visitor or crawler
+with a matching If-None-Match / If-Modified-Since gets a 304 without any
+template rendering. Product.updated_at alone can't be the validator: it
+misses deletions and queryset.update() writes (stock reservations,
+rating refreshes), which do bump the tags. The visitor's CSRF cookie is
+part of the ETag, so a browser's copy always holds its own token.
+
+Like the other cached payloads, invalidation only reaches other processes
+through a shared cache backend; PAGE_CACHE_TIMEOUT bounds staleness
+otherwise.
+"""
+
+import hashlib
+import re
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+DEFAULT_TIMEOUT = 60 * 10  # 10 minutes
+TAG_PREFIX = 'pagecache:tag:'
+TAG_TIME_PREFIX = 'pagecache:tagtime:'
+CSRF_PLACEHOLDER = b'__page_cache_csrf_token__'
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def _enabled():
+    return getattr(settings, 'PAGE_CACHE_ENABLED', True)
+
+
+def _timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+# Tags
+
+def tag_state(tags):
+    """
+    Current version of every tag, initialising missing ones, and the Unix
+    time the most recently bumped of them changed
+    """
+    tags = list(tags)
+    found = cache.get_many([TAG_PREFIX + tag for tag in tags] + [TAG_TIME_PREFIX + tag for tag in tags])
+    versions, changed = {}, 0
+    for tag in tags:
+        key, time_key = TAG_PREFIX + tag, TAG_TIME_PREFIX + tag
+        now = time.time()
+        if key not in found:
+            # Time-based seed so an evicted tag never comes back at an old version
+            cache.add(key, int(now * 1000), None)
+            cache.set(time_key, int(now), None)
+            found[key], found[time_key] = cache.get(key), int(now)
+        elif time_key not in found:
+            cache.add(time_key, int(now), None)
+            found[time_key] = int(now)
+        versions[tag] = found[key]
+        changed = max(changed, found[time_key])
+    return versions, changed
+
+
+def tag_versions(tags):
+    """Current version of every tag, initialising missing ones"""
+    return tag_state(tags)[0]
+
+
+def invalidate_tags(*tags):
+    """Expire every cached page and fragment carrying any of tags"""
+    now = int(time.time())
+    for tag in set(tags):
+        try:
+            cache.incr(TAG_PREFIX + tag)
+        except ValueError:
+            # Never initialised (or evicted): nothing cached under it is valid
+            continue
+        cache.set(TAG_TIME_PREFIX + tag, now, None)
+
+
+def _is_fresh(entry):
+    if not entry:
+        return False
+    current = cache.get_many([TAG_PREFIX + tag for tag in entry['tags']])
+    return all(current.get(TAG_PREFIX + tag) == version for tag, version in entry['tags'].items())
+
+
+def _context_key(*parts):
+    # Imported lazily: context_processors imports catalog models
+    from .context_processors import get_navigation_payload
+
+    payload = get_navigation_payload()
+    raw = '|'.join(str(part) for part in (payload['THEME'], payload['DEFAULT_CURRENCY'], payload['CURRENCY_SYMBOL']) + parts)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+# Fragments
+
+def cached_fragment(name, tags, render, vary=(), timeout=None):
+    """Return render() output, cached per theme/currency/name/vary until a tag changes"""
+    if not _enabled():
+        return render()
+    key = 'pagecache:fragment:' + _context_key(name, *vary)
+    entry = cache.get(key)
+    if _is_fresh(entry):
+        return entry['content']
+    versions = tag_versions(tags)
+    content = render()
+    cache.set(key, {'content': content, 'tags': versions}, timeout or _timeout())
+    return content
+
+
+# Pages
+
+def normalized_query(params, allowed):
+    """Sorted query string of the allowed parameters only"""
+    return urlencode(sorted((name, values) for name, values in params.lists() if name in allowed), doseq=True)
+
+
+def page_cache_key(request, params=()):
+    query = normalized_query(request.GET, params)
+    return 'pagecache:page:' + _context_key(request.scheme, request.get_host(), request.path, query)
+
+
+def is_anonymous_page_request(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def add_page_cache_tags(request, *tags):
+    """Tag the page being rendered (e.g. with the product ids it shows)"""
+    if hasattr(request, 'page_cache_tags'):
+        request.page_cache_tags.update(tags)
+
+
+def page_validators(request, tags, params=(), last_modified=None):
+    """
+    ETag and Last-Modified (Unix time) of an anonymous page, from its tags
+    and an optional updated_at; no queries, nothing rendered
+    """
+    versions, changed = tag_state(tags)
+    if last_modified is not None:
+        changed = max(changed, int(last_modified.timestamp()))
+    etag = _context_key(
+        request.scheme, request.get_host(), request.path, normalized_query(request.GET, params),
+        sorted(versions.items()), request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+    return '"%s"' % etag, changed
+
+
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Browsers keep the page but revalidate it on every visit (cheap: a 304)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _strip_csrf(content):
+    """Replace the rendering visitor's CSRF tokens with CSRF_PLACEHOLDER"""
+    return CSRF_INPUT_RE.subn(rb'\1' + CSRF_PLACEHOLDER + rb'\2', content)
+
+
+def _cached_render(view, request, args, kwargs, tags, params, timeout):
+    """The view's response, from the page cache when a fresh entry exists"""
+    if not _enabled():
+        return view(request, *args, **kwargs)
+
+    key = page_cache_key(request, params)
+    entry = cache.get(key)
+    if _is_fresh(entry):
+        content = entry['content']
+        if entry['csrf']:
+            # Also sets this visitor's CSRF cookie
+            content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+        response = HttpResponse(content, content_type=entry['content_type'])
+        response['X-Page-Cache'] = 'hit'
+        return response
+
+    # Versions are read before rendering so a save during the render
+    # leaves the new entry already stale
+    request.page_cache_tags = set(tags)
+    versions = tag_versions(tags)
+    response = view(request, *args, **kwargs)
+
+    if response.status_code == 200 and not response.streaming and not len(get_messages(request)):
+        versions.update(tag_versions(request.page_cache_tags - set(versions)))
+        content, csrf_inputs = _strip_csrf(response.content)
+        entry = {
+            'content': content,
+            'csrf': bool(csrf_inputs),
+            'content_type': response['Content-Type'],
+            'tags': versions,
+        }
+        cache.set(key, entry, timeout or _timeout())
+        response['X-Page-Cache'] = 'miss'
+    return response
+
+
+def cache_page_for_anonymous(*tags, timeout=None, params=(), state=None):
+    """
+    View decorator: answer conditional GETs and serve anonymous GETs from
+    the page cache. tags apply to every page of the view; views add
+    page-specific ones with add_page_cache_tags(). params names the query
+    parameters the view reads; only those are part of the cache key.
+
+    state(request, *args, **kwargs), if given, returns (tags, updated_at)
+    known before rendering, for the validators only; None lets the view
+    answer without validators (e.g. a 404).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_anonymous_page_request(request):
+                return view(request, *args, **kwargs)
+
+            validator_tags, updated_at = set(tags), None
+            if state is not None:
+                page_state = state(request, *args, **kwargs)
+                if page_state is None:
+                    return view(request, *args, **kwargs)
+                validator_tags.update(page_state[0])
+                updated_at = page_state[1]
+            etag, last_modified = page_validators(request, validator_tags, params, updated_at)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return _set_validators(response, etag, last_modified)
+
+            # Visitor-independent HTML whether or not it is stored, so a 304
+            # never leaves a stale badge behind
+            request.page_cache_render = True
+            response = _cached_render(view, request, args, kwargs, tags, params, timeout)
+            if response.status_code == 200 and not response.streaming:
+                _set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
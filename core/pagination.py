@@ -0,0 +1,205 @@
+"""
+Keyset (cursor) pagination
+
+Instead of OFFSET, each page is fetched with a WHERE clause on the sort
+key of the last row seen, e.g. for ordering ('-created_at', '-id'):
+
+    WHERE created_at < %s OR (created_at = %s AND id < %s)
+    ORDER BY created_at DESC, id DESC LIMIT per_page + 1
+
+so page 500 costs the same as page 1. The ordering must end in a unique
+column (normally id). Next/previous links carry an opaque cursor; plain
+?page=N links still work (one OFFSET query) and the page number is
+carried along in the cursor so templates can keep showing "page N of M".
+
+The total count is lazy: it only runs if a template asks for it, and with
+approximate_count=True it is cached for a short while instead of being
+recomputed for every page.
+"""
+
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from functools import cached_property
+
+from django.core.cache import cache
+from django.db.models import Q
+
+APPROXIMATE_COUNT_TIMEOUT = 60 * 5  # 5 minutes
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class CursorPaginator:
+    """Paginate a queryset by keyset on ordering (a tuple of order_by() strings)"""
+
+    def __init__(self, queryset, per_page, ordering, approximate_count=False):
+        self.ordering = tuple(ordering)
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = int(per_page)
+        self.approximate_count = approximate_count
+
+    # Cursor encoding
+
+    def encode_cursor(self, obj, direction, number):
+        values = [_encode_value(getattr(obj, name)) for name, desc in self.keys]
+        payload = json.dumps({'d': direction, 'v': values, 'n': number}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            direction, values, number = payload['d'], payload['v'], int(payload['n'])
+            if direction not in ('next', 'prev') or len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+            model = self.queryset.model
+            values = [
+                model._meta.get_field(name).to_python(value) if value is not None else None
+                for (name, desc), value in zip(self.keys, values)
+            ]
+        except InvalidCursor:
+            raise
+        except Exception:
+            raise InvalidCursor(cursor)
+        return direction, values, max(number, 1)
+
+    def _seek(self, values, backwards):
+        """Rows strictly after values in the sort order (before, if backwards)"""
+        condition = Q()
+        for index, (name, desc) in enumerate(self.keys):
+            after = desc != backwards
+            lookup = {f"{name}__{'lt' if after else 'gt'}": values[index]}
+            lookup.update({prior: values[i] for i, (prior, _) in enumerate(self.keys[:index])})
+            condition |= Q(**lookup)
+        return condition
+
+    # Pages
+
+    def get_page(self, cursor=None, page_number=None):
+        """Page for a cursor, else for ?page=N (OFFSET, for direct jumps), else page 1"""
+        if cursor:
+            try:
+                direction, values, number = self.decode_cursor(cursor)
+            except InvalidCursor:
+                return self._page_at(1)
+            if direction == 'next':
+                rows = list(self.queryset.filter(self._seek(values, False))[:self.per_page + 1])
+                has_more = len(rows) > self.per_page
+                page = CursorPage(self, rows[:self.per_page], number, has_previous=True, has_next=has_more)
+            else:
+                reverse_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+                rows = list(
+                    self.queryset.filter(self._seek(values, True)).order_by(*reverse_ordering)[:self.per_page + 1]
+                )
+                has_more = len(rows) > self.per_page
+                rows = list(reversed(rows[:self.per_page]))
+                page = CursorPage(self, rows, number, has_previous=has_more, has_next=True)
+            # Rows behind the cursor were deleted: start over
+            return page if page.object_list else self._page_at(1)
+
+        try:
+            number = max(int(page_number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        return self._page_at(number)
+
+    def _page_at(self, number):
+        offset = (number - 1) * self.per_page
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            # Past the end: fall back to the first page like Paginator.get_page()
+            return self._page_at(1)
+        return CursorPage(self, rows[:self.per_page], number, has_previous=number > 1,
+                          has_next=len(rows) > self.per_page)
+
+    # Paginator-compatible totals (lazy)
+
+    @cached_property
+    def count(self):
+        if not self.approximate_count:
+            return self.queryset.count()
+        key = 'pagination:count:' + hashlib.md5(str(self.queryset.query).encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count, APPROXIMATE_COUNT_TIMEOUT)
+        return count
+
+    @property
+    def num_pages(self):
+        return max(1, -(-self.count // self.per_page))
+
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
+
+
+class CursorPage:
+    """One page of a CursorPaginator; mirrors the parts of Page templates use"""
+
+    def __init__(self, paginator, object_list, number, has_previous, has_next):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.number = number
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f"<CursorPage {self.number}>"
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return ''
+        return self.paginator.encode_cursor(self.object_list[-1], 'next', self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return ''
+        return self.paginator.encode_cursor(self.object_list[0], 'prev', self.number - 1)
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
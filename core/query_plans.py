@@ -0,0 +1,137 @@
+"""
+EXPLAIN checks for the storefront's hot queries
+
+HOT_QUERIES lists the ORM queries that run on (nearly) every storefront
+page, built with the same queryset helpers catalog.views, orders.views,
+wishlist.views and core.context_processors use, so a change to a view's
+query shows up here. find_full_scans() runs EXPLAIN on a
+queryset and returns the plan lines that read a whole table; the test
+suite fails if any hot query grows one (e.g. after an index is dropped
+or a filter changes shape).
+
+Add a query here whenever a new view starts hitting the database on every
+request.
+"""
+
+import re
+
+from django.db import connections, transaction
+
+# Plan lines that mean "read every row of this table"
+FULL_SCAN_PATTERNS = {
+    # "SCAN catalog_product" (but not "SCAN t USING INDEX ..." / "USING COVERING INDEX")
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)(?!.*\bUSING\b)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'mysql': re.compile(r'Table scan on (\w+)'),
+}
+
+
+def explain(queryset):
+    """EXPLAIN output for a queryset, steering PostgreSQL away from seq scans on tiny test tables"""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=queryset.db):
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+    if connection.vendor == 'mysql':
+        return queryset.explain(format='tree')
+    return queryset.explain()
+
+
+def find_full_scans(queryset):
+    """Plan lines of queryset that are full table scans (empty if none)"""
+    pattern = FULL_SCAN_PATTERNS.get(connections[queryset.db].vendor)
+    if pattern is None:
+        return []
+    return [line.strip() for line in explain(queryset).splitlines() if pattern.search(line)]
+
+
+def _first(queryset):
+    """The query QuerySet.first() runs"""
+    return (queryset if queryset.ordered else queryset.order_by('pk'))[:1]
+
+
+def _first_page(paginator):
+    """The query CursorPaginator.get_page() runs for page 1"""
+    return paginator.queryset[:paginator.per_page + 1]
+
+
+def _home_featured(data):
+    from core.views import home_products
+    return home_products()
+
+
+def _product_list(sort, params=lambda data: {}):
+    def build(data):
+        from django.http import QueryDict
+        from catalog.category_tree import get_category_tree
+        from catalog.facets import filter_products
+        from catalog.views import product_list_paginator
+
+        query = QueryDict(mutable=True)
+        query.update(params(data))
+        queryset, _ = filter_products(query, get_category_tree())
+        return _first_page(product_list_paginator(queryset, sort))
+    return build
+
+
+def _product_detail(data):
+    from catalog.views import active_product
+    return active_product(data['product'].slug)
+
+
+def _product_reviews(data):
+    return data['product'].get_approved_reviews()
+
+
+def _product_variants(data):
+    return data['product'].get_active_variants()
+
+
+def _category_descendants(data):
+    return data['category'].get_descendants()
+
+
+def _wishlist_count(data):
+    from core.context_processors import active_wishlist_items
+    return active_wishlist_items(data['user'])
+
+
+def _wishlist_page(data):
+    from wishlist.views import wishlist_paginator
+    return _first_page(wishlist_paginator(data['wishlist']))
+
+
+def _order_history(data):
+    from orders.views import order_history_paginator
+    return _first_page(order_history_paginator(data['user']))
+
+
+def _default_address(data):
+    from orders.views import default_shipping_address
+    return _first(default_shipping_address(data['user']))
+
+
+def _stored_cart(data):
+    from catalog.cart_storage import stored_cart_data
+    return _first(stored_cart_data({'user': data['user']}))
+
+
+# name -> builder(data) where data has 'user', 'product', 'category' and 'wishlist'
+HOT_QUERIES = {
+    'core:home featured products': _home_featured,
+    'catalog:product_list newest': _product_list('newest'),
+    'catalog:product_list category': _product_list('newest', lambda data: {'category': data['category'].slug}),
+    'catalog:product_list price range': _product_list('price', lambda data: {'min_price': '100', 'max_price': '500'}),
+    'catalog:product_list featured': _product_list('featured'),
+    'catalog:product_detail product': _product_detail,
+    'catalog:product_detail reviews': _product_reviews,
+    'catalog:product_detail variants': _product_variants,
+    'catalog category descendants': _category_descendants,
+    'site_context wishlist count': _wishlist_count,
+    'wishlist:wishlist page': _wishlist_page,
+    'orders:order_history': _order_history,
+    'orders:checkout default address': _default_address,
+    'cart storage lookup': _stored_cart,
+}
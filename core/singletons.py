@@ -0,0 +1,90 @@
+"""
+Cached singleton settings models (SiteSettings, WishlistSettings, UpdateSettings)
+
+Each settings row is memoized in-process and stored in the Django cache
+under a versioned key. Saving the row bumps the version once the
+transaction commits (bumping earlier would let another process cache the
+old row under the new version), so every process drops its memo on the
+next lookup without any database query. Callers get their own copy of the
+memoized row, never an instance shared with other threads.
+"""
+
+import copy
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+SINGLETON_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def _cache_prefix(model):
+    return f"singleton:{model._meta.label_lower}"
+
+
+def _current_version(model):
+    """Read (or initialise) the shared version counter for a settings model"""
+    version_key = f"{_cache_prefix(model)}:version"
+    version = cache.get(version_key)
+    if version is None:
+        # Time-based seed so a restarted cache never reuses an old version
+        cache.add(version_key, int(time.time() * 1000), None)
+        version = cache.get(version_key)
+    return version
+
+
+def get_singleton(model):
+    """Return the pk=1 settings row of model, creating it if needed"""
+    version = _current_version(model)
+    label = model._meta.label_lower
+
+    memo = _memo.get(label)
+    if memo is not None and version is not None and memo[0] == version:
+        return copy.deepcopy(memo[1])
+
+    data_key = f"{_cache_prefix(model)}:{version}"
+    instance = cache.get(data_key)
+    if instance is None:
+        instance, created = model.objects.get_or_create(pk=1)
+        cache.set(data_key, instance, SINGLETON_CACHE_TIMEOUT)
+
+    with _memo_lock:
+        _memo[label] = (version, copy.deepcopy(instance))
+    return instance
+
+
+def invalidate_singleton(model):
+    """Bump the version of a settings model so all processes reload it"""
+    version_key = f"{_cache_prefix(model)}:version"
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        # Key missing or evicted: start a fresh version
+        cache.set(version_key, int(time.time() * 1000), None)
+    with _memo_lock:
+        _memo.pop(model._meta.label_lower, None)
+
+
+class CachedSingletonMixin:
+    """Model mixin giving settings models a cached get_settings()"""
+
+    @classmethod
+    def get_settings(cls):
+        """Get or create the settings row (cached, no query on hits)"""
+        return get_singleton(cls)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        model = type(self)
+        transaction.on_commit(lambda: invalidate_singleton(model), using=self._state.db)
+
+    def delete(self, *args, **kwargs):
+        using = self._state.db
+        result = super().delete(*args, **kwargs)
+        model = type(self)
+        transaction.on_commit(lambda: invalidate_singleton(model), using=using)
+        return result
@@ -0,0 +1,121 @@
+"""
+Theme-aware static files
+
+Every themes/<name>/static tree is indexed once per process into a
+relative path -> file map. Theme assets are published under the
+namespaced prefix themes/<name>/, so collectstatic writes each theme to
+its own folder (hashed by the manifest storage in production), and
+un-namespaced lookups such as {% static 'site.css' %} resolve against the
+active theme with a dict lookup instead of rewriting STATICFILES_DIRS.
+"""
+
+import os
+from functools import lru_cache
+
+from django.contrib.staticfiles import utils
+from django.contrib.staticfiles.finders import BaseFinder
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+from .themes import get_active_theme, get_themes_dir, list_themes
+
+THEME_STATIC_PREFIX = 'themes'
+
+
+@lru_cache(maxsize=None)
+def get_theme_static_index():
+    """Map of {theme: {relative path: absolute path}} built once per process"""
+    index = {}
+    for theme in list_themes():
+        static_dir = get_themes_dir() / theme / "static"
+        files = {}
+        if static_dir.is_dir():
+            for root, dirs, filenames in os.walk(static_dir):
+                for filename in filenames:
+                    absolute = os.path.join(root, filename)
+                    relative = os.path.relpath(absolute, static_dir).replace(os.sep, '/')
+                    files[relative] = absolute
+        index[theme] = files
+    return index
+
+
+def theme_static_path(path, theme=None):
+    """
+    Namespace path under themes/<theme>/ if the theme ships that file,
+    otherwise return it unchanged (shared static or app static).
+    """
+    if path.startswith(f'{THEME_STATIC_PREFIX}/'):
+        return path
+    theme = theme or get_active_theme()
+    if path in get_theme_static_index().get(theme, {}):
+        return f'{THEME_STATIC_PREFIX}/{theme}/{path}'
+    return path
+
+
+class ThemeStaticFinder(BaseFinder):
+    """Static files finder serving themes/<name>/static from the prebuilt index"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = get_theme_static_index()
+        self.storages = {}
+        for theme in self.index:
+            storage = FileSystemStorage(location=str(get_themes_dir() / theme / "static"))
+            storage.prefix = f'{THEME_STATIC_PREFIX}/{theme}'
+            self.storages[theme] = storage
+
+    def check(self, **kwargs):
+        return []
+
+    def find(self, path, find_all=False, **kwargs):
+        # Django < 5.2 passes the flag as ``all``
+        find_all = find_all or kwargs.get('all', False)
+        theme, relative = self._split(path)
+        match = self.index.get(theme, {}).get(relative)
+        if match is None:
+            return [] if find_all else None
+        return [match] if find_all else match
+
+    def _split(self, path):
+        """Split 'themes/<theme>/<path>' or resolve a bare path against the active theme"""
+        parts = path.split('/', 2)
+        if len(parts) == 3 and parts[0] == THEME_STATIC_PREFIX and parts[1] in self.index:
+            return parts[1], parts[2]
+        return get_active_theme(), path
+
+    def list(self, ignore_patterns):
+        for theme, storage in self.storages.items():
+            if not os.path.isdir(storage.location):
+                continue
+            for path in utils.get_files(storage, ignore_patterns):
+                yield path, storage
+
+
+class ThemeStorageMixin:
+    """Resolve bare static paths to the active theme's namespaced copy"""
+
+    def url(self, name, *args, **kwargs):
+        return super().url(theme_static_path(name), *args, **kwargs)
+
+
+class ThemeStaticFilesStorage(ThemeStorageMixin, StaticFilesStorage):
+    """Development storage (plain names)"""
+
+
+class ThemeManifestStaticFilesStorage(ThemeStorageMixin, ManifestStaticFilesStorage):
+    """
+    Production storage with hashed, per-theme namespaced names.
+
+    Not strict: a file missing from the manifest or from STATIC_ROOT
+    (collectstatic not re-run after an update) falls back to its unhashed
+    URL instead of a 500. That URL 404s until collectstatic runs.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected: hashed_name() can't read the file to hash it
+            return name
@@ -0,0 +1,237 @@
+"""
+Database-backed background task queue
+
+Slow side effects (moving uploads, image derivatives, git fetches, backups)
+are queued as core.models.Task rows and run by `manage.py run_tasks`, so a
+request only pays for one INSERT. No broker is needed: any number of
+workers poll the table and claim a task with a conditional UPDATE
+(status pending -> running), which exactly one of them wins.
+
+    from core.task_queue import task
+
+    @task(max_attempts=5)
+    def send_receipt(order_id):
+        ...
+
+    send_receipt.delay(order.pk)                  # queue it
+    send_receipt.enqueue(args=[order.pk], delay=60, unique_key=f'receipt:{order.pk}')
+    send_receipt(order.pk)                        # still callable inline
+
+Tasks are queued inside the caller's transaction, so a worker never sees
+one for a row that was rolled back. Arguments must be JSON-serializable
+(pass primary keys, not model instances). A task that raises is retried
+with exponential backoff (TASK_RETRY_DELAY, doubled per attempt) until
+max_attempts, then left as failed with its traceback. A task whose worker
+died is handed out again once its lock is older than TASK_LOCK_TIMEOUT, so
+tasks must be safe to run twice.
+
+On hosts without a worker, TASK_RUN_INLINE = True runs each task due now
+in the enqueuing process right after the transaction commits (still with
+the retry bookkeeping). Delayed tasks then need `run_tasks --once` from
+cron.
+"""
+
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_DELAY = 30  # seconds, doubled per attempt
+DEFAULT_LOCK_TIMEOUT = 60 * 30
+DEFAULT_RETENTION = 60 * 60 * 24 * 7
+
+_registry = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def task(func=None, *, max_attempts=3, name=None):
+    """Register func as a task and give it .delay() / .enqueue()"""
+    def decorator(func):
+        task_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        def enqueue(args=(), kwargs=None, delay=0, unique_key=''):
+            return enqueue_task(task_name, args, kwargs, delay=delay, unique_key=unique_key, max_attempts=max_attempts)
+
+        func.task_name = task_name
+        func.enqueue = enqueue
+        func.delay = lambda *args, **kwargs: enqueue(args, kwargs)
+        _registry[task_name] = func
+        return func
+
+    return decorator(func) if func is not None else decorator
+
+
+def enqueue_task(name, args=(), kwargs=None, delay=0, unique_key='', max_attempts=3):
+    """
+    Queue a task by name. With a unique_key, an identical pending task is
+    reused instead of queueing a duplicate (enforced by a partial unique
+    constraint, so concurrent callers get the same row).
+    """
+    fields = dict(
+        name=name, args=list(args), kwargs=kwargs or {}, unique_key=unique_key, max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if not unique_key:
+        return _created(Task.objects.create(**fields), delay)
+    while True:
+        existing = Task.objects.filter(status=Task.PENDING, unique_key=unique_key).first()
+        if existing:
+            return existing
+        try:
+            with transaction.atomic():
+                job = Task.objects.create(**fields)
+        except IntegrityError:
+            # Lost the race to a concurrent enqueue; return its row (or retry
+            # if a worker already claimed it)
+            continue
+        return _created(job, delay)
+
+
+def _created(job, delay):
+    if delay <= 0 and _setting('TASK_RUN_INLINE', False):
+        transaction.on_commit(lambda: run_task(job.pk))
+    return job
+
+
+def get_task(name):
+    if name not in _registry:
+        # Importing the module runs its @task decorators
+        import_string(name)
+    return _registry[name]
+
+
+# Worker side
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"[:100]
+
+
+def _supersede(pk):
+    """Fail a task that can't go back to pending: one with its unique_key already is"""
+    Task.objects.filter(pk=pk).update(
+        status=Task.FAILED, finished_at=timezone.now(), locked_by='', locked_at=None,
+        last_error='Superseded by a pending task with the same unique_key',
+    )
+
+
+def requeue_stale():
+    """Hand tasks whose worker died (lock too old) to the next worker"""
+    cutoff = timezone.now() - timedelta(seconds=_setting('TASK_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT))
+    count = 0
+    for pk in Task.objects.filter(status=Task.RUNNING, locked_at__lt=cutoff).values_list('pk', flat=True):
+        try:
+            with transaction.atomic():
+                count += Task.objects.filter(pk=pk, status=Task.RUNNING).update(
+                    status=Task.PENDING, locked_by='', locked_at=None,
+                )
+        except IntegrityError:
+            _supersede(pk)
+    return count
+
+
+def purge_finished():
+    """Delete done tasks past TASK_RETENTION (failed ones are kept for inspection)"""
+    cutoff = timezone.now() - timedelta(seconds=_setting('TASK_RETENTION', DEFAULT_RETENTION))
+    return Task.objects.filter(status=Task.DONE, finished_at__lt=cutoff).delete()[0]
+
+
+def claim_next(worker):
+    """Atomically take the oldest due pending task, or None"""
+    while True:
+        now = timezone.now()
+        candidates = list(
+            Task.objects.filter(status=Task.PENDING, run_at__lte=now).order_by('run_at', 'id')
+            .values_list('pk', flat=True)[:10]
+        )
+        if not candidates:
+            return None
+        for pk in candidates:
+            # Another worker may win the race for this row; then try the next one
+            claimed = Task.objects.filter(pk=pk, status=Task.PENDING).update(
+                status=Task.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return Task.objects.get(pk=pk)
+
+
+def run_task(pk, worker=None):
+    """Claim and run one pending task now (TASK_RUN_INLINE); False if already taken"""
+    claimed = Task.objects.filter(pk=pk, status=Task.PENDING).update(
+        status=Task.RUNNING, locked_by=worker or worker_id(), locked_at=timezone.now(), attempts=F('attempts') + 1,
+    )
+    return bool(claimed) and execute(Task.objects.get(pk=pk))
+
+
+def execute(job):
+    """Run a claimed task and record the outcome; returns True on success"""
+    try:
+        get_task(job.name)(*job.args, **job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            delay = _setting('TASK_RETRY_DELAY', DEFAULT_RETRY_DELAY) * 2 ** (job.attempts - 1)
+            job.status, job.run_at = Task.PENDING, timezone.now() + timedelta(seconds=delay)
+            logger.warning("Task %s #%s failed (attempt %s), retrying in %ss", job.name, job.pk, job.attempts, delay)
+        else:
+            job.status, job.finished_at = Task.FAILED, timezone.now()
+            logger.error("Task %s #%s failed after %s attempts", job.name, job.pk, job.attempts)
+        job.locked_by, job.locked_at = '', None
+        try:
+            with transaction.atomic():
+                job.save(update_fields=['status', 'run_at', 'finished_at', 'last_error', 'locked_by', 'locked_at'])
+        except IntegrityError:
+            _supersede(job.pk)
+        return False
+
+    job.status, job.finished_at, job.locked_by, job.locked_at = Task.DONE, timezone.now(), '', None
+    job.save(update_fields=['status', 'finished_at', 'locked_by', 'locked_at'])
+    return True
+
+
+def run_pending(worker=None, limit=None):
+    """Run due tasks until the queue is empty (or limit is reached); returns how many ran"""
+    worker = worker or worker_id()
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next(worker)
+        if job is None:
+            break
+        execute(job)
+        count += 1
+    return count
+
+
+def run_worker(sleep=1.0, max_tasks=None, should_stop=lambda: False):
+    """Poll for tasks until should_stop() returns True or max_tasks have run"""
+    worker = worker_id()
+    count = 0
+    last_maintenance = 0
+    while not should_stop() and (max_tasks is None or count < max_tasks):
+        if time.monotonic() - last_maintenance > 60:
+            requeue_stale()
+            purge_finished()
+            last_maintenance = time.monotonic()
+        job = claim_next(worker)
+        if job is None:
+            time.sleep(sleep)
+        else:
+            execute(job)
+            count += 1
+        # Like the end of a request: drop broken or expired connections
+        close_old_connections()
+    return count
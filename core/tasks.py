@@ -0,0 +1,11 @@
+"""Background tasks for core maintenance (run by `manage.py run_tasks`)"""
+
+from .task_queue import task
+
+from .version import cms_version
+
+
+@task(max_attempts=1)
+def create_backup():
+    """Zip the project tree (see CMSVersion.create_backup); queue with create_backup.delay()"""
+    return cms_version.create_backup()
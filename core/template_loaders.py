@@ -1,6 +1,9 @@
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
 from django.template.loaders.filesystem import Loader as FilesystemLoader
 from django.conf import settings
-from django.core.cache import cache
+
+from .themes import get_active_theme, get_themes_dir, use_theme
 
 
 class DynamicThemeLoader(FilesystemLoader):
@@ -9,22 +12,105 @@ class DynamicThemeLoader(FilesystemLoader):
     """
 
     def get_dirs(self):
-        """Get template directories based on current theme from database"""
-        # Cache the theme for 30 seconds to avoid database hits on every template load
-        theme = cache.get('current_theme')
-
-        if theme is None:
-            try:
-                from catalog.models import SiteSettings
-                site_settings = SiteSettings.get_settings()
-                theme = site_settings.theme
-                cache.set('current_theme', theme, 30)  # Cache for 30 seconds
-            except:
-                # Fallback to default theme if database is not available
-                theme = 'glam'
+        """Get template directories based on current theme"""
+        theme = get_active_theme()
 
         # Return theme-specific template directories
         return [
-            settings.BASE_DIR / "themes" / theme,
+            get_themes_dir() / theme,
             settings.BASE_DIR / "templates_shared",
-        ]
\ No newline at end of file
+        ]
+
+
+class ThemeCachedLoader(CachedLoader):
+    """
+    Cached loader keeping compiled templates per theme in memory.
+
+    Each theme gets its own template cache, so switching SiteSettings.theme
+    picks up the other theme's templates without flushing anything, and
+    reset(theme) drops a single theme's compiled templates.
+    """
+
+    def __init__(self, engine, loaders):
+        self.theme_template_caches = {}
+        super().__init__(engine, loaders)
+
+    @property
+    def get_template_cache(self):
+        return self.theme_template_caches.setdefault(get_active_theme(), {})
+
+    @get_template_cache.setter
+    def get_template_cache(self, value):
+        # cached.Loader.__init__ assigns a single dict; caches are per theme here
+        pass
+
+    def get_template(self, template_name, skip=None):
+        # Pin the theme so cache key and template directories always agree
+        with use_theme(get_active_theme()):
+            return super().get_template(template_name, skip)
+
+    def reset(self, theme=None):
+        """Empty the template cache of one theme, or of every theme"""
+        if theme is None:
+            self.theme_template_caches.clear()
+        else:
+            self.theme_template_caches.pop(theme, None)
+
+
+def get_theme_cached_loaders():
+    """All ThemeCachedLoader instances of the configured Django engines"""
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        for loader in engine.template_loaders:
+            if isinstance(loader, ThemeCachedLoader):
+                yield loader
+
+
+def reset_theme_templates(theme=None):
+    """
+    Invalidate compiled templates of a theme (or all themes).
+
+    Only the loaders of the calling process are reset. Other worker processes
+    keep serving their compiled copies until they restart, so reload the
+    application server after changing template files on disk.
+    """
+    for loader in get_theme_cached_loaders():
+        loader.reset(theme)
+
+
+def iter_theme_template_names(theme):
+    """Template names shipped by a theme and by templates_shared"""
+    roots = [get_themes_dir() / theme, settings.BASE_DIR / "templates_shared"]
+    seen = set()
+    for root in roots:
+        if not root.is_dir():
+            continue
+        for path in sorted(root.rglob('*.html')):
+            if 'static' in path.relative_to(root).parts:
+                continue
+            name = path.relative_to(root).as_posix()
+            if name not in seen:
+                seen.add(name)
+                yield name
+
+
+def warm_theme_templates(themes):
+    """
+    Precompile every template of the given themes into the cached loader.
+    Returns {theme: (compiled count, [(template name, error), ...])}.
+    """
+    results = {}
+    for theme in themes:
+        compiled, errors = 0, []
+        with use_theme(theme):
+            for name in iter_theme_template_names(theme):
+                try:
+                    for engine in engines.all():
+                        engine.get_template(name)
+                    compiled += 1
+                except Exception as e:
+                    errors.append((name, e))
+        results[theme] = (compiled, errors)
+    return results
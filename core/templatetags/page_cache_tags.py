@@ -0,0 +1,46 @@
+"""
+{% tagged_cache %}: fragment caching invalidated by page cache tags
+
+    {% load page_cache_tags %}
+    {% tagged_cache "product-facets" "products" "navigation" vary=filter_query %}
+        ... expensive, visitor-independent markup ...
+    {% end_tagged_cache %}
+
+The first argument names the fragment, the rest are tags (see
+core.page_cache). Never wrap forms: a cached {% csrf_token %} belongs to
+someone else.
+"""
+
+from django import template
+
+from core.page_cache import cached_fragment
+
+register = template.Library()
+
+
+class TaggedCacheNode(template.Node):
+    def __init__(self, nodelist, name, tags, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.tags = tags
+        self.vary = vary
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        tags = [tag.resolve(context) for tag in self.tags]
+        vary = [self.vary.resolve(context)] if self.vary is not None else []
+        return cached_fragment(name, tags, lambda: self.nodelist.render(context), vary)
+
+
+@register.tag
+def tagged_cache(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' needs a fragment name")
+    vary = None
+    if bits[-1].startswith('vary='):
+        vary = parser.compile_filter(bits.pop()[len('vary='):])
+    name, tags = parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]]
+    nodelist = parser.parse(('end_tagged_cache',))
+    parser.delete_first_token()
+    return TaggedCacheNode(nodelist, name, tags, vary)
@@ -1,3 +1,726 @@
-from django.test import TestCase
+import re
+import tempfile
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models.query import QuerySet
+from django.template import Context, Template, engines
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Category, Product, ProductReview, ProductVariant, SiteSettings
+from core.benchmarks.data import generate_dataset
+from core.benchmarks.runner import compare, load_baseline, percentile, run_benchmarks
+from core.benchmarks.scenarios import BenchmarkContext
+from core.context_processors import get_navigation_payload, site_context
+from core.page_cache import invalidate_tags
+from core.pagination import CursorPaginator
+from core.query_plans import HOT_QUERIES, explain, find_full_scans
+from core.singletons import _current_version
+from core.staticfiles import (
+    ThemeManifestStaticFilesStorage, ThemeStaticFinder, get_theme_static_index, theme_static_path,
+)
+from core.middleware import QueryBudgetExceeded, query_shape
+from core.models import Task
+from core.task_queue import claim_next, enqueue_task, execute, requeue_stale, run_pending, task
+from core.template_loaders import get_theme_cached_loaders, reset_theme_templates, warm_theme_templates
+from core.themes import use_theme
+from users.models import User
+from wishlist.models import Wishlist
+
+
+class StorefrontDataMixin:
+    """Small storefront dataset shared by the query/performance tests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='shopper', password='pass12345', email='s@example.com')
+        cls.category = Category.objects.create(name='Rings', slug='rings')
+        cls.child_category = Category.objects.create(name='Gold Rings', slug='gold-rings', parent=cls.category)
+        cls.products = []
+        for i in range(15):
+            product = Product.objects.create(
+                title=f'Ring {i}',
+                slug=f'ring-{i}',
+                category=cls.child_category if i % 2 else cls.category,
+                price=Decimal('100.00') + i,
+                sale_price=Decimal('90.00') if i % 3 == 0 else None,
+                stock_quantity=10,
+                sku=f'RING-{i}',
+            )
+            ProductVariant.objects.create(product=product, name='Size', value='M', stock_quantity=5)
+            ProductReview.objects.create(
+                product=product, user=cls.user, rating=4, title='Nice', comment='Lovely ring', is_approved=True
+            )
+            cls.products.append(product)
+        wishlist = Wishlist.objects.create(user=cls.user)
+        for product in cls.products[:5]:
+            wishlist.add_product(product)
+
+
+# Budgets apply to full renders, not page cache hits
+@override_settings(QUERY_INSTRUMENTATION_ENABLED=True, QUERY_BUDGET_RAISE=True, PAGE_CACHE_ENABLED=False)
+class QueryBudgetTests(StorefrontDataMixin, TestCase):
+    """Fail if a storefront view goes over its QUERY_BUDGETS entry"""
+
+    def assertWithinBudget(self, url, method='get', data=None):
+        response = getattr(self.client, method)(url, data or {})
+        self.assertIn(response.status_code, (200, 302))
+        self.assertIn('X-DB-Query-Count', response)
+        return response
+
+    def test_anonymous_storefront_pages(self):
+        self.assertWithinBudget(reverse('core:home'))
+        self.assertWithinBudget(reverse('catalog:product_list'))
+        self.assertWithinBudget(reverse('catalog:product_list'), data={'search': 'ring', 'page': 2})
+        self.assertWithinBudget(reverse('catalog:product_list'), data={'category': 'rings', 'sort': 'price'})
+        self.assertWithinBudget(reverse('catalog:product_detail', args=[self.products[0].slug]))
+        self.assertWithinBudget(reverse('catalog:cart_detail'))
+
+    def test_authenticated_pages(self):
+        self.client.force_login(self.user)
+        self.assertWithinBudget(reverse('core:home'))
+        self.assertWithinBudget(reverse('wishlist:wishlist'))
+        self.assertWithinBudget(reverse('orders:order_history'))
+
+    @override_settings(QUERY_BUDGETS={'core:home': 1})
+    def test_over_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('core:home'))
+
+    @override_settings(QUERY_BUDGETS={'core:home': 1}, QUERY_BUDGET_RAISE=False)
+    def test_over_budget_logs(self):
+        with self.assertLogs('core.middleware', level='WARNING'):
+            self.client.get(reverse('core:home'))
+
+    def test_query_shape_collapses_literals(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            query_shape('SELECT * FROM t WHERE id IN (%s) LIMIT 4'),
+        )
+
+
+class SiteContextTests(StorefrontDataMixin, TestCase):
+    """The navigation payload is cached; per-user counts are lazy"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_navigation_payload_cached_until_category_or_settings_change(self):
+        get_navigation_payload()
+        with self.assertNumQueries(0):
+            payload = get_navigation_payload()
+        self.assertEqual([c.slug for c in payload['main_categories']], ['rings'])
+
+        Category.objects.create(name='Anklets', slug='anklets')
+        self.assertEqual([c.slug for c in get_navigation_payload()['main_categories']], ['anklets', 'rings'])
+
+        site_settings = SiteSettings.get_settings()
+        site_settings.site_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            site_settings.save()
+        self.assertEqual(get_navigation_payload()['SITE_NAME'], 'Renamed')
+
+    def test_counts_are_only_computed_when_rendered(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request.session = {}
+        get_navigation_payload()
+
+        with self.assertNumQueries(0):
+            context = site_context(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(str(context['wishlist_count']), '5')
+
+
+class SingletonSettingsTests(TestCase):
+    """Settings rows are cached per version; saves invalidate them once committed"""
+
+    def setUp(self):
+        cache.clear()
+        SiteSettings.get_settings()
+
+    def test_cached_copies(self):
+        with self.assertNumQueries(0):
+            site_settings = SiteSettings.get_settings()
+        # Each caller gets its own instance
+        site_settings.site_name = 'Scratch'
+        self.assertNotEqual(SiteSettings.get_settings().site_name, 'Scratch')
+        self.assertIsNot(SiteSettings.get_settings(), SiteSettings.get_settings())
+
+    def test_save_and_delete_invalidate(self):
+        site_settings = SiteSettings.get_settings()
+        site_settings.site_name = 'Saved'
+        with self.captureOnCommitCallbacks(execute=True):
+            site_settings.save()
+        self.assertEqual(SiteSettings.get_settings().site_name, 'Saved')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SiteSettings.get_settings().delete()
+        self.assertNotEqual(SiteSettings.get_settings().site_name, 'Saved')
+
+    def test_save_in_transaction_invalidates_on_commit(self):
+        version, name = _current_version(SiteSettings), SiteSettings.get_settings().site_name
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                site_settings = SiteSettings.get_settings()
+                site_settings.site_name = 'Pending'
+                site_settings.save()
+                # Not committed: other processes must not cache the row under a new version
+                self.assertEqual(_current_version(SiteSettings), version)
+        self.assertEqual(SiteSettings.get_settings().site_name, name)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(_current_version(SiteSettings), version)
+        self.assertEqual(SiteSettings.get_settings().site_name, 'Pending')
+
+    def test_rolled_back_save_keeps_version(self):
+        version = _current_version(SiteSettings)
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                SiteSettings.get_settings().save()
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(_current_version(SiteSettings), version)
+
+
+class CursorPaginationTests(StorefrontDataMixin, TestCase):
+    """Keyset pages cover every row exactly once and deep pages cost the same"""
+
+    def setUp(self):
+        cache.clear()
+
+    def paginate(self, ordering):
+        return CursorPaginator(Product.objects.all(), 4, ordering)
+
+    def test_walks_forward_and_back_over_ties(self):
+        # Several products share a sale price, so 'price' alone isn't a keyset
+        Product.objects.filter(sale_price__isnull=True).update(price=Decimal('50.00'))
+        paginator = self.paginate(('price', 'id'))
+
+        seen, pages = [], []
+        page = paginator.get_page()
+        while True:
+            pages.append([p.pk for p in page])
+            seen.extend(pages[-1])
+            if not page.has_next():
+                break
+            page = paginator.get_page(cursor=page.next_cursor)
+        self.assertEqual(seen, list(Product.objects.order_by('price', 'id').values_list('pk', flat=True)))
+        self.assertEqual(page.number, 4)
+
+        while page.has_previous():
+            page = paginator.get_page(cursor=page.previous_cursor)
+            self.assertEqual([p.pk for p in page], pages[page.number - 1])
+        self.assertEqual(page.number, 1)
+
+    def test_deep_page_costs_same_as_first(self):
+        paginator = self.paginate(('-created_at', '-id'))
+        with self.assertNumQueries(1):
+            first = paginator.get_page()
+        page = first
+        while page.has_next():
+            cursor = page.next_cursor
+            page = paginator.get_page(cursor=cursor)
+        with self.assertNumQueries(1):
+            paginator.get_page(cursor=cursor)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        page = self.paginate(('-created_at', '-id')).get_page(cursor='not-a-cursor')
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), 4)
+
+    def test_product_list_uses_cursor_links(self):
+        response = self.client.get(reverse('catalog:product_list'), {'sort': 'price'})
+        products = response.context['products']
+        self.assertEqual(response.context['total_products'], 15)
+
+        response = self.client.get(reverse('catalog:product_list'), {'sort': 'price', 'cursor': products.next_cursor})
+        self.assertEqual(response.context['products'].number, 2)
+        self.assertEqual(len(response.context['products']), 3)
+
+
+class QueryPlanTests(StorefrontDataMixin, TestCase):
+    """EXPLAIN every hot storefront query; none may scan a whole table"""
+
+    def test_hot_queries_use_indexes(self):
+        data = {
+            'user': self.user,
+            'product': self.products[0],
+            'category': self.category,
+            'wishlist': self.user.wishlist,
+        }
+        for name, build in HOT_QUERIES.items():
+            with self.subTest(query=name):
+                queryset = build(data)
+                self.assertEqual(find_full_scans(queryset), [], f"{name}:\n{explain(queryset)}")
+
+    def test_hot_queries_are_the_view_queries(self):
+        data = {'user': self.user, 'category': self.category}
+        pages = {
+            'catalog:product_list newest': {},
+            'catalog:product_list featured': {'sort': 'featured'},
+            'catalog:product_list category': {'category': self.category.slug},
+            'catalog:product_list price range': {'sort': 'price', 'min_price': '100', 'max_price': '500'},
+        }
+        for name, params in pages.items():
+            with self.subTest(query=name):
+                with CaptureQueriesContext(connection) as hot:
+                    list(HOT_QUERIES[name](data))
+                cache.clear()
+                with CaptureQueriesContext(connection) as view:
+                    self.client.get(reverse('catalog:product_list'), params)
+                self.assertIn(hot.captured_queries[0]['sql'], [q['sql'] for q in view.captured_queries])
+
+
+class PageCacheTests(StorefrontDataMixin, TestCase):
+    """Anonymous pages are served from the page cache until a tag they carry changes"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_cached_without_queries(self):
+        url = reverse('catalog:product_list')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertFalse([query for query in queries if 'catalog_' in query['sql']])
+        self.assertContains(response, 'Ring 14')
+        # Parameters the view reads are part of the key, others are not
+        self.assertEqual(self.client.get(url, {'sort': 'price'})['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(url, {'sort': 'price', 'utm_source': 'mail'})['X-Page-Cache'], 'hit')
+
+    def test_cached_forms_get_the_visitors_csrf_token(self):
+        # No variants: the detail page has a plain add-to-cart form
+        product = Product.objects.create(title='Plain Ring', slug='plain-ring', category=self.category,
+                                         price=Decimal('50.00'), stock_quantity=5, sku='PLAIN-1')
+        url = reverse('catalog:product_detail', args=[product.slug])
+        first = self.client.get(url)
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        self.assertContains(first, 'name="csrfmiddlewaretoken"')
+        self.assertNotContains(first, '__page_cache_csrf_token__')
+
+        # A new visitor gets a token of their own, matching the cookie set with it
+        visitor = Client(enforce_csrf_checks=True)
+        response = visitor.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertNotContains(response, '__page_cache_csrf_token__')
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', response.content).group(1).decode()
+        response = visitor.post(reverse('catalog:cart_add', args=[product.id]),
+                                {'quantity': 1, 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+
+    def test_product_save_expires_only_pages_showing_it(self):
+        detail = reverse('catalog:product_detail', args=[self.products[0].slug])
+        listing = reverse('catalog:product_list')
+        self.client.get(detail)
+        self.client.get(listing)
+
+        # Different category: not on products[0]'s page, but on the list
+        self.products[13].title = 'Renamed Ring'
+        self.products[13].save()
+        self.assertEqual(self.client.get(detail)['X-Page-Cache'], 'hit')
+        self.assertContains(self.client.get(listing), 'Renamed Ring')
+
+        self.products[0].title = 'Brand New Ring'
+        self.products[0].save()
+        self.assertContains(self.client.get(detail), 'Brand New Ring')
+
+    def test_category_and_review_saves_expire_pages(self):
+        detail = reverse('catalog:product_detail', args=[self.products[0].slug])
+        self.client.get(detail)
+        self.products[0].reviews.update(is_approved=False)
+        ProductReview.objects.filter(product=self.products[0]).first().save()
+        self.assertEqual(self.client.get(detail)['X-Page-Cache'], 'miss')
+
+        Category.objects.create(name='Necklaces', slug='necklaces')
+        self.assertEqual(self.client.get(detail)['X-Page-Cache'], 'miss')
+
+    def test_visitor_specific_requests_bypass_cache(self):
+        url = reverse('core:home')
+        self.client.get(url)
+        self.client.force_login(self.user)
+        self.assertNotIn('X-Page-Cache', self.client.get(url))
+
+    def test_page_state_fills_in_visitor_data(self):
+        product = self.products[0]
+        variant = product.variants.first()
+        self.client.post(reverse('catalog:cart_add', args=[product.id]), {'quantity': 2, 'variant_id': variant.id})
+        # Pending "added to cart" message: not cached
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('core:home')))
+
+        response = self.client.get(reverse('core:home'))
+        self.assertContains(response, reverse('core:page_state'))
+        state = self.client.get(reverse('core:page_state')).json()
+        self.assertEqual(state['cart_count'], 2)
+        self.assertTrue(state['csrf_token'])
+
+    def test_conditional_get(self):
+        url = reverse('catalog:product_detail', args=[self.products[0].slug])
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        # Validators come from tag versions and one lookup, not the rendered page
+        with CaptureQueriesContext(connection) as queries, self.assertTemplateNotUsed('catalog/product_detail.html'):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len([query for query in queries if 'catalog_' in query['sql']]), 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        self.products[0].title = 'Polished Ring'
+        self.products[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Polished Ring')
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_conditional_get_without_page_cache(self):
+        # No variants: the page has a {% csrf_token %} form
+        product = Product.objects.create(title='Plain Ring', slug='plain-ring', category=self.category,
+                                         price=Decimal('50.00'), stock_quantity=5, sku='PLAIN-1')
+        url = reverse('catalog:product_detail', args=[product.slug])
+        # The first response sets the CSRF cookie the validator includes
+        self.assertIn(settings.CSRF_COOKIE_NAME, self.client.get(url).cookies)
+        response = self.client.get(url)
+        self.assertNotIn('X-Page-Cache', response)
+        etag = response['ETag']
+        # Same visitor, same data: same validator on every render
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('core:home'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Writes that skip save() still bump the product's tag
+        invalidate_tags(f'product:{product.pk}')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Missing products are not validated, and logged-in visitors get fresh pages
+        self.assertEqual(self.client.get(reverse('catalog:product_detail', args=['nope'])).status_code, 404)
+        self.client.force_login(self.user)
+        self.assertNotIn('ETag', self.client.get(url))
+
+    def test_tagged_fragment(self):
+        template = Template('{% load page_cache_tags %}{% tagged_cache "fragment" "products" %}{{ value }}{% end_tagged_cache %}')
+        self.assertEqual(template.render(Context({'value': 1})), '1')
+        self.assertEqual(template.render(Context({'value': 2})), '1')
+        invalidate_tags('products')
+        self.assertEqual(template.render(Context({'value': 3})), '3')
+
+
+# The baseline measures full renders, not page cache hits
+@override_settings(PAGE_CACHE_ENABLED=False)
+class BenchmarkSmokeTests(TestCase):
+    """Every benchmark scenario runs and stays within the baseline query counts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = generate_dataset('smoke', seed=7)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_dataset_is_deterministic(self):
+        self.assertEqual(self.counts['products'], Product.objects.count())
+        self.assertEqual(Product.objects.get(slug='bench-product-0').sku, 'BENCH-0000000')
+        self.assertFalse(Product.objects.exclude(rating_count=0).filter(rating_avg=0).exists())
+
+    def test_scenarios_within_baseline_queries(self):
+        results = run_benchmarks(BenchmarkContext(seed=7), iterations=2, warmup=1)
+        # Latency depends on the machine; query counts must not grow
+        self.assertEqual(compare(results, load_baseline(), latency=False), [])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+class SeedStoreTests(TestCase):
+    """seed_store bulk-loads a deterministic store and reports throughput"""
+
+    def test_seed_store(self):
+        out = StringIO()
+        call_command('seed_store', scale='smoke', products=25, seed=3, stdout=out)
+        self.assertEqual(Product.objects.filter(slug__startswith='seed-product-').count(), 25)
+        self.assertEqual(ProductVariant.objects.filter(product__slug__startswith='seed-product-').count(), 50)
+        self.assertIn('rows/s', out.getvalue())
+        first = Product.objects.get(slug='seed-product-0')
+
+        # Same seed, different prefix: identical rows
+        call_command('seed_store', scale='smoke', products=25, seed=3, prefix='again', stdout=StringIO())
+        again = Product.objects.get(slug='again-product-0')
+        self.assertEqual((again.title, again.price, again.sale_price), (first.title, first.price, first.sale_price))
+
+        with self.assertRaises(CommandError):
+            call_command('seed_store', scale='smoke', stdout=StringIO())
+
+    def test_images_written_outside_media_root(self):
+        with tempfile.TemporaryDirectory() as media_root:
+            call_command('seed_store', scale='smoke', products=5, images=2, media_root=media_root,
+                         no_search_index=True, stdout=StringIO())
+            self.assertEqual(sorted(p.name for p in Path(media_root, 'products/seed-pool').iterdir()),
+                             ['000.png', '001.png'])
+            self.assertTrue(Product.objects.filter(image__startswith='products/seed-pool/').exists())
+
+
+calls = []
+
+
+@task(max_attempts=2)
+def flaky_task(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise ValueError('boom')
+
+
+@override_settings(TASK_RETRY_DELAY=10)
+class TaskQueueTests(TestCase):
+    """Queued tasks run once per claim, retry with backoff and then fail"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_queues_and_worker_runs(self):
+        job = flaky_task.delay('a')
+        self.assertEqual((job.name, job.args, job.status), ('core.tests.flaky_task', ['a'], Task.PENDING))
+        self.assertEqual(calls, [])
+
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Task.DONE, 1))
+        self.assertEqual(calls, ['a'])
+
+    def test_retry_with_backoff_then_fail(self):
+        job = flaky_task.enqueue(args=['b'], kwargs={'fail': True})
+        with self.assertLogs('core.task_queue', 'WARNING'):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Task.PENDING, 1))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertIn('ValueError: boom', job.last_error)
+
+        # Not due yet
+        self.assertEqual(run_pending(), 0)
+        Task.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('core.task_queue', 'ERROR'):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Task.FAILED, 2))
+        self.assertEqual(calls, ['b', 'b'])
+
+    def test_claimed_once_and_unique_key(self):
+        first = enqueue_task('core.tests.flaky_task', ['c'], unique_key='only-one')
+        self.assertEqual(enqueue_task('core.tests.flaky_task', ['c'], unique_key='only-one'), first)
+
+        self.assertEqual(claim_next('worker-1').pk, first.pk)
+        self.assertIsNone(claim_next('worker-2'))
+
+        # A crashed worker's task is handed out again after the lock timeout
+        Task.objects.filter(pk=first.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(claim_next('worker-2').locked_by, 'worker-2')
+
+    def test_one_pending_task_per_unique_key(self):
+        first = enqueue_task('core.tests.flaky_task', ['d'], unique_key='race')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Task.objects.create(name='core.tests.flaky_task', unique_key='race')
+
+        # A concurrent enqueue that missed the pending row gets it after the conflict
+        original_first = QuerySet.first
+        misses = [None]
+
+        def first_after_miss(queryset):
+            return misses.pop() if misses else original_first(queryset)
+
+        with mock.patch.object(QuerySet, 'first', first_after_miss):
+            self.assertEqual(enqueue_task('core.tests.flaky_task', ['d'], unique_key='race'), first)
+        self.assertEqual(Task.objects.filter(unique_key='race').count(), 1)
+
+    @override_settings(TASK_RUN_INLINE=True)
+    def test_run_inline_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = flaky_task.delay('f')
+            self.assertEqual(calls, [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, calls), (Task.DONE, ['f']))
+
+        # Delayed tasks wait for a worker
+        with self.captureOnCommitCallbacks(execute=True):
+            later = flaky_task.enqueue(args=['g'], delay=60)
+        later.refresh_from_db()
+        self.assertEqual((later.status, calls), (Task.PENDING, ['f']))
+
+    def test_retry_superseded_by_pending_duplicate(self):
+        job = flaky_task.enqueue(args=['e'], kwargs={'fail': True}, unique_key='retry')
+        self.assertEqual(claim_next('worker-1').pk, job.pk)
+        newer = flaky_task.enqueue(args=['e'], unique_key='retry')
+        self.assertNotEqual(newer.pk, job.pk)
+
+        with self.assertLogs('core.task_queue', 'WARNING'):
+            execute(Task.objects.get(pk=job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Task.FAILED)
+        self.assertIn('Superseded', job.last_error)
+
+
+    def test_admin_retry_skips_keys_already_pending(self):
+        pending = enqueue_task('core.tests.flaky_task', ['h'], unique_key='check')
+        failed = Task.objects.create(name='core.tests.flaky_task', unique_key='check', status=Task.FAILED, attempts=3)
+        twins = [
+            Task.objects.create(name='core.tests.flaky_task', unique_key='twin', status=Task.FAILED, attempts=3)
+            for _ in range(2)
+        ]
+        done = Task.objects.create(name='core.tests.flaky_task', status=Task.DONE, attempts=1)
+        admin = User.objects.create_superuser(username='admin', password='pass12345', email='admin@example.com')
+        self.client.force_login(admin)
+
+        response = self.client.post(reverse('admin:core_task_changelist'), {
+            'action': 'retry_tasks',
+            '_selected_action': [failed.pk, twins[0].pk, twins[1].pk, done.pk],
+        }, follow=True)
+
+        self.assertEqual(response.status_code, 200)
+        statuses = dict(Task.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[task.pk] for task in (pending, failed, twins[0], twins[1], done)],
+            [Task.PENDING, Task.FAILED, Task.PENDING, Task.FAILED, Task.PENDING],
+        )
+        messages = [str(message) for message in response.context['messages']]
+        self.assertIn('2 task(s) queued again.', messages)
+        self.assertTrue(any(f'#{failed.pk}' in m and f'#{twins[1].pk}' in m for m in messages))
+
+CACHED_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [('core.template_loaders.ThemeCachedLoader', settings.THEME_TEMPLATE_LOADERS)],
+    },
+}]
+
+
+@override_settings(TEMPLATES=CACHED_TEMPLATES)
+class ThemeTemplateLoaderTests(TestCase):
+    """Compiled templates are cached per theme and reset one theme at a time"""
+
+    def setUp(self):
+        reset_theme_templates()
+
+    def get_template(self, theme, name='base.html'):
+        with use_theme(theme):
+            return engines['django'].get_template(name).template
+
+    def test_templates_cached_per_theme(self):
+        glam = self.get_template('glam')
+        smoke = self.get_template('smoke')
+
+        self.assertIn('glam', glam.origin.name)
+        self.assertIn('smoke', smoke.origin.name)
+        self.assertIs(self.get_template('glam'), glam)
+        self.assertIs(self.get_template('smoke'), smoke)
+
+    def test_reset_one_theme(self):
+        glam = self.get_template('glam')
+        smoke = self.get_template('smoke')
+
+        reset_theme_templates('glam')
+        self.assertIsNot(self.get_template('glam'), glam)
+        self.assertIs(self.get_template('smoke'), smoke)
+
+        reset_theme_templates()
+        self.assertIsNot(self.get_template('smoke'), smoke)
+
+    def test_settings_save_keeps_compiled_templates(self):
+        glam = self.get_template('glam')
+        site = SiteSettings.get_settings()
+        site.site_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            site.save()
+        self.assertIs(self.get_template('glam'), glam)
+
+    def test_warm_compiles_into_the_cache(self):
+        results = warm_theme_templates(['smoke'])
+        compiled, errors = results['smoke']
+        self.assertGreater(compiled, 0)
+        self.assertEqual(errors, [])
+
+        loader, = get_theme_cached_loaders()
+        self.assertIn('smoke', loader.theme_template_caches)
+        self.assertNotIn('glam', loader.theme_template_caches)
+
+
+class ThemeStaticFinderTests(TestCase):
+    """Theme static files are found under themes/<name>/ and for the active theme"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.base_dir = Path(tmp.name)
+        for theme in ('glam', 'modern'):
+            static_dir = self.base_dir / 'themes' / theme / 'static' / 'css'
+            static_dir.mkdir(parents=True)
+            (static_dir / 'site.css').write_text(f'/* {theme} */')
+        (self.base_dir / 'themes' / 'smoke').mkdir()
+
+        settings_override = override_settings(
+            BASE_DIR=self.base_dir,
+            STATICFILES_DIRS=[],
+            STATICFILES_FINDERS=['core.staticfiles.ThemeStaticFinder'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for cached in (get_theme_static_index, finders.get_finder):
+            cached.cache_clear()
+            self.addCleanup(cached.cache_clear)
+        SiteSettings.objects.update_or_create(pk=1, defaults={'theme': 'glam'})
+        cache.clear()
+
+    def test_find_namespaced_and_active_theme(self):
+        finder = ThemeStaticFinder()
+        modern = str(self.base_dir / 'themes/modern/static/css/site.css')
+        self.assertEqual(finder.find('themes/modern/css/site.css'), modern)
+        self.assertEqual(finder.find('themes/modern/css/site.css', find_all=True), [modern])
+        self.assertTrue(finder.find('css/site.css').endswith('themes/glam/static/css/site.css'))
+        self.assertIsNone(finder.find('css/missing.css'))
+        self.assertEqual(finder.find('css/missing.css', find_all=True), [])
+        # Django < 5.2 keyword
+        self.assertEqual(finder.find('themes/modern/css/site.css', all=True), [modern])
+
+    def test_django_finders_and_findstatic(self):
+        self.assertTrue(finders.find('themes/glam/css/site.css').endswith('glam/static/css/site.css'))
+        self.assertEqual(len(finders.find('themes/glam/css/site.css', find_all=True)), 1)
+        out = StringIO()
+        call_command('findstatic', 'themes/modern/css/site.css', stdout=out, verbosity=1)
+        self.assertIn('modern', out.getvalue())
+
+    def test_list_and_static_path(self):
+        listed = sorted(
+            f'{storage.prefix}/{path}' for path, storage in ThemeStaticFinder().list(ignore_patterns=[])
+        )
+        self.assertEqual(listed, ['themes/glam/css/site.css', 'themes/modern/css/site.css'])
+        self.assertEqual(theme_static_path('css/site.css', theme='modern'), 'themes/modern/css/site.css')
+        self.assertEqual(theme_static_path('css/site.css', theme='smoke'), 'css/site.css')
+
+    def test_manifest_storage_falls_back_for_uncollected_files(self):
+        static_root = self.base_dir / 'static_root'
+        with override_settings(STATIC_ROOT=static_root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            storage = ThemeManifestStaticFilesStorage()
+            self.assertRegex(storage.url('css/site.css'), r'^/static/themes/glam/css/site\.[0-9a-f]{12}\.css$')
+            # Added to the theme after the last collectstatic
+            (self.base_dir / 'themes/glam/static/css/new.css').write_text('/* new */')
+            get_theme_static_index.cache_clear()
+            self.assertEqual(storage.url('css/new.css'), '/static/themes/glam/css/new.css')
 
-# Create your tests here.
@@ -0,0 +1,48 @@
+"""
+Theme helpers shared by the template loader and static files finder/storage
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_THEME = 'glam'
+
+_override = threading.local()
+
+
+def get_themes_dir():
+    return settings.BASE_DIR / "themes"
+
+
+@contextmanager
+def use_theme(theme):
+    """Pin the active theme for the current thread (template warm-up, loading)"""
+    previous = getattr(_override, 'theme', None)
+    _override.theme = theme
+    try:
+        yield theme
+    finally:
+        _override.theme = previous
+
+
+def get_active_theme():
+    """Current theme name from SiteSettings (cached, no query on hits)"""
+    theme = getattr(_override, 'theme', None)
+    if theme:
+        return theme
+    try:
+        from catalog.models import SiteSettings
+        return SiteSettings.get_settings().theme or DEFAULT_THEME
+    except Exception:
+        # Fallback to default theme if database is not available
+        return DEFAULT_THEME
+
+
+def list_themes():
+    """Names of all theme directories under themes/"""
+    themes_dir = get_themes_dir()
+    if not themes_dir.exists():
+        return []
+    return sorted(child.name for child in themes_dir.iterdir() if child.is_dir())
@@ -1,7 +1,10 @@
 # core/urls.py
 from django.urls import path
-from .views import home
+from .views import home, page_state
 
 app_name = 'core'
 
-urlpatterns = [ path("", home, name="home") ]
+urlpatterns = [
+    path("", home, name="home"),
+    path("page-state/", page_state, name="page_state"),
+]
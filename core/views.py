@@ -1,10 +1,23 @@
 # core/views.py
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import render
+from django.views.decorators.cache import never_cache
+
 from catalog.models import Product, Category
+from .context_processors import get_cart_count, get_wishlist_count
+from .page_cache import cache_page_for_anonymous
+
+
+def home_products():
+    """Newest active products shown on the homepage"""
+    return Product.objects.filter(is_active=True)[:8]
 
+
+@cache_page_for_anonymous('navigation', 'products')
 def home(request):
     # Get featured products and categories for homepage
-    featured_products = Product.objects.filter(is_active=True)[:8]
+    featured_products = home_products()
     categories = Category.objects.all()[:6]
 
     context = {
@@ -12,3 +25,14 @@ def home(request):
         'categories': categories,
     }
     return render(request, "home.html", context)
+
+
+@never_cache
+def page_state(request):
+    """Per-visitor bits left out of cached pages: badge counts and a CSRF token"""
+    return JsonResponse({
+        'authenticated': request.user.is_authenticated,
+        'cart_count': get_cart_count(request),
+        'wishlist_count': get_wishlist_count(request),
+        'csrf_token': get_token(request),
+    })
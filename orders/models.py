@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, DEFAULT_DB_ALIAS
 from django.conf import settings
 from django.urls import reverse
 from decimal import Decimal
@@ -14,6 +14,8 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    TAX_RATE = Decimal('0.18')  # 18% GST
+
     PAYMENT_CHOICES = [
         ('cod', 'Cash on Delivery'),
         ('online', 'Online Payment'),
@@ -54,6 +56,10 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # order_history (keyset on created_at, id)
+            models.Index(fields=['user', 'created_at', 'id'], name='orders_order_user_created_idx'),
+        ]
         
     def __str__(self):
         return f"Order #{self.order_number}"
@@ -63,19 +69,30 @@ class Order(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.order_number:
-            import datetime
-            now = datetime.datetime.now()
-            self.order_number = f"ORD-{now.strftime('%Y%m%d')}-{now.strftime('%H%M%S')}"
+            from .numbering import next_order_number
+            self.order_number = next_order_number(kwargs.get('using') or DEFAULT_DB_ALIAS)
         super().save(*args, **kwargs)
     
     def get_total_items(self):
         return sum(item.quantity for item in self.items.all())
     
-    def calculate_total(self):
-        self.subtotal = Decimal(str(sum(item.get_total_price() for item in self.items.all())))
-        self.tax_amount = self.subtotal * Decimal('0.18')  # 18% GST
+    def set_totals(self, subtotal):
+        """Set subtotal, tax and total from a known subtotal without touching the DB"""
+        self.subtotal = Decimal(str(subtotal))
+        self.tax_amount = self.subtotal * self.TAX_RATE
         self.total_amount = self.subtotal + self.tax_amount + self.shipping_cost
-        self.save()
+        return self.total_amount
+
+    def calculate_total(self):
+        """Recompute totals from the saved items with one aggregate query"""
+        subtotal = self.items.aggregate(
+            total=models.Sum(
+                models.F('quantity') * models.F('unit_price'),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2)
+            )
+        )['total'] or 0
+        self.set_totals(subtotal)
+        self.save(update_fields=['subtotal', 'tax_amount', 'total_amount', 'updated_at'])
         return self.total_amount
 
 class OrderItem(models.Model):
@@ -94,3 +111,13 @@ class OrderItem(models.Model):
     
     def get_total_price(self):
         return self.quantity * self.unit_price
+
+
+class OrderNumberWorker(models.Model):
+    """One row per process that allocates order numbers (see orders.numbering)"""
+    hostname = models.CharField(max_length=255, blank=True)
+    pid = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Worker {self.pk} ({self.hostname}:{self.pid})"
@@ -0,0 +1,151 @@
+"""
+Order number allocation
+
+Order numbers look like ORD-20261016-104512-2S-0007:
+
+    ORD-<date>-<time>-<worker>-<sequence>
+
+Each process claims a unique worker id once (one INSERT into
+OrderNumberWorker, repeated after a fork) and then hands out numbers from
+memory: the sequence counts up within a second and the timestamp never
+moves backwards, so numbers are monotonic per worker and unique across
+processes without a database round-trip per order.
+
+A worker id must never be handed out twice. Claims therefore commit on
+their own: inside a transaction the row is inserted from a separate
+connection, so a rollback of the caller can't release the id (SQLite would
+otherwise reuse a rolled-back rowid). Committed ids are never reissued
+(AUTOINCREMENT / sequences), so the rows themselves are only history and
+claims prune the ones older than WORKER_RETENTION.
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.utils import timezone
+
+MAX_SEQUENCE = 9999
+
+# OrderNumberWorker rows older than this are deleted when a new worker claims
+WORKER_RETENTION = timedelta(days=30)
+
+
+def _base36(number):
+    digits = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    result = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        result = digits[remainder] + result
+        if not number:
+            return result
+
+
+class OrderNumberAllocator:
+    """Per-process, thread-safe generator of collision-free order numbers"""
+
+    prefix = 'ORD'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._worker_id = None
+        self._worker_pid = None
+        self._provisional = False
+        self._second = 0
+        self._sequence = 0
+
+    def _insert_worker(self, using):
+        from .models import OrderNumberWorker
+
+        worker = OrderNumberWorker.objects.using(using).create(
+            hostname=socket.gethostname()[:255], pid=os.getpid()
+        )
+        # Keep the newest row: some backends (MySQL < 8) derive the next id
+        # from MAX(id) after a restart
+        OrderNumberWorker.objects.using(using).filter(
+            created_at__lt=timezone.now() - WORKER_RETENTION
+        ).exclude(pk=worker.pk).delete()
+        return worker.pk
+
+    def _insert_worker_in_own_connection(self, using):
+        """Claim from a helper thread, which gets its own autocommit connection"""
+        result = []
+
+        def claim():
+            try:
+                result.append(self._insert_worker(using))
+            except DatabaseError as e:
+                result.append(e)
+            finally:
+                connections[using].close()
+
+        thread = threading.Thread(target=claim, name='order-number-claim')
+        thread.start()
+        thread.join()
+        if isinstance(result[0], Exception):
+            raise result[0]
+        return result[0]
+
+    def _claim_worker(self, using):
+        self._provisional = False
+        if not connections[using].in_atomic_block:
+            self._worker_id = self._insert_worker(using)
+        else:
+            try:
+                self._worker_id = self._insert_worker_in_own_connection(using)
+            except DatabaseError:
+                # The database refused a second writer (SQLite while this
+                # connection holds the write lock): claim inside the
+                # transaction and drop the id unless it commits
+                worker_id = self._worker_id = self._insert_worker(using)
+                self._provisional = True
+                transaction.on_commit(lambda: self._confirm(worker_id), using=using)
+        self._worker_pid = os.getpid()
+
+    def _confirm(self, worker_id):
+        with self._lock:
+            if self._worker_id == worker_id:
+                self._provisional = False
+
+    def ensure_worker(self, using=DEFAULT_DB_ALIAS):
+        """
+        Claim this process's worker id if needed. Safe inside a transaction:
+        the claim commits independently of it.
+        """
+        with self._lock:
+            stale = self._provisional and not connections[using].in_atomic_block
+            if stale or self._worker_id is None or self._worker_pid != os.getpid():
+                self._claim_worker(using)
+                self._second, self._sequence = 0, 0
+            return self._worker_id
+
+    def next(self, using=DEFAULT_DB_ALIAS):
+        """Return the next order number"""
+        self.ensure_worker(using)
+        with self._lock:
+            second = max(int(time.time()), self._second)
+            if second == self._second:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    # Sequence exhausted: borrow the next second
+                    second, self._sequence = second + 1, 1
+            else:
+                self._sequence = 1
+            self._second = second
+            worker_id, sequence = self._worker_id, self._sequence
+
+        stamp = timezone.localtime(datetime.fromtimestamp(second, tz=dt_timezone.utc))
+        return (
+            f"{self.prefix}-{stamp.strftime('%Y%m%d')}-{stamp.strftime('%H%M%S')}-"
+            f"{_base36(worker_id)}-{sequence:04d}"
+        )
+
+
+order_numbers = OrderNumberAllocator()
+
+
+def next_order_number(using=DEFAULT_DB_ALIAS):
+    return order_numbers.next(using)
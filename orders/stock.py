@@ -0,0 +1,118 @@
+"""
+Stock reservation for checkout
+
+All stock for an order is decremented with one conditional UPDATE per
+table (stock_quantity >= requested) inside the caller's transaction, so
+concurrent checkouts can never oversell and a shortfall on any line
+rolls back the whole order.
+
+Lock order is deterministic, so two checkouts can't deadlock: variants
+before products, and within a table ascending ids. A multi-row UPDATE
+locks rows in whatever order the plan scans them, so on databases with
+row locks the rows are first locked with one SELECT ... FOR UPDATE
+ORDER BY id. SQLite locks the whole database and skips that query.
+"""
+
+from collections import OrderedDict
+
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from catalog.models import Product, ProductVariant
+from core.page_cache import invalidate_tags
+
+
+class InsufficientStock(Exception):
+    """Raised when one or more cart lines can't be fulfilled"""
+
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls
+        super().__init__("; ".join(
+            f"{name}: requested {requested}, available {available}"
+            for name, requested, available in shortfalls
+        ))
+
+
+def _line_name(product, variant=None):
+    if variant:
+        return f"{product.title} ({variant.name}: {variant.value})"
+    return product.title
+
+
+def collect_stock_demand(lines):
+    """
+    Sum requested quantities per stock-keeping row.
+    lines are cart items: dicts with 'product', 'variant' and 'quantity'.
+    Returns (product demand, variant demand), each {id: (quantity, name)}.
+    """
+    products, variants = {}, {}
+    for line in lines:
+        product, variant = line['product'], line.get('variant')
+        if variant:
+            quantity, name = variants.get(variant.pk, (0, _line_name(product, variant)))
+            variants[variant.pk] = (quantity + line['quantity'], name)
+        elif product.manage_stock:
+            quantity, name = products.get(product.pk, (0, _line_name(product)))
+            products[product.pk] = (quantity + line['quantity'], name)
+    return (
+        OrderedDict(sorted(products.items())),
+        OrderedDict(sorted(variants.items())),
+    )
+
+
+def _decrement(model, demand, extra_filter):
+    """
+    Lock the rows in demand in ascending id order, then decrement them
+    with a single conditional UPDATE. If any row lacks stock the UPDATE is
+    undone (savepoint) and the shortfalls are returned.
+    """
+    if not demand:
+        return []
+
+    if connections[model.objects.db].features.has_select_for_update:
+        list(model.objects.select_for_update().filter(pk__in=list(demand)).order_by('pk').values_list('pk', flat=True))
+
+    requested = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, (quantity, name) in demand.items()],
+        output_field=IntegerField()
+    )
+    queryset = model.objects.filter(pk__in=list(demand), stock_quantity__gte=requested, **extra_filter)
+    with transaction.atomic():
+        if queryset.update(stock_quantity=F('stock_quantity') - requested) == len(demand):
+            return []
+        # Roll back just this savepoint, then report what is really available
+        transaction.set_rollback(True)
+
+    available = dict(
+        model.objects.filter(pk__in=list(demand), **extra_filter).values_list('pk', 'stock_quantity')
+    )
+    return [
+        (name, quantity, available.get(pk, 0))
+        for pk, (quantity, name) in demand.items()
+        if available.get(pk, 0) < quantity
+    ]
+
+
+def reserve_stock(lines):
+    """
+    Decrement stock for every cart line or none of them.
+    Must be called inside transaction.atomic(); raises InsufficientStock
+    (after marking the transaction for rollback) on any shortfall.
+    """
+    product_demand, variant_demand = collect_stock_demand(lines)
+
+    shortfalls = _decrement(ProductVariant, variant_demand, {'is_active': True})
+    shortfalls += _decrement(Product, product_demand, {'manage_stock': True})
+
+    if shortfalls:
+        transaction.set_rollback(True)
+        raise InsufficientStock(shortfalls)
+
+    # Stock shows on cached product pages. Lists only change when something
+    # sells out (from the quantities already loaded, no extra query); other
+    # list badges catch up within PAGE_CACHE_TIMEOUT.
+    tags = {f"product:{line['product'].pk}" for line in lines}
+    if any(line['product'].stock_quantity <= product_demand[line['product'].pk][0]
+           for line in lines if line['product'].pk in product_demand):
+        tags.add('products')
+    transaction.on_commit(lambda: invalidate_tags(*tags))
@@ -1,3 +1,237 @@
-from django.test import TestCase
+import threading
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import OperationalError, connection, transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Product, ProductVariant
+from .models import Order, OrderItem, OrderNumberWorker
+from .numbering import WORKER_RETENTION, OrderNumberAllocator
+from .stock import InsufficientStock, reserve_stock
+
+CHECKOUT_DATA = {
+    'email': 'buyer@example.com',
+    'phone': '9999999999',
+    'shipping_name': 'Buyer',
+    'shipping_address_line_1': '1 Main Street',
+    'shipping_city': 'Pune',
+    'shipping_state': 'MH',
+    'shipping_postal_code': '411001',
+    'shipping_country': 'India',
+    'payment_method': 'cod',
+}
+
+
+class CheckoutStockTests(TestCase):
+    """Checkout reserves stock atomically"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ring = Product.objects.create(title='Ring', slug='ring', price=Decimal('100.00'), stock_quantity=3)
+        cls.necklace = Product.objects.create(title='Necklace', slug='necklace', price=Decimal('250.00'))
+        cls.necklace_gold = ProductVariant.objects.create(
+            product=cls.necklace, name='Metal', value='Gold', price_adjustment=Decimal('50.00'), stock_quantity=2
+        )
+
+    def add_to_cart(self, product, quantity, variant=None):
+        data = {'quantity': quantity}
+        if variant:
+            data['variant_id'] = variant.pk
+        self.client.post(reverse('catalog:cart_add', args=[product.pk]), data)
+
+    def test_checkout_decrements_stock_and_creates_items(self):
+        self.add_to_cart(self.ring, 2)
+        self.add_to_cart(self.necklace, 1, self.necklace_gold)
+
+        response = self.client.post(reverse('orders:checkout'), CHECKOUT_DATA)
+
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('orders:order_success', args=[order.order_number]))
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.subtotal, Decimal('500.00'))
+        self.ring.refresh_from_db()
+        self.necklace_gold.refresh_from_db()
+        self.assertEqual(self.ring.stock_quantity, 1)
+        self.assertEqual(self.necklace_gold.stock_quantity, 1)
+
+    def test_shortfall_rolls_back_whole_order(self):
+        self.add_to_cart(self.ring, 2)
+        self.add_to_cart(self.necklace, 2, self.necklace_gold)
+        # Someone else buys a variant between cart and checkout
+        ProductVariant.objects.filter(pk=self.necklace_gold.pk).update(stock_quantity=1)
+
+        response = self.client.post(reverse('orders:checkout'), CHECKOUT_DATA)
+
+        self.assertRedirects(response, reverse('catalog:cart_detail'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.ring.refresh_from_db()
+        self.assertEqual(self.ring.stock_quantity, 3)
+
+    def test_reserve_stock_sums_repeated_lines(self):
+        lines = [
+            {'product': self.ring, 'variant': None, 'quantity': 2},
+            {'product': self.ring, 'variant': None, 'quantity': 2},
+        ]
+        with self.assertRaises(InsufficientStock) as ctx:
+            with transaction.atomic():
+                reserve_stock(lines)
+        self.assertEqual(ctx.exception.shortfalls, [('Ring', 4, 3)])
+
+    def test_second_reservation_of_last_unit_fails(self):
+        # Two checkouts loaded the product while one unit was left; the
+        # conditional UPDATE, not the loaded stock_quantity, decides
+        last = Product.objects.create(title='Last One', slug='last-one', price=Decimal('10.00'), stock_quantity=1)
+        variant = ProductVariant.objects.create(product=self.necklace, name='Metal', value='Rose', stock_quantity=1)
+        lines = [
+            {'product': last, 'variant': None, 'quantity': 1},
+            {'product': self.necklace, 'variant': variant, 'quantity': 1},
+        ]
+        with transaction.atomic():
+            reserve_stock(lines)
+
+        with self.assertRaises(InsufficientStock) as ctx:
+            with transaction.atomic():
+                reserve_stock(lines)
+        self.assertEqual(ctx.exception.shortfalls, [('Necklace (Metal: Rose)', 1, 0), ('Last One', 1, 0)])
+        last.refresh_from_db()
+        variant.refresh_from_db()
+        self.assertEqual((last.stock_quantity, variant.stock_quantity), (0, 0))
+
+
+@unittest.skipIf(connection.vendor == 'sqlite', "SQLite test databases serialize writers; run on PostgreSQL/MySQL")
+class ConcurrentCheckoutStressTests(TransactionTestCase):
+    """Many threads race to buy the last units; stock must never go negative"""
+
+    workers = 20
+    stock = 5
+
+    def test_concurrent_reservations_never_oversell(self):
+        product = Product.objects.create(title='Limited', slug='limited', price=Decimal('10.00'), stock_quantity=self.stock)
+        results = []
+        barrier = threading.Barrier(self.workers)
+
+        def buy():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    reserve_stock([{'product': product, 'variant': None, 'quantity': 1}])
+                results.append(True)
+            except InsufficientStock:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(product.stock_quantity, 0)
+
+
+class OrderCreationQueryTests(TestCase):
+    """Order creation costs a constant number of queries regardless of cart size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(title=f'Item {i}', slug=f'item-{i}', price=Decimal('10.00'), stock_quantity=50)
+            for i in range(10)
+        ]
+
+    def checkout_query_count(self, line_count):
+        client = Client()
+        for product in self.products[:line_count]:
+            client.post(reverse('catalog:cart_add', args=[product.pk]), {'quantity': 1})
+        Order.objects.all().delete()
+        with CaptureQueriesContext(connection) as ctx:
+            client.post(reverse('orders:checkout'), CHECKOUT_DATA)
+        return len(ctx.captured_queries)
+
+    def test_checkout_query_count_is_constant(self):
+        self.assertEqual(self.checkout_query_count(1), self.checkout_query_count(10))
+
+        order = Order.objects.get()
+        self.assertEqual(order.items.count(), 10)
+        self.assertEqual(order.subtotal, Decimal('100.00'))
+        self.assertEqual(order.total_amount, Decimal('118.00'))
+
+
+class OrderNumberTests(TestCase):
+    """Order numbers are unique and ordered even within the same second"""
+
+    def test_orders_created_in_same_second_get_distinct_numbers(self):
+        orders = [
+            Order.objects.create(
+                email='a@example.com', phone='1', shipping_name='A', shipping_address_line_1='x',
+                shipping_city='c', shipping_state='s', shipping_postal_code='1'
+            )
+            for _ in range(50)
+        ]
+        numbers = [order.order_number for order in orders]
+        self.assertEqual(len(set(numbers)), 50)
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertTrue(all(number.startswith('ORD-') for number in numbers))
+
+
+class OrderNumberWorkerTests(TransactionTestCase):
+    """Worker ids survive a rollback of the transaction that claimed them"""
+
+    def setUp(self):
+        self.allocator = OrderNumberAllocator()
+
+    def claim_and_roll_back(self, write_first=True):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            if write_first:
+                Product.objects.create(title='Ring', slug='ring', price=Decimal('10.00'))
+            worker_id = self.allocator.ensure_worker()
+            raise RuntimeError
+        return worker_id
+
+    def test_claim_commits_independently(self):
+        worker_id = self.claim_and_roll_back(write_first=False)
+        self.assertTrue(OrderNumberWorker.objects.filter(pk=worker_id).exists())
+        self.assertEqual(self.allocator.ensure_worker(), worker_id)
+
+    def test_claim_inside_rolled_back_transaction(self):
+        self.claim_and_roll_back()
+        # Either the claim committed on its own or a fresh id is claimed now
+        worker_id = self.allocator.ensure_worker()
+        self.assertTrue(OrderNumberWorker.objects.filter(pk=worker_id).exists())
+        self.assertEqual(self.allocator.ensure_worker(), worker_id)
+
+    def test_fallback_claim_dropped_on_rollback(self):
+        with mock.patch.object(self.allocator, '_insert_worker_in_own_connection', side_effect=OperationalError):
+            self.claim_and_roll_back()
+        self.assertFalse(OrderNumberWorker.objects.exists())
+
+        # The rolled-back id is not used; a committed one is claimed instead
+        worker_id = self.allocator.ensure_worker()
+        self.assertEqual(list(OrderNumberWorker.objects.values_list('pk', flat=True)), [worker_id])
+
+    def test_fallback_claim_kept_on_commit(self):
+        with mock.patch.object(self.allocator, '_insert_worker_in_own_connection', side_effect=OperationalError):
+            with transaction.atomic():
+                worker_id = self.allocator.ensure_worker()
+        self.assertEqual(self.allocator.ensure_worker(), worker_id)
+
+    def test_claim_prunes_old_rows(self):
+        old = [OrderNumberWorker.objects.create(hostname='gone', pid=i) for i in range(3)]
+        recent = OrderNumberWorker.objects.create(hostname='web', pid=99)
+        OrderNumberWorker.objects.filter(pk__in=[w.pk for w in old]).update(
+            created_at=timezone.now() - WORKER_RETENTION - timedelta(days=1)
+        )
+
+        worker_id = self.allocator.ensure_worker()
+        self.assertEqual(set(OrderNumberWorker.objects.values_list('pk', flat=True)), {recent.pk, worker_id})
 
-# Create your tests here.
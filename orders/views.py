@@ -3,15 +3,19 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseRedirect
 from django.urls import reverse
+from django.db import transaction
 from .models import Order, OrderItem
 from .forms import OrderForm
+from .stock import reserve_stock, InsufficientStock
+from .numbering import next_order_number
 from catalog.cart import Cart
 from catalog.models import Product
+from core.pagination import CursorPaginator
 
 
 def checkout(request):
     """Checkout view to place an order"""
-    cart = Cart(request)
+    cart = Cart.for_request(request)
     
     if len(cart) == 0:
         messages.warning(request, 'Your cart is empty.')
@@ -20,44 +24,42 @@ def checkout(request):
     if request.method == 'POST':
         form = OrderForm(request.POST)
         if form.is_valid():
-            # Create order
-            order = form.save(commit=False)
-            if request.user.is_authenticated:
-                order.user = request.user
-            order.save()
-            
-            # Create order items and reduce stock
-            for item in cart:
-                # Create order item with variant support
-                variant = item.get('variant')
-                order_item = OrderItem.objects.create(
-                    order=order,
-                    product=item['product'],
-                    product_variant=variant,
-                    product_name=item['product'].title,
-                    product_sku=getattr(item['product'], 'sku', '') or '',
-                    variant_name=variant.name if variant else None,
-                    variant_value=variant.value if variant else None,
-                    quantity=item['quantity'],
-                    unit_price=item['price']
-                )
+            lines = list(cart)
+            # Claimed outside the transaction so a rollback can't release it
+            order_number = next_order_number()
+            try:
+                # Reserve stock and create the order atomically: a shortfall
+                # on any line rolls back everything
+                with transaction.atomic():
+                    reserve_stock(lines)
 
-                # Reduce stock quantities
-                if item.get('variant'):
-                    # Reduce variant stock if variant was selected
-                    variant = item['variant']
-                    if not variant.reduce_stock(item['quantity']):
-                        # This shouldn't happen due to cart validation, but handle gracefully
-                        messages.warning(request, f"Insufficient stock for {item['product'].title} ({variant.name}: {variant.value})")
-                else:
-                    # Reduce main product stock if no variant
-                    product = item['product']
-                    if product.manage_stock:
-                        if not product.reduce_stock(item['quantity']):
-                            messages.warning(request, f"Insufficient stock for {item['product'].title}")
-            
-            # Calculate totals
-            order.calculate_total()
+                    # Totals come from the already-loaded cart lines, so the
+                    # order row is written exactly once
+                    order = form.save(commit=False)
+                    order.order_number = order_number
+                    if request.user.is_authenticated:
+                        order.user = request.user
+                    order.set_totals(sum(item['total_price'] for item in lines))
+                    order.save()
+
+                    OrderItem.objects.bulk_create([
+                        OrderItem(
+                            order=order,
+                            product=item['product'],
+                            product_variant=item.get('variant'),
+                            product_name=item['product'].title,
+                            product_sku=getattr(item['product'], 'sku', '') or '',
+                            variant_name=item['variant'].name if item.get('variant') else None,
+                            variant_value=item['variant'].value if item.get('variant') else None,
+                            quantity=item['quantity'],
+                            unit_price=item['price']
+                        )
+                        for item in lines
+                    ])
+            except InsufficientStock as e:
+                for name, requested, available in e.shortfalls:
+                    messages.error(request, f"Sorry, only {available} of {name} left in stock (you requested {requested}).")
+                return redirect('catalog:cart_detail')
             
             # Clear cart
             cart.clear()
@@ -84,9 +86,7 @@ def checkout(request):
             
             # Pre-fill address from user's default shipping address
             try:
-                default_address = request.user.addresses.filter(
-                    type='shipping', is_default=True
-                ).first()
+                default_address = default_shipping_address(request.user).first()
                 if default_address:
                     form.fields['shipping_name'].initial = default_address.name
                     form.fields['shipping_address_line_1'].initial = default_address.street
@@ -112,10 +112,22 @@ def order_success(request, order_number):
     })
 
 
+def order_history_paginator(user):
+    """Keyset paginator over a user's orders, newest first (10 per page)"""
+    orders = Order.objects.filter(user=user).prefetch_related('items')
+    return CursorPaginator(orders, 10, ('-created_at', '-id'))
+
+
+def default_shipping_address(user):
+    """The user's default shipping address (checkout pre-fill)"""
+    return user.addresses.filter(type='shipping', is_default=True)
+
+
 @login_required
 def order_history(request):
     """User's order history"""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    paginator = order_history_paginator(request.user)
+    orders = paginator.get_page(cursor=request.GET.get('cursor'), page_number=request.GET.get('page'))
     return render(request, 'orders/order_history.html', {
         'orders': orders,
     })
@@ -58,78 +58,51 @@ class VersionCheckAdmin(admin.ModelAdmin):
     
     def changelist_view(self, request, extra_context=None):
         """Add check updates button to the changelist"""
-        # Handle install update request
+        from .git_checker import git_checker
+        from .tasks import schedule_update_check
+        from django.contrib import messages
+
+        # The only VersionCheck this page needs; checks are written by the task worker
+        latest_check = VersionCheck.objects.first()
+        update_ready = latest_check and latest_check.check_successful and latest_check.update_available
+
+        # Installing and checking both run git fetch: queue them for the task
+        # worker (manage.py run_tasks) instead of blocking this page
         if request.GET.get('install_update'):
-            from .git_checker import git_checker
-            from django.contrib import messages
-            
-            # Get the latest version to install
-            latest_check = VersionCheck.objects.filter(check_successful=True, update_available=True).first()
-            if latest_check:
-                result = git_checker.install_update(latest_check.latest_version)
-                
-                if result['success']:
-                    messages.success(request, 
-                        f"🎉 Successfully updated to version {result['new_version']}! "
-                        f"Please restart the server to apply changes.")
-                else:
-                    messages.error(request, f"❌ Update failed: {result.get('error', 'Unknown error')}")
+            from .tasks import install_update
+
+            if update_ready:
+                install_update.enqueue(args=[latest_check.latest_version], unique_key='updates:install')
+                messages.success(request,
+                    f"🚀 Installing version {latest_check.latest_version} in the background. "
+                    f"Restart the server once it has finished to apply changes.")
             else:
                 messages.error(request, "❌ No available update found to install.")
-        
+
         # Handle check updates request
         elif request.GET.get('check_updates'):
-            from .git_checker import git_checker
-            from .models import UpdateSettings
-            
-            # Get settings
-            settings = UpdateSettings.get_settings()
-            
-            # Check for updates
-            result = git_checker.check_for_updates(
-                include_prereleases=settings.include_prereleases
-            )
-            
-            # Log the check
-            VersionCheck.objects.create(
-                current_version=result['current_version'],
-                latest_version=result.get('latest_version', ''),
-                update_available=result.get('update_available', False),
-                check_successful=result['success'],
-                error_message=result.get('error', ''),
-            )
-            
-            # Add message to show results
-            from django.contrib import messages
-            if result['success']:
-                if result.get('update_available'):
-                    messages.success(request, 
-                        f"🆙 Update available: {result['latest_version']}! "
-                        f"Current: {result['current_version']} "
-                        f"{'(Pre-release)' if result.get('prerelease') else ''}")
-                else:
-                    messages.success(request, 
-                        f"✅ You are running the latest version! Current: {result['current_version']}")
-            else:
-                messages.error(request, f"❌ Error checking updates: {result.get('error')}")
-        
+            from .tasks import check_for_updates
+
+            check_for_updates.enqueue(unique_key='updates:check')
+            messages.info(request, "🔍 Checking for updates in the background; the result will appear here shortly.")
+
+        # Keep automatic checks on the check_frequency schedule
+        schedule_update_check(latest_check)
+
         # Add button and current version to extra context
         extra_context = extra_context or {}
         check_url = request.path + '?check_updates=1'
         extra_context['check_updates_url'] = check_url
-        
-        # Get current version to display
-        from .git_checker import git_checker
-        current_version = git_checker.get_current_version()
-        extra_context['current_version'] = current_version
-        
+
+        # Current version to display (memoized until HEAD moves, no git call per page)
+        extra_context['current_version'] = git_checker.get_current_version()
+
         # Check if update is available and add install button
-        latest_check = VersionCheck.objects.filter(check_successful=True).first()
-        if latest_check and latest_check.update_available:
+        if update_ready:
             install_url = request.path + '?install_update=1'
             extra_context['install_update_url'] = install_url
             extra_context['latest_version'] = latest_check.latest_version
-        
+
         return super().changelist_view(request, extra_context)
 
 
@@ -1,8 +1,17 @@
 """
 Git-based version checker for the CMS
 Checks Git tags from remote repository to determine if updates are available
+
+The current version is memoized per process and only recomputed when HEAD
+moves (checkout, pull, install_update), which is detected by reading
+.git/HEAD and the ref it points to rather than running git. Remote tag
+metadata comes from one `git for-each-ref` call, whatever the number of
+tags. The remote check itself (git fetch) runs in the task worker, see
+updates.tasks.
 """
+import os
 import subprocess
+import threading
 import requests
 import json
 import re
@@ -24,6 +33,9 @@ class GitVersionChecker:
         self.api_base = "https://api.github.com"
         self.cache_timeout = 300  # 5 minutes
         self._ssl_configured = False
+        self._git_dir = None
+        self._version_memo = None  # (HEAD signature, version)
+        self._lock = threading.Lock()
 
     def _configure_git_ssl(self):
         """Configure Git SSL settings for Windows"""
@@ -77,12 +89,55 @@ class GitVersionChecker:
                     self.stderr = str(error)
             return FailedResult(e)
     
+    def _get_git_dir(self):
+        """Absolute .git directory (one git call per process), or '' outside a repository"""
+        if self._git_dir is None:
+            result = self._run_git_command(['git', 'rev-parse', '--absolute-git-dir'], retry_on_ssl_error=False)
+            self._git_dir = result.stdout.strip() if result.returncode == 0 else ''
+        return self._git_dir
+
+    def _head_signature(self):
+        """Cheap fingerprint of HEAD (the ref it names, the commit it resolves to) and of the local tags"""
+        signature = []
+        git_dir = self._get_git_dir()
+        if git_dir:
+            try:
+                with open(os.path.join(git_dir, 'HEAD')) as f:
+                    head = f.read().strip()
+                signature.append(head)
+                if head.startswith('ref: '):
+                    ref_path = os.path.join(git_dir, head[5:])
+                    if os.path.exists(ref_path):
+                        with open(ref_path) as f:
+                            signature.append(f.read().strip())
+                    else:
+                        # Packed ref: any change to packed-refs may have moved it
+                        signature.append(os.stat(os.path.join(git_dir, 'packed-refs')).st_mtime_ns)
+                # A new tag on HEAD changes `git describe` without moving HEAD
+                signature.append(os.stat(os.path.join(git_dir, 'refs', 'tags')).st_mtime_ns)
+            except OSError:
+                pass
+        version_file = settings.BASE_DIR / 'version.json'
+        if version_file.exists():
+            signature.append(version_file.stat().st_mtime_ns)
+        return tuple(signature)
+
     def get_current_version(self):
-        """Get current version from Git tag or version file"""
+        """Get current version from Git tag or version file (memoized until HEAD changes)"""
+        signature = self._head_signature()
+        memo = self._version_memo
+        if memo and memo[0] == signature:
+            return memo[1]
+        with self._lock:
+            current = self._read_current_version()
+            self._version_memo = (signature, current)
+        return current
+
+    def _read_current_version(self):
         try:
-            # Try to get version from git tag first
+            # The nearest tag: the one on HEAD if there is one, else the latest before it
             result = self._run_git_command(
-                ['git', 'describe', '--tags', '--exact-match', 'HEAD']
+                ['git', 'describe', '--tags', '--abbrev=0', 'HEAD']
             )
 
             if result.returncode == 0:
@@ -90,15 +145,6 @@ class GitVersionChecker:
                 tag = result.stdout.strip()
                 return tag.lstrip('v')
 
-            # If no exact tag, get latest tag
-            result = self._run_git_command(
-                ['git', 'describe', '--tags', '--abbrev=0']
-            )
-
-            if result.returncode == 0:
-                tag = result.stdout.strip()
-                return tag.lstrip('v')
-            
             # Fallback to version file or default
             version_file = settings.BASE_DIR / 'version.json'
             if version_file.exists():
@@ -108,13 +154,13 @@ class GitVersionChecker:
                         return data.get('version', '1.0.0')
                 except:
                     pass
-            
+
             return '1.0.0'  # Default version
-            
+
         except Exception as e:
             logger.error(f"Error getting current version: {e}")
             return '1.0.0'
-    
+
     def get_remote_tags(self, include_prereleases=False):
         """Get version tags from remote Git repository"""
         try:
@@ -129,35 +175,44 @@ class GitVersionChecker:
                 logger.error(f"Failed to fetch tags: {result.stderr}")
                 return []
 
-            # Get all tags sorted by version
-            result = self._run_git_command(['git', 'tag', '-l', '--sort=-version:refname'])
+            # Every tag with its commit metadata in one call. Annotated tags
+            # carry the commit fields under *field (the peeled object).
+            fields = [
+                'refname:strip=2', 'objectname', '*objectname', 'committerdate:iso', '*committerdate:iso',
+                'contents:subject', '*contents:subject',
+            ]
+            result = self._run_git_command([
+                'git', 'for-each-ref', 'refs/tags', '--sort=-version:refname',
+                '--format=' + '%00'.join(f'%({field})' for field in fields),
+            ])
             if result.returncode != 0:
                 logger.error(f"Failed to list tags: {result.stderr}")
                 return []
 
             tags = []
-            for tag_line in result.stdout.strip().split('\n'):
-                tag = tag_line.strip()
+            for line in result.stdout.splitlines():
+                parts = line.split('\0')
+                if len(parts) != len(fields):
+                    continue
+                tag, object_hash, commit_hash, date, commit_date, subject, commit_subject = parts
+                tag = tag.strip()
                 if not tag:
                     continue
 
                 # Filter version tags (should start with 'v' or be numeric)
                 if tag.startswith('v') or tag.replace('.', '').isdigit():
+                    prerelease = 'alpha' in tag.lower() or 'beta' in tag.lower() or 'rc' in tag.lower()
                     # Skip prerelease tags if not requested
-                    if not include_prereleases and ('alpha' in tag.lower() or 'beta' in tag.lower() or 'rc' in tag.lower()):
+                    if not include_prereleases and prerelease:
                         continue
 
-                    # Get commit info for this tag
-                    commit_result = self._run_git_command(['git', 'show', '-s', '--format=%H|%ci|%s', tag])
-                    commit_info = commit_result.stdout.strip().split('|') if commit_result.returncode == 0 else ['', '', '']
-
                     tags.append({
                         'tag_name': tag,
                         'name': f'Release {tag}',
-                        'commit_hash': commit_info[0] if len(commit_info) > 0 else '',
-                        'published_at': commit_info[1] if len(commit_info) > 1 else '',
-                        'body': commit_info[2] if len(commit_info) > 2 else f'Release {tag}',
-                        'prerelease': 'alpha' in tag.lower() or 'beta' in tag.lower() or 'rc' in tag.lower(),
+                        'commit_hash': commit_hash or object_hash,
+                        'published_at': commit_date or date,
+                        'body': (commit_subject or subject) or f'Release {tag}',
+                        'prerelease': prerelease,
                         'html_url': f"https://github.com/{self.repo_owner}/{self.repo_name}/releases/tag/{tag}"
                     })
 
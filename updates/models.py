@@ -1,5 +1,6 @@
 from django.db import models
 from django.utils import timezone
+from core.singletons import CachedSingletonMixin
 
 
 class VersionCheck(models.Model):
@@ -22,7 +23,7 @@ class VersionCheck(models.Model):
         return f"{self.check_date.strftime('%Y-%m-%d %H:%M')} - {self.current_version} - {update_status} - {status}"
 
 
-class UpdateSettings(models.Model):
+class UpdateSettings(CachedSingletonMixin, models.Model):
     """Singleton model for update settings"""
     auto_check_enabled = models.BooleanField(default=True, help_text="Automatically check for updates")
     check_frequency = models.CharField(
@@ -52,18 +53,5 @@ class UpdateSettings(models.Model):
             return existing
         return super().save(*args, **kwargs)
     
-    @classmethod
-    def get_settings(cls):
-        """Get or create settings instance"""
-        settings, created = cls.objects.get_or_create(
-            pk=1,
-            defaults={
-                'auto_check_enabled': True,
-                'check_frequency': 'weekly',
-                'include_prereleases': False,
-            }
-        )
-        return settings
-    
     def __str__(self):
         return f"Update Settings - Auto: {self.auto_check_enabled} - Frequency: {self.check_frequency}"
@@ -45,30 +45,7 @@ function checkForUpdates() {
         credentials: 'same-origin'
     })
     .then(response => response.json())
-    .then(data => {
-        button.textContent = originalText;
-        button.disabled = false;
-        
-        if (data.success) {
-            if (data.update_available) {
-                showMessage(
-                    `✅ Update available: ${data.latest_version}!\n` +
-                    `Current: ${data.current_version}\n` +
-                    `${data.prerelease ? '(Pre-release)' : ''}`,
-                    'success'
-                );
-                setTimeout(() => window.location.reload(), 3000);
-            } else {
-                showMessage(
-                    `✅ You are running the latest version!\n` +
-                    `Current: ${data.current_version}`,
-                    'success'
-                );
-            }
-        } else {
-            showMessage(`❌ Error: ${data.error}`, 'error');
-        }
-    })
+    .then(data => showCheckResult(data, button, originalText, 0))
     .catch(error => {
         button.textContent = originalText;
         button.disabled = false;
@@ -76,6 +53,65 @@ function checkForUpdates() {
     });
 }
 
+// The check runs on the task worker: poll its status until it has a result
+const POLL_INTERVAL = 2000;
+const MAX_POLLS = 30;
+
+function showCheckResult(data, button, originalText, polls) {
+    if (data.queued) {
+        if (polls >= MAX_POLLS) {
+            button.textContent = originalText;
+            button.disabled = false;
+            showMessage(
+                '⏳ The check is still queued. The result will appear here once the ' +
+                'task worker (manage.py run_tasks) has run it.',
+                'info'
+            );
+            return;
+        }
+        showMessage(
+            data.status === 'running' ? 'Checking GitHub for updates...' : '⏳ Check queued, waiting for the task worker...',
+            'info'
+        );
+        setTimeout(() => {
+            fetch(data.status_url, {
+                headers: {'X-Requested-With': 'XMLHttpRequest'},
+                credentials: 'same-origin'
+            })
+            .then(response => response.json())
+            .then(next => showCheckResult(next, button, originalText, polls + 1))
+            .catch(error => {
+                button.textContent = originalText;
+                button.disabled = false;
+                showMessage('❌ Network error checking for updates', 'error');
+            });
+        }, POLL_INTERVAL);
+        return;
+    }
+
+    button.textContent = originalText;
+    button.disabled = false;
+
+    if (data.success) {
+        if (data.update_available) {
+            showMessage(
+                `✅ Update available: ${data.latest_version}!\n` +
+                `Current: ${data.current_version}`,
+                'success'
+            );
+            setTimeout(() => window.location.reload(), 3000);
+        } else {
+            showMessage(
+                `✅ You are running the latest version!\n` +
+                `Current: ${data.current_version}`,
+                'success'
+            );
+        }
+    } else {
+        showMessage(`❌ Error: ${data.error}`, 'error');
+    }
+}
+
 function showMessage(message, type) {
     console.log('showMessage called:', message, type);
     
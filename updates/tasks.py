@@ -0,0 +1,89 @@
+"""
+Background update checks and installs (run by `manage.py run_tasks`)
+
+Automatic checks follow UpdateSettings.check_frequency: each one queues
+the next for when its result goes stale, and schedule_update_check()
+(called from the admin) starts the chain or pulls it forward after the
+frequency was shortened. The admin only ever reads the latest VersionCheck.
+"""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.models import Task
+from core.task_queue import task
+
+from .git_checker import git_checker
+from .models import UpdateSettings, VersionCheck
+
+CHECK_INTERVALS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+    'monthly': timedelta(days=30),
+}
+SCHEDULED_CHECK_KEY = 'updates:scheduled-check'
+
+
+@task
+def check_for_updates():
+    """Fetch remote tags and record the outcome as a VersionCheck"""
+    settings = UpdateSettings.get_settings()
+    result = git_checker.check_for_updates(include_prereleases=settings.include_prereleases)
+    return VersionCheck.objects.create(
+        current_version=result['current_version'],
+        latest_version=result.get('latest_version', ''),
+        update_available=result.get('update_available', False),
+        check_successful=result['success'],
+        error_message=result.get('error', ''),
+    )
+
+
+@task(max_attempts=1)
+def install_update(target_version):
+    """Check out target_version; the error ends up on the failed Task"""
+    result = git_checker.install_update(target_version)
+    if not result['success']:
+        raise RuntimeError(result.get('error', 'Unknown error'))
+    # Refresh the "update available" state shown in the admin
+    check_for_updates.enqueue(unique_key='updates:check')
+
+
+def _next_check_due(update_settings, latest):
+    interval = CHECK_INTERVALS.get(update_settings.check_frequency, CHECK_INTERVALS['weekly'])
+    return latest.check_date + interval if latest else timezone.now()
+
+
+@task
+def scheduled_update_check():
+    """Automatic check (skipped if a manual one ran since it was queued); queues the next one"""
+    update_settings = UpdateSettings.get_settings()
+    if not update_settings.auto_check_enabled:
+        return
+    latest = VersionCheck.objects.first()
+    if _next_check_due(update_settings, latest) <= timezone.now():
+        latest = check_for_updates()
+    schedule_update_check(latest)
+
+
+def schedule_update_check(latest=False):
+    """
+    Make sure the next automatic check is queued for when the latest result
+    goes stale. Pass the latest VersionCheck (or None) if already loaded.
+    """
+    update_settings = UpdateSettings.get_settings()
+    if not update_settings.auto_check_enabled:
+        return None
+    if latest is False:
+        latest = VersionCheck.objects.only('check_date').first()
+    due = _next_check_due(update_settings, latest)
+
+    pending = Task.objects.filter(status=Task.PENDING, unique_key=SCHEDULED_CHECK_KEY).first()
+    if pending:
+        # Pulled forward when check_frequency was shortened
+        if pending.run_at > due:
+            pending.run_at = due
+            pending.save(update_fields=['run_at'])
+        return pending
+    delay = max((due - timezone.now()).total_seconds(), 0)
+    return scheduled_update_check.enqueue(delay=delay, unique_key=SCHEDULED_CHECK_KEY)
@@ -1,3 +1,161 @@
-from django.test import TestCase
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Task
+from core.task_queue import run_pending
+from users.models import User
+
+from .git_checker import GitVersionChecker
+from .models import UpdateSettings, VersionCheck
+from .tasks import SCHEDULED_CHECK_KEY, schedule_update_check
+
+
+def git(cwd, *args):
+    subprocess.run(
+        ['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', *args],
+        cwd=cwd, check=True, capture_output=True,
+    )
+
+
+class GitVersionCheckerTests(TestCase):
+    """Tag metadata in one git call; the current version only re-read when HEAD moves"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = Path(tempfile.mkdtemp())
+        origin = cls.tmp / 'origin'
+        origin.mkdir()
+        git(origin, 'init', '-q')
+        for number, tag in enumerate(['v1.0.0', 'v1.1.0', 'v1.2.0-beta', 'v2.0.0'], 1):
+            (origin / 'file.txt').write_text(tag)
+            git(origin, 'add', 'file.txt')
+            git(origin, 'commit', '-q', '-m', f'Release {number}')
+            if number % 2:
+                git(origin, 'tag', tag)
+            else:
+                git(origin, 'tag', '-a', tag, '-m', f'Annotated {tag}')
+        git(cls.tmp, 'clone', '-q', str(origin), 'clone')
+        cls.repo = cls.tmp / 'clone'
+        git(cls.repo, 'checkout', '-q', 'v1.1.0')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        override = override_settings(BASE_DIR=self.repo)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.checker = GitVersionChecker()
+
+    def count_git_calls(self):
+        return mock.patch('updates.git_checker.subprocess.run', wraps=subprocess.run)
+
+    def test_remote_tags_in_one_listing_call(self):
+        with self.count_git_calls() as run:
+            tags = self.checker.get_remote_tags(include_prereleases=True)
+        commands = [call.args[0][1] for call in run.call_args_list]
+        self.assertEqual(commands, ['fetch', 'for-each-ref'])
+
+        self.assertEqual([tag['tag_name'] for tag in tags], ['v2.0.0', 'v1.2.0-beta', 'v1.1.0', 'v1.0.0'])
+        # Annotated tags report their commit, not the tag object
+        self.assertEqual(tags[0]['body'], 'Release 4')
+        self.assertEqual(len(tags[0]['commit_hash']), 40)
+        self.assertTrue(tags[2]['published_at'])
+        self.assertTrue(tags[1]['prerelease'])
+        self.assertEqual(self.checker.get_latest_version()['version'], '2.0.0')
+
+    def test_current_version_memoized_until_head_moves(self):
+        self.assertEqual(self.checker.get_current_version(), '1.1.0')
+        with self.count_git_calls() as run:
+            self.assertEqual(self.checker.get_current_version(), '1.1.0')
+        run.assert_not_called()
+
+        git(self.repo, 'checkout', '-q', 'v2.0.0')
+        self.addCleanup(git, self.repo, 'checkout', '-q', 'v1.1.0')
+        self.assertEqual(self.checker.get_current_version(), '2.0.0')
+
+
+class UpdateScheduleTests(TestCase):
+    """Automatic checks are queued on the check_frequency schedule"""
+
+    def setUp(self):
+        # Settings rows are memoized; start each test from the database row
+        cache.clear()
+        self.settings = UpdateSettings.get_settings()
+
+    def test_first_check_due_now_then_after_interval(self):
+        job = schedule_update_check()
+        self.assertEqual(job.name, 'updates.tasks.scheduled_update_check')
+        self.assertLessEqual(job.run_at, timezone.now())
+        self.assertEqual(schedule_update_check(), job)
+
+        Task.objects.all().delete()
+        VersionCheck.objects.create(current_version='1.0.0')
+        job = schedule_update_check()
+        self.assertGreater(job.run_at, timezone.now() + timedelta(days=6))
+
+    def test_shorter_frequency_pulls_pending_check_forward(self):
+        VersionCheck.objects.create(current_version='1.0.0')
+        job = schedule_update_check()
+        self.settings.check_frequency = 'daily'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.settings.save()
+        schedule_update_check()
+        job.refresh_from_db()
+        self.assertLess(job.run_at, timezone.now() + timedelta(days=2))
+        self.assertEqual(Task.objects.filter(unique_key=SCHEDULED_CHECK_KEY).count(), 1)
+
+    def test_admin_queues_checks_instead_of_fetching(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_login(admin)
+        with mock.patch('updates.git_checker.GitVersionChecker.get_remote_tags') as remote:
+            response = self.client.get('/admin/updates/versioncheck/', {'check_updates': 1}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        remote.assert_not_called()
+        self.assertEqual(
+            sorted(Task.objects.values_list('name', flat=True)),
+            ['updates.tasks.check_for_updates', 'updates.tasks.scheduled_update_check'],
+        )
+
+
+class CheckUpdatesAjaxTests(TestCase):
+    """The check button reports a queued check until its own result exists"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass12345'))
+
+    def test_queued_until_the_task_has_run(self):
+        # An earlier result must not be shown as the answer to this check
+        VersionCheck.objects.create(current_version='0.9.0', check_date=timezone.now() - timedelta(days=1))
+        data = self.client.post(reverse('updates:ajax_check')).json()
+        self.assertEqual((data['success'], data['queued']), (False, True))
+        self.assertNotIn('current_version', data)
+
+        status_url = data['status_url']
+        self.assertEqual(self.client.get(status_url).json()['queued'], True)
+
+        result = {'success': True, 'current_version': '1.0.0', 'latest_version': '1.1.0', 'update_available': True}
+        with mock.patch('updates.git_checker.GitVersionChecker.check_for_updates', return_value=result):
+            run_pending()
+        data = self.client.get(status_url).json()
+        self.assertEqual(data['queued'], False)
+        self.assertEqual((data['success'], data['current_version'], data['latest_version']), (True, '1.0.0', '1.1.0'))
+
+    def test_failed_task_reports_its_error(self):
+        task = Task.objects.get(pk=self.client.post(reverse('updates:ajax_check')).json()['task_id'])
+        Task.objects.filter(pk=task.pk).update(status=Task.FAILED, last_error='Traceback ...\nOSError: git not found\n')
+        data = self.client.get(reverse('updates:ajax_check_status', args=[task.pk])).json()
+        self.assertEqual((data['success'], data['queued'], data['error']), (False, False, 'OSError: git not found'))
@@ -5,4 +5,5 @@ app_name = 'updates'
 
 urlpatterns = [
     path('ajax/check/', views.check_updates_ajax, name='ajax_check'),
-]
\ No newline at end of file
+    path('ajax/check/<int:task_id>/', views.check_updates_status, name='ajax_check_status'),
+]
@@ -1,42 +1,55 @@
-from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.utils import timezone
-from .models import VersionCheck, UpdateSettings
-from .git_checker import git_checker
-import json
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+
+from core.models import Task
+from .models import VersionCheck
+from .tasks import check_for_updates
+
+
+def _check_result(task):
+    """
+    Outcome of a queued check: queued until its task has finished, then the
+    VersionCheck it recorded (never one from before the task was queued)
+    """
+    data = {
+        'task_id': task.pk,
+        'status_url': reverse('updates:ajax_check_status', args=[task.pk]),
+        'queued': task.status in (Task.PENDING, Task.RUNNING),
+    }
+    if data['queued']:
+        return dict(data, success=False, status=task.status)
+    if task.status == Task.FAILED:
+        # Last line of the traceback: the exception message
+        error = task.last_error.strip().splitlines()[-1] if task.last_error.strip() else 'Check failed'
+        return dict(data, success=False, error=error)
+
+    latest = VersionCheck.objects.filter(check_date__gte=task.created_at).first()
+    if latest is None:
+        return dict(data, success=False, error='No result recorded for this check')
+    return dict(
+        data,
+        success=latest.check_successful,
+        current_version=latest.current_version,
+        latest_version=latest.latest_version,
+        update_available=latest.update_available,
+        error=latest.error_message,
+    )
 
 
 @staff_member_required
 @require_POST
 def check_updates_ajax(request):
-    """AJAX endpoint for checking updates"""
-    try:
-        # Get settings
-        settings = UpdateSettings.get_settings()
-        
-        # Check for updates
-        result = git_checker.check_for_updates(
-            include_prereleases=settings.include_prereleases
-        )
-        
-        # Log the check
-        check_log = VersionCheck.objects.create(
-            current_version=result['current_version'],
-            latest_version=result.get('latest_version', ''),
-            update_available=result.get('update_available', False),
-            check_successful=result['success'],
-            error_message=result.get('error', ''),
-        )
-        
-        return JsonResponse(result)
-        
-    except Exception as e:
-        return JsonResponse({
-            'success': False,
-            'error': str(e),
-            'current_version': git_checker.get_current_version(),
-            'latest_version': git_checker.get_current_version(),
-            'update_available': False,
-        })
+    """AJAX endpoint for checking updates: queues a check for the task worker"""
+    task = check_for_updates.enqueue(unique_key='updates:check')
+    task.refresh_from_db()  # already finished with TASK_RUN_INLINE
+    return JsonResponse(_check_result(task))
+
+
+@staff_member_required
+@require_GET
+def check_updates_status(request, task_id):
+    """AJAX endpoint polled until a queued check has a result"""
+    return JsonResponse(_check_result(get_object_or_404(Task, pk=task_id, name=check_for_updates.task_name)))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-16 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_useraddress_userprofile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useraddress',
+            index=models.Index(fields=['user', 'type', 'is_default'], name='users_address_default_idx'),
+        ),
+    ]
@@ -34,6 +34,10 @@ class UserAddress(models.Model):
 
     class Meta:
         ordering = ['-is_default', '-created_at']
+        indexes = [
+            # Default address lookup at checkout
+            models.Index(fields=['user', 'type', 'is_default'], name='users_address_default_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.type.title()} Address"
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-16 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishlist', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wishlistitem',
+            index=models.Index(fields=['wishlist', 'is_active', 'added_at', 'id'], name='wishlist_item_active_idx'),
+        ),
+    ]
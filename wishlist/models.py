@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from catalog.models import Product
+from core.singletons import CachedSingletonMixin
 
 
 class Wishlist(models.Model):
@@ -52,7 +53,7 @@ class Wishlist(models.Model):
 
     def get_active_items(self):
         """Get all active wishlist items"""
-        return self.items.filter(is_active=True).select_related('product')
+        return self.items.filter(is_active=True).select_related('product__category')
 
 
 class WishlistItem(models.Model):
@@ -65,6 +66,10 @@ class WishlistItem(models.Model):
     class Meta:
         unique_together = ['wishlist', 'product']
         ordering = ['-added_at']
+        indexes = [
+            # Wishlist count in the site context and wishlist pages (keyset on added_at, id)
+            models.Index(fields=['wishlist', 'is_active', 'added_at', 'id'], name='wishlist_item_active_idx'),
+        ]
         verbose_name = "Wishlist Item"
         verbose_name_plural = "Wishlist Items"
 
@@ -72,7 +77,7 @@ class WishlistItem(models.Model):
         return f"{self.wishlist.user.username} - {self.product.title}"
 
 
-class WishlistSettings(models.Model):
+class WishlistSettings(CachedSingletonMixin, models.Model):
     """Settings for wishlist functionality"""
     enable_wishlist = models.BooleanField(
         default=True,
@@ -106,12 +111,6 @@ class WishlistSettings(models.Model):
     def __str__(self):
         return "Wishlist Settings"
 
-    @classmethod
-    def get_settings(cls):
-        """Get or create wishlist settings"""
-        settings, created = cls.objects.get_or_create(pk=1)
-        return settings
-
     def save(self, *args, **kwargs):
         # Ensure only one settings instance exists
         self.pk = 1
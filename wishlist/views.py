@@ -4,13 +4,18 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.core.paginator import Paginator
 from django.template.loader import render_to_string
 from catalog.models import Product
+from core.pagination import CursorPaginator
 from .models import Wishlist, WishlistItem, WishlistSettings
 import json
 
 
+def wishlist_paginator(wishlist):
+    """Keyset paginator over a wishlist's active items, newest first (12 per page)"""
+    return CursorPaginator(wishlist.get_active_items(), 12, ('-added_at', '-id'))
+
+
 def get_or_create_wishlist(user):
     """Get or create a wishlist for the user"""
     if user.is_authenticated:
@@ -29,18 +34,15 @@ def wishlist_view(request):
         return redirect('core:home')
 
     wishlist = get_or_create_wishlist(request.user)
-    items = wishlist.get_active_items() if wishlist else []
-
-    # Pagination
-    paginator = Paginator(items, 12)  # Show 12 items per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: every page is one indexed query, no OFFSET
+    paginator = wishlist_paginator(wishlist)
+    page_obj = paginator.get_page(cursor=request.GET.get('cursor'), page_number=request.GET.get('page'))
 
     context = {
         'wishlist': wishlist,
         'items': page_obj,
         'settings': settings,
-        'total_items': len(items),
+        'total_items': paginator.count,
     }
 
     return render(request, 'wishlist/wishlist.html', context)